@@ -5,10 +5,35 @@
 #
 
 
+import hmac
+
 from django.conf import settings
-from django.http import JsonResponse
+from django.http import HttpResponse, HttpResponseForbidden, JsonResponse
+
+from francy import metrics
+from francy.conditional import conditional, make_etag
+
 
+def version_etag(request):
+    return make_etag(request, settings.VERSION)
 
+
+@conditional(version_etag, public=True, max_age=60)
 def show_version(request):
     if request.method == 'GET':
         return JsonResponse({'version': settings.VERSION})
+
+
+@conditional(version_etag, public=True, max_age=60)
+async def show_version_async(request):
+    if request.method == 'GET':
+        return JsonResponse({'version': settings.VERSION})
+
+
+def show_metrics(request):
+    # Only scrapers presenting METRICS_TOKEN, the numbers reveal the traffic of every endpoint.
+    # Client addresses are no proof behind a reverse proxy, where all requests come from it.
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if not token or not hmac.compare_digest(request.META.get('HTTP_AUTHORIZATION', ''), 'Bearer ' + token):
+        return HttpResponseForbidden()
+    return HttpResponse(metrics.registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -5,9 +5,16 @@
 #
 
 
+from django.conf import settings
 from django.urls import path, include
 
 
 urlpatterns = [
     path('', include('user.api.dev.urls')),
+    # WOPI host endpoints of the design documents
+    path('wopi/', include('design.urls')),
 ]
+
+if settings.ASYNC_API:
+    # Serve the user endpoints with async views, all others fall through to the DRF views.
+    urlpatterns.insert(0, path('', include('user.api.dev.async_urls')))
@@ -0,0 +1,73 @@
+#
+# Created on Mon Nov 02 2020
+#
+# Copyright (c) 2020 - Simon Prast
+#
+
+
+"""
+Cost of authenticating one WOPI request.
+
+Compares verifying a signed WOPI access token with resolving an API token
+(user.models.AuthToken) through TokenAuthentication (AuthToken + User query)
+and through the token cache.
+
+    python -m benchmarks.access_tokens --runs 20000
+"""
+
+import argparse
+import time
+
+from benchmarks.utils import report, seed_users, setup_django
+
+
+def measure(runs, authenticate):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    with CaptureQueriesContext(connection) as captured:
+        wall, cpu = time.perf_counter(), time.process_time()
+        for _ in range(runs):
+            authenticate()
+        wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    return {
+        'runs': runs,
+        'wall_us_per_op': round(wall / runs * 1e6, 3),
+        'cpu_us_per_op': round(cpu / runs * 1e6, 3),
+        'queries_per_op': round(len(captured) / runs, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=20000)
+    args = parser.parse_args()
+
+    setup_django()
+    from rest_framework.authentication import TokenAuthentication
+
+    from design.models import Document
+    from design.tokens import access_tokens
+    from user.api.authentication import CachedTokenAuthentication, token_cache
+    from user.models import AuthToken, User
+
+    class DatabaseTokenAuthentication(TokenAuthentication):
+        # CachedTokenAuthentication without the cache
+        model = AuthToken
+
+    (user_id, key), = seed_users(1)
+    user = User.objects.get(pk=user_id)
+    document = Document.objects.create(name='benchmark.docx', owner=user)
+    access_token, expires = access_tokens.mint(user, document, True)
+
+    token_cache.clear()
+    cached = CachedTokenAuthentication()
+    report({
+        'signed_access_token': measure(args.runs, lambda: access_tokens.verify(access_token, document.pk)),
+        'api_token_cached': measure(args.runs, lambda: cached.authenticate_credentials(key)),
+        'api_token_database': measure(args.runs, lambda: DatabaseTokenAuthentication().authenticate_credentials(key)),
+    })
+
+
+if __name__ == '__main__':
+    main()
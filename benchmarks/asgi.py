@@ -0,0 +1,140 @@
+#
+# Created on Mon Nov 02 2020
+#
+# Copyright (c) 2020 - Simon Prast
+#
+
+
+"""
+Load test of the sync DRF views under WSGI against the async views under ASGI.
+
+WSGI requests are issued from a pool of threads, ASGI requests from tasks on
+a single event loop, both with the same concurrency. Every mode runs in its
+own interpreter, as ASYNC_API is fixed at settings import.
+
+    python -m benchmarks.asgi --requests 500 --concurrency 16
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.utils import report, seed_users, setup_django, summarize
+
+
+PASSWORD = 'benchmark-password'
+
+
+def scenarios(tokens):
+    """Request factories by scenario name, returning (method, path, data, token)
+    for a request number. `tokens` holds (user id, token key, username) tuples."""
+    return {
+        'version': lambda i: ('GET', '/api/version', None, None),
+        'user_list_self': lambda i: ('GET', '/api/dev/users/', None, tokens[i % len(tokens)][1]),
+        'user_detail': lambda i: (
+            'GET', '/api/dev/users/{}/'.format(tokens[i % len(tokens)][0]), None, tokens[i % len(tokens)][1]),
+        'login': lambda i: (
+            'POST', '/api/dev/users/login/', {'username': tokens[i % len(tokens)][2], 'password': PASSWORD}, None),
+    }
+
+
+def run_wsgi(make_request, requests, concurrency):
+    from francy.wsgi import application
+    from benchmarks.clients import WSGIClient
+
+    client = WSGIClient(application)
+
+    def one(i):
+        method, path, data, token = make_request(i)
+        started = time.perf_counter()
+        response = client.request(method, path, data, token)
+        assert response.status == 200, (path, response.status, response.body)
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(one, range(requests)))
+    return summarize(latencies, time.perf_counter() - started)
+
+
+def run_asgi(make_request, requests, concurrency):
+    from francy.asgi import application
+    from benchmarks.clients import ASGIClient
+
+    client = ASGIClient(application)
+
+    async def worker(queue, latencies):
+        while not queue.empty():
+            method, path, data, token = make_request(queue.get_nowait())
+            started = time.perf_counter()
+            response = await client.request(method, path, data, token)
+            assert response.status == 200, (path, response.status, response.body)
+            latencies.append(time.perf_counter() - started)
+
+    async def main():
+        queue = asyncio.Queue()
+        for i in range(requests):
+            queue.put_nowait(i)
+        latencies = []
+        await asyncio.gather(*(worker(queue, latencies) for _ in range(concurrency)))
+        return latencies
+
+    started = time.perf_counter()
+    latencies = asyncio.run(main())
+    return summarize(latencies, time.perf_counter() - started)
+
+
+def child(mode, requests, concurrency):
+    import django
+    django.setup()
+    from user.models import AuthToken
+
+    tokens = list(AuthToken.objects.order_by('user_id').values_list('user_id', 'key', 'user__username'))
+    run = run_wsgi if mode == 'wsgi' else run_asgi
+    results = {}
+    for name, make_request in scenarios(tokens).items():
+        # Logins hash a password each, keep their share of the run small
+        count = requests if name != 'login' else max(concurrency, requests // 20)
+        results[name] = run(make_request, count, concurrency)
+    print(json.dumps(results))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--child', choices=['wsgi', 'asgi'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        return child(args.child, args.requests, args.concurrency)
+
+    setup_django()
+    seed_users(args.users, password=PASSWORD)
+
+    results = {}
+    for mode in ('wsgi', 'asgi'):
+        env = dict(
+            os.environ,
+            DJANGO_SETTINGS_MODULE='benchmarks.settings',
+            FRANCY_ASYNC_API='1' if mode == 'asgi' else '0',
+            # Hash off the serving threads / event loop, like a deployment would
+            FRANCY_BENCH_HASHING='thread',
+        )
+        output = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.asgi', '--child', mode,
+             '--requests', str(args.requests), '--concurrency', str(args.concurrency)],
+            check=True, stdout=subprocess.PIPE, env=env,
+        ).stdout
+        results[mode] = json.loads(output.decode().strip().splitlines()[-1])
+    report(results)
+
+
+if __name__ == '__main__':
+    main()
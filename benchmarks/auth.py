@@ -0,0 +1,97 @@
+#
+# Created on Mon Nov 02 2020
+#
+# Copyright (c) 2020 - Simon Prast
+#
+
+
+"""
+CPU cost per signup and per login through UserCreateOrLogin.
+
+Compares the current view with the previous flow, which validated and saved
+the RegisterUserSerializer and then authenticated the new user again through
+AuthTokenSerializer (hashing the password twice on signup).
+
+    python -m benchmarks.auth --runs 20
+"""
+
+import argparse
+
+from benchmarks.utils import Timer, report, setup_django
+
+
+def count_hashes():
+    """Count password hashing runs of the default hasher."""
+    from django.contrib.auth.hashers import get_hasher
+
+    hasher_class = type(get_hasher())
+    counter = {'hashes': 0}
+
+    for name in ('encode',):
+        original = getattr(hasher_class, name)
+
+        def wrapper(self, *args, _original=original, **kwargs):
+            counter['hashes'] += 1
+            return _original(self, *args, **kwargs)
+
+        setattr(hasher_class, name, wrapper)
+    return counter
+
+
+def legacy_view():
+    from rest_framework import status
+    from rest_framework.response import Response
+
+    from user.api.dev.api_views import UserCreateOrLogin
+    from user.api.dev.authentication import obtain_auth_token
+    from user.api.dev.serializers import RegisterUserSerializer
+
+    class LegacyUserCreateOrLogin(UserCreateOrLogin):
+        def post(self, request, *args, **kwargs):
+            serializer = RegisterUserSerializer(data=request.data)
+            if serializer.is_valid():
+                serializer.save()
+            token, created, user = obtain_auth_token(request.data['username'], request.data['password'])
+            if not token:
+                return Response({}, status=status.HTTP_400_BAD_REQUEST)
+            auth_status = status.HTTP_201_CREATED if created else status.HTTP_200_OK
+            return Response({'username': user.username, 'token': token.key}, status=auth_status)
+
+    return LegacyUserCreateOrLogin.as_view()
+
+
+def run(view, prefix, runs, hashes):
+    from rest_framework.test import APIRequestFactory
+
+    factory = APIRequestFactory()
+    results = {}
+    for phase, expected in (('signup', 201), ('login', 200)):
+        timer = Timer()
+        hashes['hashes'] = 0
+        for i in range(runs):
+            data = {'username': '{}{}'.format(prefix, i), 'password': 'benchmark-password-{}'.format(i)}
+            request = factory.post('/api/dev/users/create/', data, format='json')
+            with timer.measure():
+                response = view(request)
+            assert response.status_code == expected, (phase, response.status_code, response.data)
+        results[phase] = dict(timer.as_dict(), hashes_per_op=round(hashes['hashes'] / runs, 2))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django()
+    from user.api.dev.api_views import UserCreateOrLogin
+
+    hashes = count_hashes()
+    report({
+        'legacy': run(legacy_view(), 'legacy', args.runs, hashes),
+        'current': run(UserCreateOrLogin.as_view(), 'current', args.runs, hashes),
+    })
+
+
+if __name__ == '__main__':
+    main()
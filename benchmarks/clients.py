@@ -0,0 +1,131 @@
+#
+# Created on Mon Nov 02 2020
+#
+# Copyright (c) 2020 - Simon Prast
+#
+
+
+"""
+Minimal in-process WSGI and ASGI clients.
+
+They call the application callables directly, without a network server, so
+load tests measure the project itself and run offline.
+"""
+
+import asyncio
+import io
+import json
+import sys
+from urllib.parse import urlsplit
+
+
+class Response:
+    def __init__(self, status, headers, body):
+        self.status = status
+        self.headers = {name.lower(): value for name, value in headers}
+        self.body = body
+
+    def json(self):
+        return json.loads(self.body)
+
+
+def _encode(data):
+    return json.dumps(data).encode() if data is not None else b''
+
+
+class WSGIClient:
+    def __init__(self, application):
+        self.application = application
+
+    def request(self, method, path, data=None, token=None, headers=None, remote_addr='127.0.0.1'):
+        url = urlsplit(path)
+        body = _encode(data)
+        environ = {
+            'REMOTE_ADDR': remote_addr,
+            'REQUEST_METHOD': method,
+            'PATH_INFO': url.path,
+            'QUERY_STRING': url.query,
+            'SERVER_NAME': 'localhost',
+            'SERVER_PORT': '80',
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'HTTP_HOST': 'localhost',
+            'CONTENT_TYPE': 'application/json',
+            'CONTENT_LENGTH': str(len(body)),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': io.BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        if token:
+            environ['HTTP_AUTHORIZATION'] = 'Token ' + token
+        for name, value in (headers or {}).items():
+            environ['HTTP_' + name.upper().replace('-', '_')] = value
+
+        started = {}
+
+        def start_response(status, response_headers, exc_info=None):
+            started['status'] = int(status.split()[0])
+            started['headers'] = response_headers
+
+        result = self.application(environ, start_response)
+        try:
+            content = b''.join(result)
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+        return Response(started['status'], started['headers'], content)
+
+
+class ASGIClient:
+    def __init__(self, application):
+        self.application = application
+
+    async def request(self, method, path, data=None, token=None, headers=None, remote_addr='127.0.0.1'):
+        url = urlsplit(path)
+        body = _encode(data)
+        request_headers = [
+            (b'host', b'localhost'),
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode()),
+        ]
+        if token:
+            request_headers.append((b'authorization', b'Token ' + token.encode()))
+        for name, value in (headers or {}).items():
+            request_headers.append((name.lower().encode(), value.encode()))
+
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': method,
+            'scheme': 'http',
+            'path': url.path,
+            'raw_path': url.path.encode(),
+            'query_string': url.query.encode(),
+            'headers': request_headers,
+            'server': ('localhost', 80),
+            'client': (remote_addr, 0),
+        }
+        messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+        sent = []
+
+        async def receive():
+            if messages:
+                return messages.pop()
+            # The request was fully read, wait until the handler is done with it
+            await asyncio.get_running_loop().create_future()
+
+        async def send(message):
+            sent.append(message)
+
+        await self.application(scope, receive, send)
+        start = sent[0]
+        content = b''.join(message.get('body', b'') for message in sent[1:])
+        return Response(
+            start['status'],
+            [(name.decode('latin1'), value.decode('latin1')) for name, value in start['headers']],
+            content
+        )
@@ -0,0 +1,145 @@
+#
+# Created on Mon Nov 02 2020
+#
+# Copyright (c) 2020 - Simon Prast
+#
+
+
+"""
+Latency of regular API requests during a login flood, with and without the
+password throttle.
+
+Victim threads read their user (users/<pk>/, token authenticated) while
+flood threads post --rate wrong passwords per second for a few existing
+usernames to users/login/, every request from another client address. The
+flood is paced like an attacker's, so rejecting its requests faster does
+not make it send more of them. Every mode runs in its own interpreter, as
+the throttle is configured at import:
+
+    baseline    victims only
+    off         victims during the flood, throttle disabled
+    on          victims during the flood, THROTTLE_BUCKETS of the project
+
+The flood counts how many of its requests were answered (each of them paid
+for a password hash) and how many were rejected with 429.
+
+    python -m benchmarks.flood --requests 2000 --concurrency 4 --flood 16 --rate 100
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.utils import report, seed_users, setup_django, summarize
+
+
+PASSWORD = 'benchmark-password'
+MODES = ('baseline', 'off', 'on')
+
+
+def flood(client, usernames, interval, stop, counts, lock):
+    rng = random.Random()
+    next_at = time.perf_counter()
+    while not stop.is_set():
+        # Requests that are late are not made up for
+        next_at = max(next_at + interval, time.perf_counter())
+        stop.wait(next_at - time.perf_counter())
+        response = client.request(
+            'POST', '/api/dev/users/login/',
+            {'username': rng.choice(usernames), 'password': 'wrong-password'},
+            remote_addr='10.{}.{}.{}'.format(rng.randrange(256), rng.randrange(256), rng.randrange(1, 255)),
+        )
+        with lock:
+            counts[str(response.status)] = counts.get(str(response.status), 0) + 1
+
+
+def child(mode, requests, concurrency, flooders, rate, targets):
+    import django
+    django.setup()
+    from francy.wsgi import application
+    from benchmarks.clients import WSGIClient
+    from user.hashing import hashing_executor
+    from user.models import AuthToken
+
+    tokens = list(AuthToken.objects.order_by('user_id').values_list('user_id', 'key', 'user__username'))
+    client = WSGIClient(application)
+
+    def victim(i):
+        user_id, key, username = tokens[i % len(tokens)]
+        started = time.perf_counter()
+        response = client.request('GET', '/api/dev/users/{}/'.format(user_id), token=key)
+        assert response.status == 200, (response.status, response.body)
+        return time.perf_counter() - started
+
+    stop = threading.Event()
+    counts, lock = {}, threading.Lock()
+    usernames = [username for _, _, username in tokens[:targets]]
+    threads = [
+        threading.Thread(target=flood, args=(client, usernames, flooders / rate, stop, counts, lock), daemon=True)
+        for _ in range(flooders if mode != 'baseline' else 0)
+    ]
+    for thread in threads:
+        thread.start()
+    # Let the flood drain the throttle's bursts first
+    time.sleep(0.5 if threads else 0)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(victim, range(requests)))
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    result = summarize(latencies, elapsed)
+    result['flood_responses'] = counts
+    result['passwords_hashed'] = hashing_executor.stats()['completed']
+    print(json.dumps(result))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000, help='victim requests per mode')
+    parser.add_argument('--concurrency', type=int, default=4, help='victim threads')
+    parser.add_argument('--flood', type=int, default=16, help='flood threads')
+    parser.add_argument('--rate', type=float, default=100, help='flood requests per second')
+    parser.add_argument('--targets', type=int, default=5, help='usernames attacked by the flood')
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--child', choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        return child(args.child, args.requests, args.concurrency, args.flood, args.rate, args.targets)
+
+    setup_django()
+    seed_users(args.users, password=PASSWORD)
+
+    results = {}
+    for mode in MODES:
+        env = dict(
+            os.environ,
+            DJANGO_SETTINGS_MODULE='benchmarks.settings',
+            FRANCY_ASYNC_API='0',
+            FRANCY_BENCH_THROTTLE='1' if mode == 'on' else '0',
+            # Hash off the serving threads, like a deployment would
+            FRANCY_BENCH_HASHING='thread',
+        )
+        output = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.flood', '--child', mode,
+             '--requests', str(args.requests), '--concurrency', str(args.concurrency),
+             '--flood', str(args.flood), '--rate', str(args.rate), '--targets', str(args.targets)],
+            check=True, stdout=subprocess.PIPE, env=env,
+        ).stdout
+        results[mode] = json.loads(output.decode().strip().splitlines()[-1])
+    report(results)
+
+
+if __name__ == '__main__':
+    main()
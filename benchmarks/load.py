@@ -0,0 +1,197 @@
+#
+# Created on Mon Nov 02 2020
+#
+# Copyright (c) 2020 - Simon Prast
+#
+
+
+"""
+Load test of the francy API.
+
+Seeds --users users with tokens into a fresh SQLite database and drives each
+endpoint scenario with --concurrency in-process clients (threads against the
+WSGI application, or tasks against the ASGI application with --asgi).
+Reports throughput, latency percentiles and SQL queries per request (from
+francy.metrics) as JSON. Save a run with --output and pass it as --baseline
+to a later run, e.g. on another commit, to get the relative changes.
+
+    python -m benchmarks.load --requests 1000 --concurrency 1 8 --output before.json
+    python -m benchmarks.load --requests 1000 --concurrency 1 8 --baseline before.json
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.utils import report, seed_users, setup_django, summarize
+
+
+PASSWORD = 'benchmark-password'
+
+# Scenarios that hash a password per request, they run with a fraction of --requests
+HASHING = ('user_create', 'auth')
+
+
+def scenarios(tokens):
+    """Request factories by scenario name, returning (method, path, data, token, expected status)
+    for a request number. `tokens` holds (user id, token key, username) tuples, the first is staff."""
+    staff, users = tokens[0], tokens[1:]
+    signups = itertools.count()
+
+    def user(i):
+        return users[i % len(users)]
+
+    return {
+        'version': lambda i: ('GET', '/api/version', None, None, 200),
+        'user_list_self': lambda i: ('GET', '/api/dev/users/', None, user(i)[1], 200),
+        'user_list_staff': lambda i: ('GET', '/api/dev/users/', None, staff[1], 200),
+        'user_detail': lambda i: ('GET', '/api/dev/users/{}/'.format(user(i)[0]), None, user(i)[1], 200),
+        'user_create': lambda i: (
+            'POST', '/api/dev/users/create/',
+            {'username': 'signup{}'.format(next(signups)), 'password': PASSWORD}, None, 201),
+        'auth': lambda i: ('POST', '/api/dev/auth/', {'username': user(i)[2], 'password': PASSWORD}, None, 200),
+    }
+
+
+def run_wsgi(make_request, requests, concurrency):
+    from benchmarks.clients import WSGIClient
+    from francy.wsgi import application
+
+    client = WSGIClient(application)
+
+    def one(i):
+        method, path, data, token, expected = make_request(i)
+        started = time.perf_counter()
+        response = client.request(method, path, data, token)
+        assert response.status == expected, (path, response.status, response.body)
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(one, range(requests)))
+    return latencies, time.perf_counter() - started
+
+
+def run_asgi(make_request, requests, concurrency):
+    from benchmarks.clients import ASGIClient
+    from francy.asgi import application
+
+    client = ASGIClient(application)
+    numbers = iter(range(requests))
+    latencies = []
+
+    async def worker():
+        for i in numbers:
+            method, path, data, token, expected = make_request(i)
+            started = time.perf_counter()
+            response = await client.request(method, path, data, token)
+            assert response.status == expected, (path, response.status, response.body)
+            latencies.append(time.perf_counter() - started)
+
+    async def main():
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+    started = time.perf_counter()
+    asyncio.run(main())
+    return latencies, time.perf_counter() - started
+
+
+def run(make_request, requests, concurrency, asgi):
+    from francy.metrics import registry
+
+    registry.clear()
+    latencies, elapsed = (run_asgi if asgi else run_wsgi)(make_request, requests, concurrency)
+    result = summarize(latencies, elapsed)
+    totals = list(registry.totals.values())
+    sampled = sum(total[0] for total in totals)
+    result['queries_per_request'] = round(sum(total[1] for total in totals) / sampled, 2) if sampled else None
+    return result
+
+
+def compare(results, baseline):
+    """Relative change of every number against the same entry of the baseline."""
+    changes = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            nested = compare(value, baseline.get(key) or {})
+            if nested:
+                changes[key] = nested
+        elif isinstance(value, (int, float)) and isinstance(baseline.get(key), (int, float)) and baseline[key]:
+            changes[key] = '{:+.1%}'.format((value - baseline[key]) / baseline[key])
+    return changes
+
+
+def describe(args):
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True,
+        ).stdout.decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    import django
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'server': 'asgi' if args.asgi else 'wsgi',
+        'users': args.users,
+        'requests': args.requests,
+        'hashing_backend': os.environ.get('FRANCY_BENCH_HASHING', 'inline'),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--requests', type=int, default=1000, help='requests per scenario and concurrency')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8])
+    parser.add_argument('--scenarios', nargs='+', help='default: all')
+    parser.add_argument('--asgi', action='store_true', help='drive the ASGI application with the async views')
+    parser.add_argument('--output', help='write the results to this file')
+    parser.add_argument('--baseline', help='results of an earlier run to compare with')
+    args = parser.parse_args()
+
+    # ASYNC_API is read at settings import
+    os.environ['FRANCY_ASYNC_API'] = '1' if args.asgi else '0'
+    setup_django()
+    from django.contrib.auth.hashers import make_password
+
+    seeded = seed_users(args.users, password=PASSWORD, staff=1)
+    from user.models import User
+    usernames = dict(User.objects.values_list('id', 'username'))
+    tokens = [(user_id, key, usernames[user_id]) for user_id, key in seeded]
+    # Hash once up front, so the first hashing scenario does not pay for the hasher setup
+    make_password(PASSWORD)
+
+    available = scenarios(tokens)
+    names = args.scenarios or list(available)
+    unknown = set(names) - set(available)
+    if unknown:
+        parser.error('unknown scenarios: ' + ', '.join(sorted(unknown)))
+
+    results = {}
+    for name in names:
+        requests = args.requests if name not in HASHING else max(max(args.concurrency), args.requests // 20)
+        results[name] = {
+            'concurrency_{}'.format(concurrency): run(available[name], requests, concurrency, args.asgi)
+            for concurrency in args.concurrency
+        }
+
+    output = {'meta': describe(args), 'results': results}
+    if args.baseline:
+        with open(args.baseline) as file:
+            output['change'] = compare(results, json.load(file)['results'])
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(output, file, indent=2, sort_keys=True)
+    report(output)
+
+
+if __name__ == '__main__':
+    main()
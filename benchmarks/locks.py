@@ -0,0 +1,96 @@
+#
+# Created on Mon Nov 02 2020
+#
+# Copyright (c) 2020 - Simon Prast
+#
+
+
+"""
+WOPI lock operations per second under contention.
+
+Every thread plays an editor session on one of --files documents: it locks
+the document, refreshes and reads the lock and unlocks it again. With fewer
+documents than threads the sessions collide and part of the locks fail with
+a conflict, as they would in production.
+
+    python -m benchmarks.locks --threads 1 4 16 --files 8 --seconds 2
+"""
+
+import argparse
+import os
+import random
+import threading
+import time
+
+from benchmarks.utils import report, summarize
+
+
+def session(manager, file_id, lock_id, latencies, conflicts):
+    from design.locks import LockConflict
+
+    for operation in (manager.lock, manager.refresh, manager.get_lock, manager.unlock):
+        args = (file_id,) if operation == manager.get_lock else (file_id, lock_id)
+        started = time.perf_counter()
+        try:
+            operation(*args)
+        except LockConflict:
+            conflicts[0] += 1
+            # The session could not take the lock, there is nothing to refresh
+            latencies.append(time.perf_counter() - started)
+            return
+        latencies.append(time.perf_counter() - started)
+
+
+def run(manager, threads, files, seconds):
+    latencies = [[] for _ in range(threads)]
+    conflicts = [[0] for _ in range(threads)]
+    stop = threading.Event()
+
+    def worker(index):
+        rng = random.Random(index)
+        lock_id = 'session-{}'.format(index)
+        while not stop.is_set():
+            session(manager, rng.randrange(files), lock_id, latencies[index], conflicts[index])
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    merged = [latency for values in latencies for latency in values]
+    result = summarize(merged, elapsed)
+    result['operations'] = result.pop('requests')
+    result['ops_per_sec'] = result.pop('rps')
+    result['conflicts'] = sum(count[0] for count in conflicts)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--files', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=2.0)
+    args = parser.parse_args()
+
+    # Locks never touch the database, settings are enough
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+    import django
+    django.setup()
+    from design.locks import CacheLockBackend, LocalLockBackend, LockManager
+
+    results = {}
+    for name, backend in (('local', LocalLockBackend), ('cache', CacheLockBackend)):
+        results[name] = {
+            '{}_threads'.format(threads): run(LockManager(backend()), threads, args.files, args.seconds)
+            for threads in args.threads
+        }
+    report(results)
+
+
+if __name__ == '__main__':
+    main()
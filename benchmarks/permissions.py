@@ -0,0 +1,140 @@
+#
+# Created on Mon Nov 02 2020
+#
+# Copyright (c) 2020 - Simon Prast
+#
+
+
+"""
+Per-request authorization cost of the user views, before and after the
+permission matrix.
+
+'legacy' runs the permission classes the views used before (IsAuthenticated,
+IsStaff) followed by the staff / own object checks of the view bodies,
+'matrix' runs UtypePermission against the compiled masks. Both decide the
+same requests of a regular and a staff user, without any database access.
+
+    python -m benchmarks.permissions --iterations 100000 --repeat 5
+"""
+
+import argparse
+import os
+import time
+
+from benchmarks.utils import report
+
+
+def legacy_checks():
+    from rest_framework import permissions
+    from user.api.permissions import IsStaff
+
+    def detail_get(request, pk):
+        return request.user.is_staff or request.user.pk == pk
+
+    def detail_put(request, pk):
+        # May the user change utype?
+        request.user.is_staff
+        return request.user.is_staff or request.user.pk == pk
+
+    return {
+        'detail_get': ([permissions.IsAuthenticated], detail_get),
+        'detail_put': ([permissions.IsAuthenticated], detail_put),
+        'export': ([permissions.IsAuthenticated, IsStaff], None),
+    }
+
+
+def matrix_checks():
+    from user.api.permissions import UtypePermission
+    from user.permissions import USER_CHANGE_UTYPE, has_action
+
+    def detail_put(request, pk):
+        # May the user change utype? Access itself was granted by UtypePermission.
+        has_action(request.user, USER_CHANGE_UTYPE)
+        return True
+
+    return {
+        'detail_get': ([UtypePermission], None),
+        'detail_put': ([UtypePermission], detail_put),
+        'export': ([UtypePermission], None),
+    }
+
+
+def make_view(permission_classes, method, pk):
+    from rest_framework import generics
+    from user.permissions import (
+        USER_CHANGE, USER_CHANGE_OWN, USER_EXPORT, USER_VIEW, USER_VIEW_OWN
+    )
+
+    class View(generics.GenericAPIView):
+        permission_actions = {
+            'GET': (USER_VIEW, USER_VIEW_OWN) if pk is not None else (USER_EXPORT,),
+            'PUT': (USER_CHANGE, USER_CHANGE_OWN),
+        }
+
+    View.permission_classes = permission_classes
+    view = View()
+    view.kwargs = {} if pk is None else {'pk': pk}
+    return view
+
+
+def run(checks, name, user, method, pk, iterations, repeat):
+    from rest_framework import exceptions
+    from rest_framework.request import Request
+    from rest_framework.test import APIRequestFactory
+
+    permission_classes, inline = checks[name]
+    request = Request(getattr(APIRequestFactory(), method.lower())('/'))
+    request.user = user
+    view = make_view(permission_classes, method, pk)
+
+    # The best of `repeat` rounds, the others were disturbed by something else
+    best = None
+    for _ in range(repeat):
+        allowed = 0
+        started = time.perf_counter()
+        for _ in range(iterations):
+            try:
+                # What APIView.initial() does for every request
+                view.check_permissions(request)
+            except exceptions.APIException:
+                continue
+            if inline is None or inline(request, pk):
+                allowed += 1
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return {'ns_per_check': round(best / iterations * 1e9, 1), 'allowed': allowed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    # The checks never touch the database, settings are enough
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+    import django
+    django.setup()
+    from user.models import User
+
+    regular = User(pk=1, username='regular', utype=1)
+    staff = User(pk=2, username='staff', utype=9, is_admin=True)
+    cases = {
+        'detail_get_own': ('detail_get', regular, 'GET', 1),
+        'detail_get_staff': ('detail_get', staff, 'GET', 1),
+        'detail_put_own': ('detail_put', regular, 'PUT', 1),
+        'export_staff': ('export', staff, 'GET', None),
+        'export_denied': ('export', regular, 'GET', None),
+    }
+
+    results = {}
+    for mode, checks in (('legacy', legacy_checks()), ('matrix', matrix_checks())):
+        results[mode] = {
+            case: run(checks, name, user, method, pk, args.iterations, args.repeat)
+            for case, (name, user, method, pk) in cases.items()
+        }
+    report(results)
+
+
+if __name__ == '__main__':
+    main()
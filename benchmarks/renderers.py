@@ -0,0 +1,108 @@
+#
+# Created on Mon Nov 02 2020
+#
+# Copyright (c) 2020 - Simon Prast
+#
+
+
+"""
+JSON rendering and parsing cost of the staff user list.
+
+The payload is what UserList answers a staff user: --rows users through
+UserSerializer, built in memory. Each implementation encodes and decodes it
+--repeat times; reported are the best time, the peak memory allocated while
+encoding (tracemalloc) and the response size:
+
+    drf         rest_framework's JSONRenderer / JSONParser
+    json        user.api.jsoncodec with the standard library
+    orjson      user.api.jsoncodec with orjson, if it is installed
+
+    python -m benchmarks.renderers --rows 1000 10000 --repeat 5
+"""
+
+import argparse
+import io
+import os
+import time
+import tracemalloc
+
+from benchmarks.utils import report
+
+
+def payload(rows):
+    from django.utils import timezone
+    from user.api.serializers import UserSerializer
+    from user.models import User
+
+    now = timezone.now()
+    users = [
+        User(pk=i, username='zoë{}'.format(i), email='user{}@example.com'.format(i), utype=1,
+             last_login=now if i % 2 else None)
+        for i in range(1, rows + 1)
+    ]
+    return UserSerializer(users, many=True).data
+
+
+def implementations():
+    from rest_framework.parsers import JSONParser
+    from rest_framework.renderers import JSONRenderer
+    from user.api.jsoncodec import CODECS
+
+    renderer, parser = JSONRenderer(), JSONParser()
+    result = {
+        'drf': (renderer.render, lambda content: parser.parse(io.BytesIO(content), 'application/json', {})),
+    }
+    result.update(CODECS)
+    return result
+
+
+def best_of(repeat, func, *args):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(*args)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def peak_allocated(func, *args):
+    tracemalloc.start()
+    try:
+        func(*args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    # Rendering never touches the database, settings are enough
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+    import django
+    django.setup()
+
+    results = {}
+    for rows in args.rows:
+        data = payload(rows)
+        reference = None
+        for name, (dumps, loads) in implementations().items():
+            content = dumps(data)
+            if reference is None:
+                reference = content
+            results['{}_{}'.format(name, rows)] = {
+                'render_ms': round(best_of(args.repeat, dumps, data) * 1000, 3),
+                'parse_ms': round(best_of(args.repeat, loads, content) * 1000, 3),
+                'render_peak_kib': round(peak_allocated(dumps, data) / 1024, 1),
+                'bytes': len(content),
+                'identical': content == reference,
+            }
+    report(results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+#
+# Created on Mon Nov 02 2020
+#
+# Copyright (c) 2020 - Simon Prast
+#
+
+
+"""
+Per-row cost of serializing the staff user list.
+
+Reads --rows users and serializes them like UserList does, the way it did
+before ('serializer': model instances through UserSerializer(many=True))
+and the way it does now ('rows': values_list() tuples through RowBuilder).
+Reported are the best CPU time per row of --repeat runs, the peak memory
+allocated per row (tracemalloc) and whether both produce the same JSON.
+
+    python -m benchmarks.rows --rows 1000 10000 --repeat 5
+"""
+
+import argparse
+import time
+import tracemalloc
+
+from benchmarks.utils import report, seed_users, setup_django
+
+
+def serializer_path(queryset):
+    from user.api.serializers import UserSerializer
+    return UserSerializer(queryset, many=True).data
+
+
+def rows_path(queryset):
+    from francy.rows import RowBuilder
+    from user.api.serializers import UserSerializer
+    builder = RowBuilder(UserSerializer().fields)
+    return builder.build_many(queryset.values_list(*builder.columns, named=True))
+
+
+def measure(path, queryset, rows, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.process_time()
+        path(queryset.all())
+        elapsed = time.process_time() - started
+        best = elapsed if best is None else min(best, elapsed)
+
+    tracemalloc.start()
+    try:
+        path(queryset.all())
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {
+        'cpu_us_per_row': round(best / rows * 1e6, 2),
+        'peak_bytes_per_row': round(peak / rows),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.db.models.functions import Mod
+    from django.utils import timezone
+    from user.api.jsoncodec import dumps
+    from user.models import User
+
+    seed_users(max(args.rows))
+    # Half of the users logged in, so last_login goes through its representation
+    User.objects.annotate(odd=Mod('id', 2)).filter(odd=1).update(last_login=timezone.now())
+
+    results = {}
+    for rows in args.rows:
+        queryset = User.objects.order_by('id')[:rows]
+        results[rows] = {
+            name: measure(path, queryset, rows, args.repeat)
+            for name, path in (('serializer', serializer_path), ('rows', rows_path))
+        }
+        results[rows]['identical'] = dumps(serializer_path(queryset.all())) == dumps(rows_path(queryset.all()))
+    report(results)
+
+
+if __name__ == '__main__':
+    main()
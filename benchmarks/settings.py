@@ -0,0 +1,40 @@
+#
+# Created on Mon Nov 02 2020
+#
+# Copyright (c) 2020 - Simon Prast
+#
+
+
+"""
+Settings for the offline benchmarks.
+
+They extend the project settings and only swap in a throwaway SQLite database and caches,
+so the numbers reflect the real middleware, authentication and password hashers.
+"""
+
+import os
+import tempfile
+
+from francy.cache.config import caches_from_env
+from francy.db.config import database_from_env
+from francy.settings import *  # noqa: F401,F403
+
+
+DEBUG = False
+
+ALLOWED_HOSTS = ['testserver', 'localhost', '127.0.0.1']
+
+DATABASES = {
+    'default': database_from_env(
+        default_name=os.environ.get('FRANCY_BENCH_DB', os.path.join(tempfile.gettempdir(), 'francy-bench.sqlite3'))
+    ),
+}
+
+CACHES = caches_from_env(default_dir=os.path.join(tempfile.gettempdir(), 'francy-bench-cache'))
+
+# Hash in the calling thread by default, so CPU time and hash counts show up in this process
+PASSWORD_HASHING_BACKEND = os.environ.get('FRANCY_BENCH_HASHING', 'inline')
+
+# The password throttle would answer most benchmark logins with 429, it is only enabled for benchmarks.flood
+if os.environ.get('FRANCY_BENCH_THROTTLE', '0') != '1':
+    THROTTLE_BUCKETS = {}
@@ -0,0 +1,113 @@
+#
+# Created on Mon Nov 02 2020
+#
+# Copyright (c) 2020 - Simon Prast
+#
+
+
+"""
+Import-to-first-request time of the WSGI and ASGI entry points.
+
+Every sample runs in a fresh interpreter that imports francy.wsgi or
+francy.asgi and serves a first GET /api/version, so the numbers include
+settings, app loading and URLconf import.
+
+    python -m benchmarks.startup --runs 10
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from benchmarks.utils import report, setup_django
+
+
+PATH = '/api/version'
+
+
+def first_wsgi_request():
+    from wsgiref.util import setup_testing_defaults
+
+    started = time.perf_counter()
+    from francy.wsgi import application
+    imported = time.perf_counter()
+
+    environ = {'PATH_INFO': PATH, 'REQUEST_METHOD': 'GET', 'HTTP_HOST': 'localhost'}
+    setup_testing_defaults(environ)
+    statuses = []
+    body = b''.join(application(environ, lambda status, headers: statuses.append(status)))
+    assert statuses[0].startswith('200'), (statuses, body)
+    return started, imported, time.perf_counter()
+
+
+def first_asgi_request():
+    started = time.perf_counter()
+    from francy.asgi import application
+    imported = time.perf_counter()
+
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+        'scheme': 'http', 'path': PATH, 'raw_path': PATH.encode(), 'query_string': b'',
+        'headers': [(b'host', b'localhost')], 'server': ('localhost', 80), 'client': ('127.0.0.1', 0),
+    }
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(application(scope, receive, send))
+    assert messages[0]['status'] == 200, messages
+    return started, imported, time.perf_counter()
+
+
+def child(entry_point):
+    started, imported, answered = {'wsgi': first_wsgi_request, 'asgi': first_asgi_request}[entry_point]()
+    print(json.dumps({'import_ms': (imported - started) * 1000, 'first_request_ms': (answered - imported) * 1000}))
+
+
+def sample(entry_point):
+    output = subprocess.run(
+        [sys.executable, '-m', 'benchmarks.startup', '--child', entry_point],
+        check=True, stdout=subprocess.PIPE, env=dict(os.environ, DJANGO_SETTINGS_MODULE='benchmarks.settings'),
+    ).stdout
+    return json.loads(output.decode().strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--child', choices=['wsgi', 'asgi'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        return child(args.child)
+
+    # Migrate once up front, the samples reuse the database
+    setup_django()
+
+    results = {}
+    for entry_point in ('wsgi', 'asgi'):
+        samples = [sample(entry_point) for _ in range(args.runs)]
+        results[entry_point] = {}
+        for key in ('import_ms', 'first_request_ms'):
+            values = [s[key] for s in samples]
+            results[entry_point][key] = {
+                'mean': round(statistics.mean(values), 3),
+                'min': round(min(values), 3),
+                'max': round(max(values), 3),
+            }
+        results[entry_point]['total_ms'] = round(
+            statistics.mean(s['import_ms'] + s['first_request_ms'] for s in samples), 3)
+    report(results)
+
+
+if __name__ == '__main__':
+    main()
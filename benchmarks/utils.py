@@ -0,0 +1,107 @@
+#
+# Created on Mon Nov 02 2020
+#
+# Copyright (c) 2020 - Simon Prast
+#
+
+
+import json
+import os
+import time
+from contextlib import contextmanager
+
+
+def setup_django(settings_module='benchmarks.settings'):
+    """Configure Django against a fresh, migrated benchmark database and empty caches."""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+
+    import django
+    from django.conf import settings
+
+    name = str(settings.DATABASES['default']['NAME'])
+    for path in (name, name + '-wal', name + '-shm'):
+        if os.path.exists(path):
+            os.remove(path)
+
+    django.setup()
+
+    from django.core.cache import caches
+    from django.core.management import call_command
+    for alias in settings.CACHES:
+        caches[alias].clear()
+    call_command('migrate', verbosity=0)
+
+
+def seed_users(count, password='benchmark-password', staff=0):
+    """Create `count` users with tokens in bulk; the first `staff` of them are admins.
+
+    All users share one password hash, so seeding does not pay for `count` hashes.
+    Returns a list of (user id, token key) tuples.
+    """
+    from django.contrib.auth.hashers import make_password
+    from user.models import AuthToken, User
+
+    encoded = make_password(password)
+    start = User.objects.count()
+    users = User.objects.bulk_create([
+        User(username='bench{}'.format(start + i), email='bench{}@example.com'.format(start + i),
+             password=encoded, utype=9 if i < staff else 1, is_admin=i < staff)
+        for i in range(count)
+    ], batch_size=500)
+    users = User.objects.filter(username__in=[user.username for user in users]).order_by('id')
+    tokens = AuthToken.objects.bulk_create([AuthToken(user=user) for user in users], batch_size=500)
+    return [(token.user_id, token.key) for token in tokens]
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def summarize(latencies, elapsed):
+    """Throughput and latency percentiles (in ms) of a list of latencies in seconds."""
+    return {
+        'requests': len(latencies),
+        'rps': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+    }
+
+
+class Timer:
+    """Accumulates wall clock time, process CPU time and SQL queries."""
+
+    def __init__(self):
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.queries = 0
+        self.runs = 0
+
+    @contextmanager
+    def measure(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        wall, cpu = time.perf_counter(), time.process_time()
+        with CaptureQueriesContext(connection) as captured:
+            yield
+        self.wall += time.perf_counter() - wall
+        self.cpu += time.process_time() - cpu
+        self.queries += len(captured)
+        self.runs += 1
+
+    def as_dict(self):
+        runs = self.runs or 1
+        return {
+            'runs': self.runs,
+            'wall_ms_per_op': round(self.wall / runs * 1000, 3),
+            'cpu_ms_per_op': round(self.cpu / runs * 1000, 3),
+            'queries_per_op': round(self.queries / runs, 2),
+        }
+
+
+def report(results):
+    print(json.dumps(results, indent=2, sort_keys=True))
@@ -0,0 +1,122 @@
+#
+# Created on Mon Nov 02 2020
+#
+# Copyright (c) 2020 - Simon Prast
+#
+
+
+"""
+Storage cost of repeated saves of a slowly changing document.
+
+Every save inserts, deletes or overwrites a few small spans of the previous
+version and stores the result in the version store. Reported are the bytes
+written per save, the dedup ratio and the chunking throughput, next to what
+fixed-size 64 KiB blocks and full copies would have stored.
+
+    python -m benchmarks.versions --size 8 --saves 20 --edits 3
+"""
+
+import argparse
+import hashlib
+import random
+import shutil
+import tempfile
+import time
+
+from benchmarks.utils import report, setup_django
+
+
+def random_bytes(rng, size):
+    return rng.getrandbits(size * 8).to_bytes(size, 'little')
+
+
+def edit(data, rng, edits):
+    data = bytearray(data)
+    for _ in range(edits):
+        position = rng.randrange(len(data))
+        span = rng.randrange(1, 200)
+        kind = rng.choice(('insert', 'delete', 'overwrite'))
+        if kind == 'insert':
+            data[position:position] = random_bytes(rng, span)
+        elif kind == 'delete':
+            del data[position:position + span]
+        else:
+            data[position:position + span] = random_bytes(rng, span)
+    return bytes(data)
+
+
+def blocks(data, size=64 * 1024):
+    for offset in range(0, len(data), size):
+        yield data[offset:offset + size]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--size', type=int, default=8, help='document size in MiB')
+    parser.add_argument('--saves', type=int, default=20)
+    parser.add_argument('--edits', type=int, default=3, help='edits per save')
+    args = parser.parse_args()
+
+    setup_django()
+    from design.models import Document
+    from design.versions import VersionStore
+    from user.models import User
+
+    owner = User.objects.create_user('benchmark', 'benchmark-password')
+    document = Document.objects.create(name='benchmark.docx', owner=owner)
+    root = tempfile.mkdtemp(prefix='francy-versions-')
+    store = VersionStore(root)
+
+    rng = random.Random(0)
+    data = random_bytes(rng, args.size * 1024 * 1024)
+    fixed_blocks = set()
+    fixed_stored = full_stored = written = 0
+    elapsed = 0.0
+    try:
+        for number in range(1, args.saves + 1):
+            if number > 1:
+                data = edit(data, rng, args.edits)
+
+            started = time.perf_counter()
+            writer = store.writer()
+            for block in blocks(data):
+                writer.feed(block)
+            writer.save(document, number)
+            elapsed += time.perf_counter() - started
+            written += writer.written
+
+            full_stored += len(data)
+            for block in blocks(data):
+                digest = hashlib.sha256(block).digest()
+                if digest not in fixed_blocks:
+                    fixed_blocks.add(digest)
+                    fixed_stored += len(block)
+
+        stats = store.stats()
+    finally:
+        shutil.rmtree(root)
+
+    logical = stats['logical_bytes']
+    report({
+        'saves': args.saves,
+        'document_bytes': len(data),
+        'content_defined': {
+            'stored_bytes': stats['stored_bytes'],
+            'written_bytes_per_save': round(written / args.saves),
+            'dedup_ratio': stats['dedup_ratio'],
+            'avg_chunk_bytes': round(stats['stored_bytes'] / stats['chunks']),
+            'mb_per_sec': round(logical / elapsed / 1e6, 1),
+        },
+        'fixed_64k_blocks': {
+            'stored_bytes': fixed_stored,
+            'dedup_ratio': round(logical / fixed_stored, 3),
+        },
+        'full_copies': {
+            'stored_bytes': full_stored,
+            'dedup_ratio': 1.0,
+        },
+    })
+
+
+if __name__ == '__main__':
+    main()
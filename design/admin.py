@@ -1,3 +1,30 @@
+#
+# Created on Mon Nov 02 2020
+#
+# Copyright (c) 2020 - Simon Prast
+#
+
+
 from django.contrib import admin
 
-# Register your models here.
+from .files import hash_chunks
+from .models import Document
+
+
+class DocumentAdmin(admin.ModelAdmin):
+    list_display = ("name", "owner", "size", "version", "modified")
+    readonly_fields = ("size", "sha256", "version", "created", "modified")
+    raw_id_fields = ("owner",)
+    search_fields = ("name",)
+
+    def save_model(self, request, obj, form, change):
+        if "file" in form.changed_data and obj.file:
+            # Keep the metadata in sync with an uploaded file
+            obj.size = obj.file.size
+            obj.sha256 = hash_chunks(obj.file.chunks())
+            if change:
+                obj.version += 1
+        super().save_model(request, obj, form, change)
+
+
+admin.site.register(Document, DocumentAdmin)
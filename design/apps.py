@@ -1,5 +1,23 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_delete, post_save
+
+
+def revoke_access_tokens(sender, instance, **kwargs):
+    from .tokens import access_tokens
+    access_tokens.revoke_user(instance.user_id)
+
+
+def revoke_access_tokens_on_rotate(sender, instance, created=False, **kwargs):
+    # Saving an existing token means its key was rotated (see AuthTokenManager.rotate)
+    if not created:
+        revoke_access_tokens(sender, instance)
 
 
 class DesignConfig(AppConfig):
     name = 'design'
+
+    def ready(self):
+        # Deleting or rotating the API token (logout, password change, deleted user)
+        # ends all WOPI sessions of the user
+        post_delete.connect(revoke_access_tokens, sender='user.AuthToken')
+        post_save.connect(revoke_access_tokens_on_rotate, sender='user.AuthToken')
@@ -0,0 +1,67 @@
+#
+# Created on Mon Nov 02 2020
+#
+# Copyright (c) 2020 - Simon Prast
+#
+
+
+"""
+Content-defined chunking.
+
+A chunk ends after the first run of `boundary_bits` bytes that all map to 1
+in a fixed, pseudo-random byte -> bit table, but not before `min_size` and
+at the latest after `max_size` bytes. Boundaries only depend on the content
+around them, so an edit changes the chunks it touches and the chunk after
+them, not every following chunk as fixed-size blocks would. Mapping and
+searching are bytes.translate() and bytes.find(), keeping the per-byte work
+in C.
+"""
+
+import random
+
+
+# Must never change, otherwise stored versions no longer share chunks with new ones
+_BITS = random.Random(0x6672616e6379).getrandbits(256)
+_TABLE = bytes((_BITS >> i) & 1 for i in range(256))
+
+
+class Chunker:
+    def __init__(self, min_size=16 * 1024, boundary_bits=15, max_size=256 * 1024):
+        # A run of n ones shows up about every 2 ** (n + 1) bytes,
+        # with the defaults random data is cut into chunks of ~70 KiB.
+        self.min_size = min_size
+        self.max_size = max_size
+        self._pattern = b'\x01' * boundary_bits
+        self._buffer = bytearray()
+        self._marks = bytearray()
+
+    def feed(self, data):
+        """Add data and yield the chunks that are complete."""
+        self._buffer += data
+        self._marks += data.translate(_TABLE)
+        while len(self._buffer) >= self.max_size:
+            yield self._take(self._cut())
+
+    def finish(self):
+        """Yield the remaining chunks at the end of the data."""
+        while self._buffer:
+            yield self._take(self._cut())
+
+    def _cut(self):
+        window = len(self._pattern)
+        end = min(len(self._buffer), self.max_size)
+        found = self._marks.find(self._pattern, max(self.min_size - window, 0), end)
+        return found + window if found != -1 else end
+
+    def _take(self, size):
+        chunk = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        del self._marks[:size]
+        return chunk
+
+
+def iter_chunks(blocks, **kwargs):
+    chunker = Chunker(**kwargs)
+    for block in blocks:
+        yield from chunker.feed(block)
+    yield from chunker.finish()
@@ -0,0 +1,116 @@
+#
+# Created on Mon Nov 02 2020
+#
+# Copyright (c) 2020 - Simon Prast
+#
+
+
+"""
+Disk I/O for document contents.
+
+Contents are never held in memory as a whole: uploads are copied to disk in
+chunks of WOPI_CHUNK_SIZE bytes and hashed on the way, downloads are handed
+to the server as open files (sent with sendfile where the server supports
+wsgi.file_wrapper) or read chunk by chunk for byte ranges.
+"""
+
+import hashlib
+import os
+import re
+import tempfile
+
+from django.conf import settings
+
+
+CHUNK_SIZE = getattr(settings, 'WOPI_CHUNK_SIZE', 64 * 1024)
+
+_range_re = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def write_stream(read, path, chunk_size=CHUNK_SIZE, tee=None):
+    """Copy everything `read(chunk_size)` returns to `path` and return the
+    (size, sha256) of the written content. `tee` is called with every block
+    written, e.g. to store a version on the way.
+
+    The data goes to a temporary file next to `path` first, which then
+    replaces `path`, so readers never see a partially written file.
+    """
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.upload-')
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(fd, 'wb') as temp_file:
+            while True:
+                chunk = read(chunk_size)
+                if not chunk:
+                    break
+                temp_file.write(chunk)
+                digest.update(chunk)
+                if tee is not None:
+                    tee(chunk)
+                size += len(chunk)
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except FileNotFoundError:
+            pass
+        raise
+    return size, digest.hexdigest()
+
+
+def hash_chunks(chunks):
+    digest = hashlib.sha256()
+    for chunk in chunks:
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def parse_range(header, size):
+    """Return the (start, end) byte positions, both inclusive, requested by
+    a Range header, or None to send the whole file.
+
+    Only a single range is supported. Multiple ranges and malformed headers
+    are ignored, which RFC 7233 allows; ranges outside of the file raise
+    RangeNotSatisfiable.
+    """
+    match = _range_re.match(header.strip()) if header else None
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first:
+        if not last:
+            return None
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0 or size == 0:
+            raise RangeNotSatisfiable
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable
+    return start, end
+
+
+def iter_range(file, start, end, chunk_size=CHUNK_SIZE):
+    """Yield the bytes `start` to `end` (inclusive) of an open file and close it."""
+    try:
+        file.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = file.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        file.close()
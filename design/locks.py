@@ -0,0 +1,216 @@
+#
+# Created on Mon Nov 02 2020
+#
+# Copyright (c) 2020 - Simon Prast
+#
+
+
+"""
+WOPI file locks.
+
+Editors lock a document when they open it and refresh the lock every few
+minutes, so lock operations are frequent but tiny. Instead of a database row
+per lock they are kept as leases in a backend selected by WOPI_LOCK_BACKEND:
+
+    'local'     a sharded in-process table, swept by a background thread.
+                Only correct while a single process serves the WOPI
+                endpoints.
+    'cache'     the Django cache WOPI_LOCK_CACHE, shared between processes
+                when it is e.g. memcached. The file based 'locks' cache of
+                FRANCY_CACHE_DIR stands in for it on a single host.
+
+A lease expires WOPI_LOCK_TIMEOUT seconds (30 minutes per WOPI) after it was
+taken or refreshed. Every operation is a compare-and-swap on the lock id.
+"""
+
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from francy.cache.namespaces import CacheNamespace
+
+
+class LockConflict(Exception):
+    def __init__(self, current, reason):
+        super().__init__(reason)
+        # The lock id currently held, '' if the file is not locked
+        self.current = current or ''
+        self.reason = reason
+
+
+class LocalLockBackend:
+    def __init__(self, shards=64, sweep_interval=60):
+        # Independent lock per shard, so operations on different files rarely contend
+        self._shards = [({}, threading.Lock()) for _ in range(shards)]
+        self.sweep_interval = sweep_interval
+        self._sweeper_pid = None
+        self._sweeper_lock = threading.Lock()
+
+    def get(self, file_id):
+        leases, lock = self._shard(file_id)
+        with lock:
+            lease = leases.get(file_id)
+            if lease is None:
+                return None
+            if lease[1] <= time.monotonic():
+                del leases[file_id]
+                return None
+            return lease[0]
+
+    def compare_and_set(self, file_id, expected, new, timeout):
+        """Replace the lock id `expected` (None: unlocked) by `new` (None: unlock).
+
+        Returns a (success, current lock id) tuple.
+        """
+        leases, lock = self._shard(file_id)
+        now = time.monotonic()
+        with lock:
+            lease = leases.get(file_id)
+            current = lease[0] if lease is not None and lease[1] > now else None
+            if current != expected:
+                return False, current
+            if new is None:
+                leases.pop(file_id, None)
+            else:
+                leases[file_id] = (new, now + timeout)
+        if new is not None:
+            self._start_sweeper()
+        return True, new
+
+    def sweep(self):
+        """Drop expired leases and return how many there were."""
+        now = time.monotonic()
+        removed = 0
+        for leases, lock in self._shards:
+            with lock:
+                expired = [file_id for file_id, lease in leases.items() if lease[1] <= now]
+                for file_id in expired:
+                    del leases[file_id]
+            removed += len(expired)
+        return removed
+
+    def __len__(self):
+        return sum(len(leases) for leases, lock in self._shards)
+
+    def _shard(self, file_id):
+        return self._shards[hash(file_id) % len(self._shards)]
+
+    def _start_sweeper(self):
+        # Threads do not survive fork(), so every process starts its own sweeper
+        if self._sweeper_pid == os.getpid() or not self.sweep_interval:
+            return
+        with self._sweeper_lock:
+            if self._sweeper_pid != os.getpid():
+                thread = threading.Thread(target=self._sweep_forever, name='wopi-lock-sweeper', daemon=True)
+                thread.start()
+                self._sweeper_pid = os.getpid()
+
+    def _sweep_forever(self):
+        while True:
+            time.sleep(self.sweep_interval)
+            self.sweep()
+
+
+class CacheLockBackend:
+    def __init__(self, cache_alias='default', name='wopi-lock', mutex_timeout=5):
+        self.namespace = CacheNamespace(name, cache_alias)
+        self.mutex_timeout = mutex_timeout
+
+    def get(self, file_id):
+        return self.namespace.get(file_id)
+
+    def compare_and_set(self, file_id, expected, new, timeout):
+        with self._mutex(file_id):
+            current = self.namespace.get(file_id)
+            if current != expected:
+                return False, current
+            if new is None:
+                self.namespace.delete(file_id)
+            else:
+                self.namespace.set(file_id, new, timeout)
+        return True, new
+
+    @contextmanager
+    def _mutex(self, file_id):
+        # cache.add() is atomic on memcached, locmem (in one process) and
+        # francy.cache.backends.FileBasedCache, not on Django's own file cache.
+        # The mutex expires on its own should its holder die, so waiting longer
+        # than its timeout means the cache is failing, answered like a conflict.
+        mutex = (file_id, 'mutex')
+        owner = uuid.uuid4().hex
+        deadline = time.monotonic() + self.mutex_timeout
+        delay = 0.001
+        while not self.namespace.add(mutex, owner, self.mutex_timeout):
+            if time.monotonic() + delay > deadline:
+                raise LockConflict(self.get(file_id), 'File lock busy')
+            time.sleep(delay)
+            delay = min(delay * 2, 0.05)
+        try:
+            yield
+        finally:
+            # Not if it expired and was taken by another holder meanwhile.
+            # The cache API has no compare-and-delete, this narrows the race to the two calls.
+            if self.namespace.get(mutex) == owner:
+                self.namespace.delete(mutex)
+
+
+class LockManager:
+    """The WOPI lock operations on top of a lease backend."""
+
+    def __init__(self, backend, timeout=30 * 60):
+        self.backend = backend
+        self.timeout = timeout
+
+    def get_lock(self, file_id):
+        return self.backend.get(file_id) or ''
+
+    def lock(self, file_id, lock_id):
+        locked, current = self.backend.compare_and_set(file_id, None, lock_id, self.timeout)
+        if locked:
+            return
+        if current == lock_id:
+            # Locking again with the current lock id refreshes the lock
+            return self.refresh(file_id, lock_id)
+        raise LockConflict(current, 'File locked by another client')
+
+    def unlock_and_relock(self, file_id, old_lock_id, lock_id):
+        self._swap(file_id, old_lock_id, lock_id)
+
+    def refresh(self, file_id, lock_id):
+        self._swap(file_id, lock_id, lock_id)
+
+    def unlock(self, file_id, lock_id):
+        self._swap(file_id, lock_id, None)
+
+    def check_write(self, file_id, lock_id, size):
+        """Raise LockConflict unless a client presenting `lock_id` may write the file."""
+        current = self.backend.get(file_id)
+        if current is None:
+            # Unlocked files may only be written while they are empty
+            if size:
+                raise LockConflict(current, 'File not locked')
+        elif current != lock_id:
+            raise LockConflict(current, 'Lock mismatch')
+
+    def _swap(self, file_id, expected, new):
+        swapped, current = self.backend.compare_and_set(file_id, expected, new, self.timeout)
+        if not swapped:
+            raise LockConflict(current, 'Lock mismatch' if current else 'File not locked')
+
+
+def get_lock_backend(name):
+    if name == 'local':
+        return LocalLockBackend(sweep_interval=getattr(settings, 'WOPI_LOCK_SWEEP_INTERVAL', 60))
+    if name == 'cache':
+        return CacheLockBackend(cache_alias=getattr(settings, 'WOPI_LOCK_CACHE', 'default'))
+    raise ValueError('Unknown WOPI lock backend: ' + str(name))
+
+
+lock_manager = LockManager(
+    get_lock_backend(getattr(settings, 'WOPI_LOCK_BACKEND', 'local')),
+    timeout=getattr(settings, 'WOPI_LOCK_TIMEOUT', 30 * 60),
+)
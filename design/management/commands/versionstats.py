@@ -0,0 +1,19 @@
+#
+# Created on Mon Nov 02 2020
+#
+# Copyright (c) 2020 - Simon Prast
+#
+
+
+import json
+
+from django.core.management.base import BaseCommand
+
+from design.versions import version_store
+
+
+class Command(BaseCommand):
+    help = 'Prints the size of all document versions, the bytes actually stored and the dedup ratio.'
+
+    def handle(self, *args, **options):
+        self.stdout.write(json.dumps(version_store.stats(), indent=2))
@@ -1,3 +1,59 @@
+#
+# Created on Mon Nov 02 2020
+#
+# Copyright (c) 2020 - Simon Prast
+#
+
+
+from django.conf import settings
 from django.db import models
 
-# Create your models here.
+from user.permissions import DOCUMENT_READ, DOCUMENT_READ_OWN, DOCUMENT_WRITE, DOCUMENT_WRITE_OWN, has_action_on
+
+
+class Document(models.Model):
+    """A file edited through WOPI. The content lives on disk in MEDIA_ROOT,
+    the row only holds its metadata."""
+    name = models.CharField(max_length=255)
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='documents')
+    file = models.FileField(upload_to='documents/', blank=True)
+    size = models.BigIntegerField(default=0)
+    # Hex SHA-256 of the content, computed while it is written
+    sha256 = models.CharField(max_length=64, blank=True)
+    # Incremented on every save of the content, reported as the WOPI item version
+    version = models.PositiveIntegerField(default=1)
+    created = models.DateTimeField(auto_now_add=True)
+    modified = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.name
+
+    def can_read(self, user):
+        return has_action_on(user, DOCUMENT_READ, DOCUMENT_READ_OWN, self.owner_id)
+
+    def can_write(self, user):
+        return has_action_on(user, DOCUMENT_WRITE, DOCUMENT_WRITE_OWN, self.owner_id)
+
+
+class Chunk(models.Model):
+    """A content-addressed piece of document content in the version store."""
+    digest = models.CharField(max_length=64, primary_key=True)
+    size = models.PositiveIntegerField()
+
+
+class DocumentVersion(models.Model):
+    document = models.ForeignKey(Document, on_delete=models.CASCADE, related_name='versions')
+    number = models.PositiveIntegerField()
+    author = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, related_name='+')
+    size = models.BigIntegerField()
+    sha256 = models.CharField(max_length=64)
+    # Concatenated SHA-256 digests (32 bytes each) of the chunks, in order
+    manifest = models.BinaryField()
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = [('document', 'number')]
+        ordering = ['document', 'number']
+
+    def __str__(self):
+        return '{} v{}'.format(self.document, self.number)
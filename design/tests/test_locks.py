@@ -0,0 +1,114 @@
+#
+# Created on Mon Nov 02 2020
+#
+# Copyright (c) 2020 - Simon Prast
+#
+
+
+import os
+import shutil
+import tempfile
+import time
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from design.locks import CacheLockBackend, LocalLockBackend, LockConflict, LockManager
+from francy.cache.backends import FileBasedCache
+
+
+class LockBackendTests(SimpleTestCase):
+    def backends(self):
+        return (LocalLockBackend(sweep_interval=0),
+                CacheLockBackend(cache_alias='default', name='wopi-lock-test'))
+
+    def test_compare_and_set(self):
+        for backend in self.backends():
+            with self.subTest(backend=type(backend).__name__):
+                self.assertEqual(backend.compare_and_set(1, None, 'a', 60), (True, 'a'))
+                # Taken by another client
+                self.assertEqual(backend.compare_and_set(1, None, 'b', 60), (False, 'a'))
+                self.assertEqual(backend.compare_and_set(1, 'b', None, 60), (False, 'a'))
+                self.assertEqual(backend.compare_and_set(1, 'a', 'b', 60), (True, 'b'))
+                self.assertEqual(backend.get(1), 'b')
+                self.assertEqual(backend.compare_and_set(1, 'b', None, 60), (True, None))
+                self.assertIsNone(backend.get(1))
+                # Unlocking an unlocked file fails
+                self.assertEqual(backend.compare_and_set(1, 'b', None, 60), (False, None))
+
+    def test_local_leases_expire(self):
+        backend = LocalLockBackend(sweep_interval=0)
+        with mock.patch('design.locks.time.monotonic', return_value=100.0):
+            backend.compare_and_set(1, None, 'a', 60)
+            backend.compare_and_set(2, None, 'a', 600)
+        with mock.patch('design.locks.time.monotonic', return_value=200.0):
+            self.assertIsNone(backend.get(1))
+            self.assertEqual(backend.compare_and_set(1, None, 'b', 60), (True, 'b'))
+            self.assertEqual(backend.get(2), 'a')
+        with mock.patch('design.locks.time.monotonic', return_value=1000.0):
+            self.assertEqual(backend.sweep(), 2)
+            self.assertEqual(len(backend), 0)
+
+    def test_manager_conflicts(self):
+        manager = LockManager(LocalLockBackend(sweep_interval=0))
+        manager.lock(1, 'a')
+        # Locking again with the same id refreshes the lock
+        manager.lock(1, 'a')
+        with self.assertRaises(LockConflict) as conflict:
+            manager.lock(1, 'b')
+        self.assertEqual(conflict.exception.current, 'a')
+        self.assertEqual(conflict.exception.reason, 'File locked by another client')
+        with self.assertRaises(LockConflict) as conflict:
+            manager.refresh(1, 'b')
+        self.assertEqual(conflict.exception.reason, 'Lock mismatch')
+        manager.unlock_and_relock(1, 'a', 'b')
+        self.assertEqual(manager.get_lock(1), 'b')
+        manager.check_write(1, 'b', 100)
+        with self.assertRaises(LockConflict):
+            manager.check_write(1, 'a', 100)
+        manager.unlock(1, 'b')
+        with self.assertRaises(LockConflict) as conflict:
+            manager.unlock(1, 'b')
+        self.assertEqual((conflict.exception.current, conflict.exception.reason), ('', 'File not locked'))
+        # Unlocked files may only be written while they are empty
+        manager.check_write(1, '', 0)
+        with self.assertRaises(LockConflict):
+            manager.check_write(1, '', 100)
+
+    def test_busy_mutex(self):
+        backend = CacheLockBackend(cache_alias='default', name='wopi-lock-test', mutex_timeout=0.05)
+        backend.compare_and_set(1, None, 'a', 60)
+        backend.namespace.add((1, 'mutex'), 'other-holder', 60)
+        with self.assertRaises(LockConflict) as conflict:
+            backend.compare_and_set(1, 'a', None, 60)
+        self.assertEqual((conflict.exception.current, conflict.exception.reason), ('a', 'File lock busy'))
+        self.assertEqual(backend.get(1), 'a')
+
+    def test_mutex_of_another_holder_is_kept(self):
+        backend = CacheLockBackend(cache_alias='default', name='wopi-lock-test')
+        with backend._mutex(1):
+            # Expired and taken by another holder meanwhile
+            backend.namespace.set((1, 'mutex'), 'other-holder', 60)
+        self.assertEqual(backend.namespace.get((1, 'mutex')), 'other-holder')
+        with backend._mutex(2):
+            pass
+        self.assertIsNone(backend.namespace.get((2, 'mutex')))
+
+
+class FileBasedCacheAddTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.cache = FileBasedCache(self.directory, {})
+
+    def test_add_only_once(self):
+        self.assertTrue(self.cache.add('mutex', 1, 60))
+        self.assertFalse(self.cache.add('mutex', 2, 60))
+        self.assertEqual(self.cache.get('mutex'), 1)
+
+    def test_add_replaces_expired_entry(self):
+        self.cache.set('mutex', 1, 60)
+        with mock.patch('francy.cache.backends.time.time', return_value=time.time() + 120):
+            self.assertTrue(self.cache.add('mutex', 2, 60))
+        self.assertEqual(self.cache.get('mutex'), 2)
+        self.assertEqual(sorted(name.endswith('.djcache') for name in os.listdir(self.directory)), [True])
@@ -0,0 +1,45 @@
+#
+# Created on Mon Nov 02 2020
+#
+# Copyright (c) 2020 - Simon Prast
+#
+
+
+import time
+from types import SimpleNamespace
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from design.tokens import InvalidAccessToken, access_tokens
+
+
+class AccessTokenTests(SimpleTestCase):
+    user, document = SimpleNamespace(pk=7), SimpleNamespace(pk=3)
+
+    def test_verify(self):
+        token, expires = access_tokens.mint(self.user, self.document, True)
+        verified = access_tokens.verify(token, 3)
+        self.assertEqual((verified.user_id, verified.file_id, verified.can_write), (7, 3, True))
+        with self.assertRaises(InvalidAccessToken):
+            access_tokens.verify(token, 4)
+        with self.assertRaises(InvalidAccessToken):
+            access_tokens.verify(token[:-2] + 'xx', 3)
+        with mock.patch('design.tokens.time.time', return_value=expires + 1):
+            with self.assertRaises(InvalidAccessToken):
+                access_tokens.verify(token, 3)
+
+    def test_revocation(self):
+        user = SimpleNamespace(pk=1)
+        token, _ = access_tokens.mint(user, self.document, False)
+        other, _ = access_tokens.mint(user, SimpleNamespace(pk=4), False)
+        access_tokens.revoke(token)
+        with self.assertRaises(InvalidAccessToken):
+            access_tokens.verify(token, 3)
+        access_tokens.verify(other, 4)
+        access_tokens.revoke_user(user.pk)
+        with self.assertRaises(InvalidAccessToken):
+            access_tokens.verify(other, 4)
+        # Tokens issued after the revocation are valid
+        time.sleep(0.002)
+        access_tokens.verify(access_tokens.mint(user, self.document, False)[0], 3)
@@ -0,0 +1,76 @@
+#
+# Created on Mon Nov 02 2020
+#
+# Copyright (c) 2020 - Simon Prast
+#
+
+
+import hashlib
+import random
+import shutil
+import tempfile
+
+from django.test import SimpleTestCase, TestCase
+
+from design.chunking import iter_chunks
+from design.models import Document
+from design.versions import VersionStore
+from user.models import User
+
+
+def random_bytes(size, seed=0):
+    return random.Random(seed).getrandbits(size * 8).to_bytes(size, 'little')
+
+
+class ChunkingTests(SimpleTestCase):
+    def chunks(self, data, block_size, **kwargs):
+        return list(iter_chunks((data[i:i + block_size] for i in range(0, len(data), block_size)), **kwargs))
+
+    def test_deterministic(self):
+        data = random_bytes(300000)
+        chunks = self.chunks(data, 65536, min_size=2048, boundary_bits=12, max_size=32768)
+        self.assertEqual(b''.join(chunks), data)
+        self.assertGreater(len(chunks), 5)
+        for block_size in (1000, 4096, 100000, len(data)):
+            self.assertEqual(self.chunks(data, block_size, min_size=2048, boundary_bits=12, max_size=32768), chunks)
+        self.assertTrue(all(len(chunk) <= 32768 for chunk in chunks))
+        self.assertTrue(all(len(chunk) >= 2048 for chunk in chunks[:-1]))
+
+    def test_edit_keeps_following_chunks(self):
+        data = random_bytes(300000)
+        edited = data[:150000] + b'inserted' + data[150000:]
+        kwargs = {'min_size': 2048, 'boundary_bits': 12, 'max_size': 32768}
+        before, after = self.chunks(data, 8192, **kwargs), self.chunks(edited, 8192, **kwargs)
+        self.assertGreaterEqual(len(set(before) & set(after)), len(before) - 2)
+
+
+class VersionStoreTests(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.store = VersionStore(directory)
+        self.document = Document.objects.create(name='a.docx', owner=User.objects.create(username='owner'))
+
+    def save(self, data, number):
+        writer = self.store.writer()
+        for offset in range(0, len(data), 10000):
+            writer.feed(data[offset:offset + 10000])
+        return writer, writer.save(self.document, number)
+
+    def test_reassembly(self):
+        first = random_bytes(500000)
+        second = first[:250000] + b'edited' + first[250010:]
+        _, version1 = self.save(first, 1)
+        writer, version2 = self.save(second, 2)
+        self.assertEqual(b''.join(self.store.read(version1)), first)
+        self.assertEqual(b''.join(self.store.read(version2)), second)
+        self.assertEqual(version2.sha256, hashlib.sha256(second).hexdigest())
+        # Only the chunks around the edit are written again
+        self.assertLess(writer.written, len(second) // 2)
+        stats = self.store.stats()
+        self.assertEqual(stats['logical_bytes'], len(first) + len(second))
+        self.assertLess(stats['stored_bytes'], stats['logical_bytes'])
+
+    def test_empty_version(self):
+        _, version = self.save(b'', 1)
+        self.assertEqual(b''.join(self.store.read(version)), b'')
@@ -0,0 +1,144 @@
+#
+# Created on Mon Nov 02 2020
+#
+# Copyright (c) 2020 - Simon Prast
+#
+
+
+import os
+import shutil
+import tempfile
+import time
+from types import SimpleNamespace
+from unittest import mock
+
+from django.test import TestCase, override_settings
+
+from design.locks import LocalLockBackend, lock_manager
+from design.models import Document, DocumentVersion
+from design.tokens import access_tokens
+from design.versions import version_store
+from user.models import AuthToken, User
+
+
+class WOPITests(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        settings_override = override_settings(MEDIA_ROOT=os.path.join(directory, 'media'))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        for patch in (mock.patch.object(version_store, 'root', os.path.join(directory, 'versions')),
+                      mock.patch.object(lock_manager, 'backend', LocalLockBackend(sweep_interval=0))):
+            patch.start()
+            self.addCleanup(patch.stop)
+
+        self.owner = User.objects.create(username='owner')
+        self.document = Document.objects.create(name='a.docx', owner=self.owner)
+        self.token = access_tokens.mint(self.owner, self.document, True)[0]
+
+    def url(self, suffix='', token=None, document=None):
+        return '/api/dev/wopi/files/{}{}?access_token={}'.format(
+            (document or self.document).pk, suffix, token or self.token)
+
+    def lock(self, override, lock_id, **headers):
+        return self.client.post(self.url(), HTTP_X_WOPI_OVERRIDE=override, HTTP_X_WOPI_LOCK=lock_id, **headers)
+
+    def put(self, content, lock_id=''):
+        return self.client.post(self.url('/contents'), content, content_type='application/octet-stream',
+                                HTTP_X_WOPI_OVERRIDE='PUT', HTTP_X_WOPI_LOCK=lock_id)
+
+    def test_check_file_info(self):
+        response = self.client.get(self.url())
+        self.assertEqual(response.status_code, 200)
+        info = response.json()
+        self.assertEqual((info['BaseFileName'], info['Size'], info['UserFriendlyName']), ('a.docx', 0, 'owner'))
+        self.assertTrue(info['UserCanWrite'])
+        self.assertTrue(info['SupportsLocks'])
+
+    def test_invalid_tokens(self):
+        other = Document.objects.create(name='b.docx', owner=self.owner)
+        self.assertEqual(self.client.get(self.url(token='nope')).status_code, 401)
+        # A token of another document
+        self.assertEqual(self.client.get(self.url(document=other)).status_code, 401)
+        missing = SimpleNamespace(pk=other.pk + 1000)
+        self.assertEqual(self.client.get(self.url(
+            token=access_tokens.mint(self.owner, missing, True)[0], document=missing)).status_code, 404)
+
+    def test_rotating_the_api_token_revokes_access(self):
+        AuthToken.objects.create(user=self.owner)
+        time.sleep(0.002)
+        AuthToken.objects.rotate(self.owner)
+        self.assertEqual(self.client.get(self.url()).status_code, 401)
+
+    def test_put_and_get_file(self):
+        content = os.urandom(200000)
+        # An empty, unlocked file may be written without a lock
+        response = self.put(content)
+        self.assertEqual((response.status_code, response['X-WOPI-ItemVersion']), (200, '2'))
+
+        response = self.client.get(self.url('/contents'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), content)
+        self.assertEqual(response['X-WOPI-ItemVersion'], '2')
+
+        response = self.client.get(self.url('/contents'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+        response = self.client.get(self.url('/contents'), HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), content[10:20])
+        self.assertEqual(response['Content-Range'], 'bytes 10-19/200000')
+        self.assertEqual(self.client.get(self.url('/contents'), HTTP_RANGE='bytes=300000-').status_code, 416)
+
+        # Writing a non-empty file needs the lock
+        response = self.put(b'changed')
+        self.assertEqual((response.status_code, response['X-WOPI-LockFailureReason']), (409, 'File not locked'))
+
+    def test_lock_flow(self):
+        self.put(b'first')
+        self.assertEqual(self.lock('LOCK', 'a').status_code, 200)
+        self.assertEqual(self.lock('GET_LOCK', '')['X-WOPI-Lock'], 'a')
+
+        response = self.lock('LOCK', 'b')
+        self.assertEqual((response.status_code, response['X-WOPI-Lock']), (409, 'a'))
+        response = self.put(b'second', lock_id='b')
+        self.assertEqual((response.status_code, response['X-WOPI-Lock']), (409, 'a'))
+
+        response = self.put(b'second', lock_id='a')
+        self.assertEqual((response.status_code, response['X-WOPI-ItemVersion']), (200, '3'))
+        self.assertEqual(self.lock('REFRESH_LOCK', 'a').status_code, 200)
+        self.assertEqual(self.lock('UNLOCK', 'b').status_code, 409)
+        # UnlockAndRelock
+        self.assertEqual(self.lock('LOCK', 'b', HTTP_X_WOPI_OLDLOCK='a').status_code, 200)
+        self.assertEqual(self.lock('UNLOCK', 'b').status_code, 200)
+        self.assertEqual(self.lock('GET_LOCK', '')['X-WOPI-Lock'], '')
+
+        # Every PutFile stored a version
+        self.assertEqual(list(DocumentVersion.objects.values_list('number', flat=True)), [2, 3])
+        for number, content in ((2, b'first'), (3, b'second')):
+            response = self.client.get(self.url('/versions/{}/contents'.format(number)))
+            self.assertEqual(b''.join(response.streaming_content), content)
+        self.assertEqual(self.client.get(self.url('/versions/9/contents')).status_code, 404)
+
+    def test_read_only_token(self):
+        self.token = access_tokens.mint(self.owner, self.document, False)[0]
+        self.assertFalse(self.client.get(self.url()).json()['UserCanWrite'])
+        self.assertEqual(self.lock('LOCK', 'a').status_code, 403)
+        self.assertEqual(self.put(b'content').status_code, 403)
+        self.assertEqual(self.lock('GET_LOCK', '').status_code, 200)
+
+    def test_access_token_endpoint(self):
+        api_token = AuthToken.objects.create(user=self.owner)
+        stranger = User.objects.create(username='stranger')
+        others = Document.objects.create(name='c.docx', owner=stranger)
+        url = '/api/dev/wopi/files/{}/access_token'
+        authorization = 'Token ' + api_token.key
+
+        response = self.client.post(url.format(self.document.pk), HTTP_AUTHORIZATION=authorization)
+        self.assertEqual(response.status_code, 200)
+        self.token = response.json()['access_token']
+        self.assertEqual(self.client.get(self.url()).status_code, 200)
+        # Documents of other users are reported as missing
+        self.assertEqual(self.client.post(url.format(others.pk), HTTP_AUTHORIZATION=authorization).status_code, 404)
+        self.assertEqual(self.client.post(url.format(self.document.pk)).status_code, 401)
@@ -0,0 +1,119 @@
+#
+# Created on Mon Nov 02 2020
+#
+# Copyright (c) 2020 - Simon Prast
+#
+
+
+"""
+WOPI access tokens.
+
+WOPI clients send the access token with every request. Instead of an API
+token that costs a Token + User query to resolve, they get a signed token
+scoped to a single document:
+
+    <user id>.<file id>.<r|w>.<issued>.<expires>.<HMAC-SHA256 signature>
+
+`issued` is a UNIX time in milliseconds, `expires` in seconds. Verifying a
+token takes one HMAC over the payload and one lookup of its revocations.
+Tokens can be revoked per token or for all tokens of a user issued up to a
+point in time, e.g. when the API token of the user is deleted on logout or a
+password change. Revocations are stored in the cache WOPI_REVOCATION_CACHE,
+which all processes share, until the revoked tokens would have expired anyway.
+"""
+
+import base64
+import hashlib
+import hmac
+import time
+from collections import namedtuple
+
+from django.conf import settings
+
+from francy.cache.namespaces import CacheNamespace
+
+
+AccessToken = namedtuple('AccessToken', ['user_id', 'file_id', 'can_write', 'issued', 'expires'])
+
+
+class InvalidAccessToken(Exception):
+    pass
+
+
+class RevocationCache:
+    """Revoked tokens and users, kept until their tokens would have expired anyway."""
+
+    def __init__(self, ttl, cache_alias='default', name='wopi-revoked'):
+        self.ttl = ttl
+        self.namespace = CacheNamespace(name, cache_alias)
+
+    def revoke(self, signature, expires):
+        timeout = int(expires - time.time()) + 1
+        if timeout > 0:
+            self.namespace.set(('token', signature), True, timeout)
+
+    def revoke_user(self, user_id):
+        # Milliseconds like `issued`, so a token minted right after the revocation stays valid
+        self.namespace.set(('user', user_id), _now_ms(), self.ttl + 1)
+
+    def is_revoked(self, signature, user_id, issued):
+        found = self.namespace.get_many([('token', signature), ('user', user_id)])
+        if ('token', signature) in found:
+            return True
+        revoked = found.get(('user', user_id))
+        return revoked is not None and issued <= revoked
+
+
+def _now_ms():
+    return time.time_ns() // 1000000
+
+
+class AccessTokenSigner:
+    def __init__(self, secret, ttl=10 * 60 * 60, salt='design.tokens.AccessTokenSigner', revocation_cache='default'):
+        self.ttl = ttl
+        key = hashlib.sha256((salt + secret).encode()).digest()
+        # Copying a keyed HMAC skips the key setup on every signature
+        self._hmac = hmac.new(key, digestmod=hashlib.sha256)
+        self.revoked = RevocationCache(ttl, revocation_cache)
+
+    def mint(self, user, document, can_write):
+        """Return an access token of `user` for `document` and its expiry as UNIX time."""
+        issued = _now_ms()
+        expires = issued // 1000 + self.ttl
+        payload = '{}.{}.{}.{}.{}'.format(user.pk, document.pk, 'w' if can_write else 'r', issued, expires)
+        return '{}.{}'.format(payload, self._sign(payload)), expires
+
+    def verify(self, token, file_id):
+        """Return the AccessToken if `token` is valid for the file, raise InvalidAccessToken otherwise."""
+        payload, separator, signature = token.rpartition('.')
+        if not separator or not hmac.compare_digest(signature, self._sign(payload)):
+            raise InvalidAccessToken('Invalid signature.')
+
+        user_id, token_file_id, permission, issued, expires = payload.split('.')
+        user_id, issued, expires = int(user_id), int(issued), int(expires)
+        if int(token_file_id) != file_id:
+            raise InvalidAccessToken('Token for another file.')
+        if expires <= time.time():
+            raise InvalidAccessToken('Token expired.')
+        if self.revoked.is_revoked(signature, user_id, issued):
+            raise InvalidAccessToken('Token revoked.')
+        return AccessToken(user_id, file_id, permission == 'w', issued, expires)
+
+    def revoke(self, token):
+        payload, separator, signature = token.rpartition('.')
+        self.revoked.revoke(signature, int(payload.rpartition('.')[2] or 0))
+
+    def revoke_user(self, user_id):
+        self.revoked.revoke_user(user_id)
+
+    def _sign(self, payload):
+        signer = self._hmac.copy()
+        signer.update(payload.encode())
+        return base64.urlsafe_b64encode(signer.digest()).rstrip(b'=').decode()
+
+
+access_tokens = AccessTokenSigner(
+    settings.SECRET_KEY,
+    ttl=getattr(settings, 'WOPI_ACCESS_TOKEN_TTL', 10 * 60 * 60),
+    revocation_cache=getattr(settings, 'WOPI_REVOCATION_CACHE', 'default'),
+)
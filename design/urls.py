@@ -0,0 +1,17 @@
+#
+# Created on Mon Nov 02 2020
+#
+# Copyright (c) 2020 - Simon Prast
+#
+
+
+from django.urls import path
+
+from . import views
+
+urlpatterns = [
+    path('files/<int:file_id>', views.file_info),
+    path('files/<int:file_id>/contents', views.file_contents),
+    path('files/<int:file_id>/versions/<int:number>/contents', views.version_contents),
+    path('files/<int:file_id>/access_token', views.AccessTokenView.as_view()),
+]
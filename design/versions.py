@@ -0,0 +1,124 @@
+#
+# Created on Mon Nov 02 2020
+#
+# Copyright (c) 2020 - Simon Prast
+#
+
+
+"""
+Content-addressed version store.
+
+Every saved version of a document is cut into content-defined chunks (see
+design/chunking.py). Chunks are stored once, named by their SHA-256 digest,
+in WOPI_VERSION_ROOT; a version is the ordered list of its chunk digests.
+Saving a slightly changed document therefore only writes the chunks around
+the changes.
+"""
+
+import hashlib
+import os
+import tempfile
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Sum
+
+from .chunking import Chunker
+from .models import Chunk, DocumentVersion
+
+
+DIGEST_SIZE = hashlib.sha256().digest_size
+
+
+class VersionWriter:
+    """Collects the content of one version, fed in blocks of any size."""
+
+    def __init__(self, store):
+        self.store = store
+        self.size = 0
+        self.written = 0
+        self._chunker = Chunker()
+        self._digest = hashlib.sha256()
+        self._manifest = bytearray()
+        # Distinct chunks of this version: hex digest -> size
+        self._chunks = {}
+
+    def feed(self, data):
+        self.size += len(data)
+        self._digest.update(data)
+        for chunk in self._chunker.feed(data):
+            self._store_chunk(chunk)
+
+    def save(self, document, number, author_id=None):
+        """Store the remaining chunks and record the version."""
+        for chunk in self._chunker.finish():
+            self._store_chunk(chunk)
+        with transaction.atomic():
+            Chunk.objects.bulk_create(
+                # Also chunks already on disk, whose row may be missing after a failed save
+                [Chunk(digest=digest, size=size) for digest, size in self._chunks.items()],
+                ignore_conflicts=True,
+            )
+            return DocumentVersion.objects.create(
+                document=document, number=number, author_id=author_id,
+                size=self.size, sha256=self._digest.hexdigest(), manifest=bytes(self._manifest),
+            )
+
+    def _store_chunk(self, chunk):
+        digest = hashlib.sha256(chunk).digest()
+        self._manifest += digest
+        hexdigest = digest.hex()
+        if hexdigest in self._chunks:
+            return
+        self._chunks[hexdigest] = len(chunk)
+        path = self.store.chunk_path(hexdigest)
+        if not os.path.exists(path):
+            self.store.write_chunk(path, chunk)
+            self.written += len(chunk)
+
+
+class VersionStore:
+    def __init__(self, root):
+        self.root = str(root)
+
+    def writer(self):
+        return VersionWriter(self)
+
+    def read(self, version):
+        """Yield the content of a DocumentVersion chunk by chunk."""
+        manifest = bytes(version.manifest)
+        for offset in range(0, len(manifest), DIGEST_SIZE):
+            with open(self.chunk_path(manifest[offset:offset + DIGEST_SIZE].hex()), 'rb') as file:
+                yield file.read()
+
+    def stats(self):
+        """Bytes of all versions compared to the bytes actually stored."""
+        logical = DocumentVersion.objects.aggregate(total=Sum('size'))['total'] or 0
+        stored = Chunk.objects.aggregate(total=Sum('size'))['total'] or 0
+        return {
+            'versions': DocumentVersion.objects.count(),
+            'chunks': Chunk.objects.count(),
+            'logical_bytes': logical,
+            'stored_bytes': stored,
+            'dedup_ratio': round(logical / stored, 3) if stored else 0.0,
+        }
+
+    def chunk_path(self, hexdigest):
+        # Two levels of fan-out keep the directories small
+        return os.path.join(self.root, hexdigest[:2], hexdigest[2:4], hexdigest)
+
+    def write_chunk(self, path, chunk):
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        # Concurrent writers of the same chunk write identical content, so the last rename wins harmlessly
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.chunk-')
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                file.write(chunk)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+
+version_store = VersionStore(getattr(settings, 'WOPI_VERSION_ROOT', settings.BASE_DIR / 'versions'))
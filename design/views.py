@@ -1,3 +1,250 @@
-from django.shortcuts import render
+#
+# Created on Mon Nov 02 2020
+#
+# Copyright (c) 2020 - Simon Prast
+#
 
-# Create your views here.
+
+"""
+WOPI host endpoints (https://docs.microsoft.com/microsoft-365/cloud-storage-partner-program/rest/).
+
+    GET  files/<id>             CheckFileInfo
+    POST files/<id>             Lock, GetLock, RefreshLock, Unlock and
+                                UnlockAndRelock (X-WOPI-Override)
+    GET  files/<id>/contents    GetFile, supports single byte ranges
+    POST files/<id>/contents    PutFile (X-WOPI-Override: PUT), stores a version
+    GET  files/<id>/versions/<number>/contents
+                                Content of a version saved through PutFile
+
+    POST files/<id>/access_token
+                                Issues a WOPI access token of the user
+                                authenticated by the API token
+
+Every WOPI request carries a signed access token (see design/tokens.py)
+as `access_token` query parameter.
+"""
+
+import base64
+import os
+from functools import wraps
+
+from django.db import transaction
+from django.db.models import F
+from django.http import FileResponse, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.http import quote_etag
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+
+from rest_framework import exceptions, permissions
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from francy.conditional import add_validators, not_modified
+from user.models import User
+from .files import RangeNotSatisfiable, iter_range, parse_range, write_stream
+from .locks import LockConflict, lock_manager
+from .models import Document, DocumentVersion
+from .tokens import InvalidAccessToken, access_tokens
+from .versions import version_store
+
+
+def wopi_view(view_func):
+    """Verifies the access token and passes the requested document to the view.
+    The token is available as `request.access_token`."""
+    @wraps(view_func)
+    def view(request, file_id, **kwargs):
+        try:
+            request.access_token = access_tokens.verify(request.GET.get('access_token', ''), file_id)
+        except (InvalidAccessToken, ValueError):
+            return HttpResponse(status=401)
+
+        document = Document.objects.filter(pk=file_id).first()
+        if document is None:
+            return HttpResponse(status=404)
+        return view_func(request, document, **kwargs)
+
+    # WOPI clients authenticate with the access token, not with cookies
+    return csrf_exempt(view)
+
+
+def lock_conflict(conflict):
+    response = HttpResponse(status=409)
+    response['X-WOPI-Lock'] = conflict.current
+    response['X-WOPI-LockFailureReason'] = conflict.reason
+    return response
+
+
+@require_http_methods(['GET', 'POST'])
+@wopi_view
+def file_info(request, document):
+    if request.method == 'POST':
+        return file_lock(request, document)
+    return check_file_info(request, document)
+
+
+def check_file_info(request, document):
+    access_token = request.access_token
+    can_write = access_token.can_write
+    info = {
+        'BaseFileName': document.name,
+        'OwnerId': str(document.owner_id),
+        'Size': document.size,
+        'UserId': str(access_token.user_id),
+        # Only needed once per editing session, so the user is looked up here only
+        'UserFriendlyName': User.objects.filter(pk=access_token.user_id).values_list('username', flat=True).first(),
+        'Version': str(document.version),
+        'LastModifiedTime': document.modified.isoformat(),
+        'ReadOnly': not can_write,
+        'UserCanWrite': can_write,
+        'SupportsUpdate': True,
+        'SupportsLocks': True,
+        'SupportsGetLock': True,
+        'SupportsExtendedLockLength': True,
+    }
+    if document.sha256:
+        info['SHA256'] = base64.b64encode(bytes.fromhex(document.sha256)).decode()
+    return JsonResponse(info)
+
+
+def file_lock(request, document):
+    override = request.headers.get('X-WOPI-Override')
+    lock_id = request.headers.get('X-WOPI-Lock', '')
+
+    if override == 'GET_LOCK':
+        response = HttpResponse()
+        response['X-WOPI-Lock'] = lock_manager.get_lock(document.pk)
+        return response
+    if override not in ('LOCK', 'REFRESH_LOCK', 'UNLOCK'):
+        return HttpResponse(status=501)
+    if not request.access_token.can_write:
+        return HttpResponse(status=403)
+    # WOPI lock ids are opaque strings of up to 1024 characters
+    if not lock_id or len(lock_id) > 1024:
+        return HttpResponse(status=400)
+
+    try:
+        if override == 'LOCK':
+            old_lock_id = request.headers.get('X-WOPI-OldLock')
+            if old_lock_id:
+                lock_manager.unlock_and_relock(document.pk, old_lock_id, lock_id)
+            else:
+                lock_manager.lock(document.pk, lock_id)
+        elif override == 'REFRESH_LOCK':
+            lock_manager.refresh(document.pk, lock_id)
+        else:
+            lock_manager.unlock(document.pk, lock_id)
+    except LockConflict as conflict:
+        return lock_conflict(conflict)
+
+    response = HttpResponse()
+    response['X-WOPI-ItemVersion'] = str(document.version)
+    return response
+
+
+@require_http_methods(['GET', 'POST'])
+@wopi_view
+def file_contents(request, document):
+    if request.method == 'POST':
+        return put_file(request, document)
+    return get_file(request, document)
+
+
+def get_file(request, document):
+    # The content hash validates the file without touching it
+    etag = quote_etag(document.sha256) if document.sha256 else None
+    response = not_modified(request, etag)
+    if response is None:
+        response = file_response(request, document)
+    response['X-WOPI-ItemVersion'] = str(document.version)
+    return add_validators(request, response, etag, {'private': True, 'no_cache': True})
+
+
+def file_response(request, document):
+    if not document.file:
+        response = HttpResponse(b'', content_type='application/octet-stream')
+        response['Accept-Ranges'] = 'bytes'
+        return response
+
+    file = open(document.file.path, 'rb')
+    # Size of the opened file, the path may be replaced by a concurrent PutFile
+    size = os.fstat(file.fileno()).st_size
+    try:
+        byte_range = parse_range(request.headers.get('Range'), size)
+    except RangeNotSatisfiable:
+        file.close()
+        response = HttpResponse(status=416)
+        response['Content-Range'] = 'bytes */{}'.format(size)
+        return response
+
+    if byte_range is None:
+        # Streamed by the server, with sendfile() where available
+        response = FileResponse(file, content_type='application/octet-stream')
+        response['Content-Length'] = size
+    else:
+        start, end = byte_range
+        response = StreamingHttpResponse(
+            iter_range(file, start, end), status=206, content_type='application/octet-stream')
+        response['Content-Length'] = end - start + 1
+        response['Content-Range'] = 'bytes {}-{}/{}'.format(start, end, size)
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def put_file(request, document):
+    if request.headers.get('X-WOPI-Override') != 'PUT':
+        return HttpResponse(status=501)
+    if not request.access_token.can_write:
+        return HttpResponse(status=403)
+    try:
+        lock_manager.check_write(document.pk, request.headers.get('X-WOPI-Lock', ''), document.size)
+    except LockConflict as conflict:
+        return lock_conflict(conflict)
+
+    if not document.file:
+        name = document.file.field.generate_filename(document, os.path.basename(document.name) or 'document')
+        document.file.name = document.file.storage.get_available_name(name)
+
+    # Copy the body to disk chunk by chunk, it is never read into memory as a whole.
+    # The version store deduplicates the same blocks on the way.
+    version_writer = version_store.writer()
+    size, sha256 = write_stream(request.read, document.file.path, tee=version_writer.feed)
+
+    with transaction.atomic():
+        Document.objects.filter(pk=document.pk).update(
+            file=document.file.name, size=size, sha256=sha256, version=F('version') + 1, modified=timezone.now())
+        document.refresh_from_db(fields=['version'])
+        version_writer.save(document, document.version, author_id=request.access_token.user_id)
+
+    response = HttpResponse()
+    response['X-WOPI-ItemVersion'] = str(document.version)
+    return response
+
+
+@require_http_methods(['GET'])
+@wopi_view
+def version_contents(request, document, number):
+    version = DocumentVersion.objects.filter(document=document, number=number).first()
+    if version is None:
+        return HttpResponse(status=404)
+    etag = quote_etag(version.sha256)
+    response = not_modified(request, etag)
+    if response is None:
+        response = StreamingHttpResponse(version_store.read(version), content_type='application/octet-stream')
+        response['Content-Length'] = version.size
+    response['X-WOPI-ItemVersion'] = str(version.number)
+    # Saved versions never change
+    return add_validators(request, response, etag, {'private': True, 'max_age': 365 * 24 * 60 * 60, 'immutable': True})
+
+
+class AccessTokenView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, file_id):
+        document = Document.objects.filter(pk=file_id).first()
+        # Documents of other users are reported as missing
+        if document is None or not document.can_read(request.user):
+            raise exceptions.NotFound
+        access_token, expires = access_tokens.mint(request.user, document, document.can_write(request.user))
+        # WOPI expects the expiry in milliseconds since the epoch
+        return Response({'access_token': access_token, 'access_token_ttl': expires * 1000})
@@ -9,8 +9,11 @@ https://docs.djangoproject.com/en/3.1/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+from francy.handlers import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'francy.settings')
+# Serve the user API with its async views, see user/api/dev/async_views.py
+os.environ.setdefault('FRANCY_ASYNC_API', '1')
 
+# Django's handler, streaming responses from a worker thread instead of the event loop
 application = get_asgi_application()
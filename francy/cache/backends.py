@@ -0,0 +1,122 @@
+#
+# Created on Mon Nov 02 2020
+#
+# Copyright (c) 2020 - Simon Prast
+#
+
+
+import os
+import pickle
+import random
+import tempfile
+import time
+import uuid
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.filebased import FileBasedCache as DjangoFileBasedCache
+
+
+class FileBasedCache(DjangoFileBasedCache):
+    """Django's file cache, with an atomic `add()` and without the race of `has_key()` against a concurrent delete.
+
+    Django's add() checks has_key() and then sets the key, so concurrent calls
+    could all succeed. Here the entry is written to a temporary file and hard
+    linked to its name: unlike a rename, a link fails if the name exists, so
+    exactly one of several processes adding the same key succeeds.
+
+    Culling removes expired entries first and only then live ones at random.
+    Counting the entries lists the whole directory, so each cache object does it
+    at most once every OPTIONS['CULL_INTERVAL'] seconds (default: 5) instead of on
+    every write, the cache may exceed MAX_ENTRIES by the writes in between.
+    """
+
+    def __init__(self, dir, params):
+        super().__init__(dir, params)
+        self._cull_interval = float(params.get('OPTIONS', {}).get('CULL_INTERVAL', 5))
+        self._next_cull = 0
+
+    def has_key(self, key, version=None):
+        fname = self._key_to_file(key, version)
+        try:
+            with open(fname, 'rb') as f:
+                return not self._is_expired(f)
+        except FileNotFoundError:
+            return False
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._createdir()
+        fname = self._key_to_file(key, version)
+        self._cull()
+        fd, tmp_path = tempfile.mkstemp(dir=self._dir)
+        try:
+            with open(fd, 'wb') as f:
+                self._write_content(f, timeout, value)
+            while True:
+                try:
+                    os.link(tmp_path, fname)
+                    return True
+                except FileExistsError:
+                    if not self._remove_expired(fname):
+                        return False
+        finally:
+            os.remove(tmp_path)
+
+    def _remove_expired(self, fname):
+        """Remove the entry file `fname` if it expired, return whether it is gone."""
+        try:
+            with open(fname, 'rb') as f:
+                if not self._read_expired(f):
+                    return False
+        except FileNotFoundError:
+            return True
+        # Deleting by name could delete an entry another process created since
+        # the check. Instead the file is moved aside and checked again there.
+        aside = '{}.{}.expired'.format(fname, uuid.uuid4().hex)
+        try:
+            os.rename(fname, aside)
+        except FileNotFoundError:
+            return True
+        try:
+            with open(aside, 'rb') as f:
+                expired = self._read_expired(f)
+            if not expired:
+                # A live entry replaced the expired one meanwhile, put it back
+                try:
+                    os.link(aside, fname)
+                except FileExistsError:
+                    pass
+            return expired
+        finally:
+            os.remove(aside)
+
+    def _read_expired(self, f):
+        # Like _is_expired(), without deleting the file
+        try:
+            expires = pickle.load(f)
+        except EOFError:
+            return True
+        return expires is not None and expires < time.time()
+
+    def _cull(self):
+        now = time.monotonic()
+        if now < self._next_cull:
+            return
+        self._next_cull = now + self._cull_interval
+        filelist = self._list_cache_files()
+        if len(filelist) < self._max_entries:
+            return
+        if self._cull_frequency == 0:
+            return self.clear()
+        live = []
+        for fname in filelist:
+            try:
+                with open(fname, 'rb') as f:
+                    # _is_expired() deletes the file if it is
+                    if not self._is_expired(f):
+                        live.append(fname)
+            except FileNotFoundError:
+                pass
+        count = int(len(filelist) / self._cull_frequency) - (len(filelist) - len(live))
+        if count > 0:
+            for fname in random.sample(live, count):
+                self._delete(fname)
@@ -0,0 +1,109 @@
+#
+# Created on Mon Nov 02 2020
+#
+# Copyright (c) 2020 - Simon Prast
+#
+
+
+"""
+Environment driven cache configuration.
+
+Three caches are configured:
+    'default'   process-local data, e.g. memoized values every worker may
+                hold its own copy of
+    'shared'    data all workers have to agree on, e.g. invalidated
+                responses, sessions and throttle buckets
+    'locks'     WOPI locks, which must not be culled to make room for other
+                entries. Kept apart from 'shared' so a flood of cached
+                responses can never drop a lock.
+
+    FRANCY_CACHE_BACKEND            backend of 'default': locmem (default), file,
+                                    memcached (python-memcached) or pylibmc
+    FRANCY_CACHE_LOCATION           directory, memcached servers separated by
+                                    commas, or locmem name
+    FRANCY_CACHE_DIR                directory of the file caches, e.g.
+                                    /var/cache/francy. If set, 'shared' and
+                                    'locks' default to file caches in it, which
+                                    stand in for memcached on a single host.
+                                    Otherwise they default to locmem, which is
+                                    only shared within one process.
+    FRANCY_SHARED_CACHE_BACKEND     backend of 'shared'
+    FRANCY_SHARED_CACHE_LOCATION
+    FRANCY_LOCK_CACHE_BACKEND       backend of 'locks'
+    FRANCY_LOCK_CACHE_LOCATION
+    FRANCY_*_MAX_ENTRIES            entries of a locmem or file cache before it
+                                    culls a tenth of them, e.g.
+                                    FRANCY_SHARED_CACHE_MAX_ENTRIES (defaults:
+                                    100000, 1000000 for 'locks')
+    FRANCY_CACHE_TIMEOUT            default timeout in seconds (default: 300)
+    FRANCY_CACHE_KEY_PREFIX         prefix of all keys (default: francy)
+
+Run several worker processes only with FRANCY_CACHE_DIR or memcached for
+'shared' and 'locks'.
+
+Memcached ignores MAX_ENTRIES and evicts the least recently used entries when
+it runs out of memory; size it (or give 'locks' its own server) accordingly.
+"""
+
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+
+BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'francy.cache.backends.FileBasedCache',
+    'memcached': 'django.core.cache.backends.memcached.MemcachedCache',
+    'pylibmc': 'django.core.cache.backends.memcached.PyLibMCCache',
+}
+
+# Django culls a third of the entries at random once MAX_ENTRIES (default: 300) is reached
+CULL_FREQUENCY = 10
+
+
+def _cache(backend, location, timeout, key_prefix, max_entries, variable):
+    if backend not in BACKENDS:
+        raise ImproperlyConfigured(
+            '{} must be one of {}, not {!r}.'.format(variable, ', '.join(BACKENDS), backend))
+    if backend in ('memcached', 'pylibmc'):
+        location = [server.strip() for server in location.split(',') if server.strip()]
+    cache = {
+        'BACKEND': BACKENDS[backend],
+        'LOCATION': location,
+        'TIMEOUT': timeout,
+        'KEY_PREFIX': key_prefix,
+    }
+    if backend in ('locmem', 'file'):
+        # Memcached clients take their OPTIONS as client arguments
+        cache['OPTIONS'] = {'MAX_ENTRIES': max_entries, 'CULL_FREQUENCY': CULL_FREQUENCY}
+    return cache
+
+
+def caches_from_env(default_dir=None, env=None):
+    """Return the CACHES setting. File caches default to directories in FRANCY_CACHE_DIR or `default_dir`."""
+    env = os.environ if env is None else env
+    timeout = int(env.get('FRANCY_CACHE_TIMEOUT', 300))
+    key_prefix = env.get('FRANCY_CACHE_KEY_PREFIX', 'francy')
+    cache_dir = env.get('FRANCY_CACHE_DIR', default_dir)
+
+    caches = {}
+    for alias, variable, shared, default_max_entries in (
+        ('default', 'FRANCY_CACHE', False, 100000),
+        ('shared', 'FRANCY_SHARED_CACHE', True, 100000),
+        ('locks', 'FRANCY_LOCK_CACHE', True, 1000000),
+    ):
+        backend = env.get(variable + '_BACKEND', 'file' if shared and cache_dir else 'locmem')
+        location = env.get(variable + '_LOCATION')
+        if location is None:
+            if backend != 'file':
+                location = 'francy-' + alias
+            elif cache_dir:
+                location = os.path.join(str(cache_dir), alias)
+            else:
+                raise ImproperlyConfigured(
+                    '{}_BACKEND is file, but neither {}_LOCATION nor FRANCY_CACHE_DIR is set.'.format(
+                        variable, variable))
+        caches[alias] = _cache(
+            backend, location, timeout, key_prefix,
+            int(env.get(variable + '_MAX_ENTRIES', default_max_entries)), variable + '_BACKEND')
+    return caches
@@ -0,0 +1,176 @@
+#
+# Created on Mon Nov 02 2020
+#
+# Copyright (c) 2020 - Simon Prast
+#
+
+
+"""
+Namespaced, versioned keys in the Django caches.
+
+Every feature caching data (user responses, WOPI locks, ...) gets its own
+`CacheNamespace`. It prefixes its keys with the namespace name and stores
+them under the namespace version from CACHE_NAMESPACE_VERSIONS, so bumping
+the version of a namespace makes all its entries unreachable at once, e.g.
+when the format of the cached data changes with a deploy.
+
+Hits and misses of get() are counted in process memory and added to shared
+counters in the CACHE_STATS_CACHE every CACHE_STATS_FLUSH_INTERVAL seconds,
+where the `cachestats` management command reads them. The counters are
+approximate: increments of a process that dies before flushing are lost.
+"""
+
+import atexit
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+
+
+STATS_PREFIX = 'cache-stats'
+
+# Namespaces created in this process, by name
+namespaces = {}
+_namespaces_lock = threading.Lock()
+
+
+def _stats_cache():
+    return caches[getattr(settings, 'CACHE_STATS_CACHE', 'shared')]
+
+
+class CacheNamespace:
+    def __init__(self, name, cache_alias='default', timeout=DEFAULT_TIMEOUT, version=None):
+        self.name = name
+        self.cache_alias = cache_alias
+        self.timeout = timeout
+        if version is None:
+            version = getattr(settings, 'CACHE_NAMESPACE_VERSIONS', {}).get(name, 1)
+        self.version = version
+
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._unflushed = [0, 0]
+        self._flushed_at = time.monotonic()
+        self._registered = False
+        with _namespaces_lock:
+            namespaces[name] = self
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    def key(self, *parts):
+        return ':'.join([self.name] + [str(part) for part in parts])
+
+    def get(self, key, default=None):
+        value = self.cache.get(self._key(key), version=self.version)
+        self._count(int(value is not None), int(value is None))
+        return default if value is None else value
+
+    def get_many(self, keys):
+        """Return a dict of the found keys."""
+        keys = list(keys)
+        found = self.cache.get_many([self._key(key) for key in keys], version=self.version)
+        result = {key: found[self._key(key)] for key in keys if self._key(key) in found}
+        self._count(len(result), len(keys) - len(result))
+        return result
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT):
+        self.cache.set(self._key(key), value, self._timeout(timeout), version=self.version)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT):
+        return self.cache.add(self._key(key), value, self._timeout(timeout), version=self.version)
+
+    def delete(self, key):
+        self.cache.delete(self._key(key), version=self.version)
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'version': self.version}
+
+    def flush_stats(self):
+        """Add the counts since the last flush to the shared counters."""
+        with self._lock:
+            (hits, misses), self._unflushed = self._unflushed, [0, 0]
+            self._flushed_at = time.monotonic()
+        if not hits and not misses:
+            return
+        cache = _stats_cache()
+        if not self._registered:
+            _register(cache, self.name)
+            self._registered = True
+        for counter, count in (('hits', hits), ('misses', misses)):
+            if count:
+                _incr(cache, '{}:{}:{}'.format(STATS_PREFIX, self.name, counter), count)
+
+    def _key(self, key):
+        return self.key(*key) if isinstance(key, tuple) else self.key(key)
+
+    def _timeout(self, timeout):
+        return self.timeout if timeout is DEFAULT_TIMEOUT else timeout
+
+    def _count(self, hits, misses):
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+            self._unflushed[0] += hits
+            self._unflushed[1] += misses
+            due = time.monotonic() - self._flushed_at >= getattr(settings, 'CACHE_STATS_FLUSH_INTERVAL', 10)
+        if due:
+            self.flush_stats()
+
+
+def _incr(cache, key, delta):
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        # First count of the key. add() loses against a concurrent add, which is then incremented.
+        if not cache.add(key, delta, None):
+            cache.incr(key, delta)
+
+
+def _register(cache, name):
+    # The list of namespaces ever counted, for the cachestats command
+    key = STATS_PREFIX + ':namespaces'
+    names = cache.get(key, [])
+    if name not in names:
+        cache.set(key, sorted(names + [name]), None)
+
+
+def shared_stats():
+    """Return the shared hit and miss counters by namespace name."""
+    cache = _stats_cache()
+    names = cache.get(STATS_PREFIX + ':namespaces', [])
+    counters = cache.get_many([
+        '{}:{}:{}'.format(STATS_PREFIX, name, counter) for name in names for counter in ('hits', 'misses')
+    ])
+    return {
+        name: {
+            counter: counters.get('{}:{}:{}'.format(STATS_PREFIX, name, counter), 0)
+            for counter in ('hits', 'misses')
+        }
+        for name in names
+    }
+
+
+def reset_shared_stats():
+    cache = _stats_cache()
+    names = cache.get(STATS_PREFIX + ':namespaces', [])
+    cache.delete_many(['{}:{}:{}'.format(STATS_PREFIX, name, counter)
+                       for name in names for counter in ('hits', 'misses')])
+    cache.delete(STATS_PREFIX + ':namespaces')
+    for namespace in list(namespaces.values()):
+        namespace._registered = False
+
+
+@atexit.register
+def _flush_all():
+    for namespace in list(namespaces.values()):
+        try:
+            namespace.flush_stats()
+        except Exception:
+            # The cache may be gone at interpreter shutdown
+            pass
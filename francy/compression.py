@@ -0,0 +1,164 @@
+#
+# Created on Mon Nov 02 2020
+#
+# Copyright (c) 2020 - Simon Prast
+#
+
+
+"""
+Response compression.
+
+CompressionMiddleware encodes responses with brotli, if the `brotli` package
+is installed and the client accepts it, else with gzip, when
+    - the Content-Type is listed in COMPRESSION_CONTENT_TYPES, so already
+      compressed downloads (documents, images) are passed through,
+    - a regular response body has at least COMPRESSION_MIN_SIZE bytes,
+    - the response is not encoded yet.
+Streaming responses, e.g. the user export, are compressed while they are
+iterated: output is passed on whenever the compressor emits a block, so
+memory use stays bounded and nothing is collected. Their Content-Length is
+removed, ETags become weak like with Django's GZipMiddleware.
+
+Static files are not compressed here: collectstatic writes compressed
+copies next to them (see francy/staticfiles.py) for the web server.
+"""
+
+import asyncio
+import zlib
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+DEFAULT_CONTENT_TYPES = (
+    'application/json',
+    'application/x-ndjson',
+    'application/javascript',
+    'application/xml',
+    'image/svg+xml',
+    'text/css',
+    'text/csv',
+    'text/html',
+    'text/javascript',
+    'text/plain',
+    'text/xml',
+)
+
+
+class GzipEncoder:
+    name = 'gzip'
+
+    def __init__(self, level):
+        # wbits 31: gzip header and trailer
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def process(self, data):
+        return self._compressor.compress(data)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+class BrotliEncoder:
+    name = 'br'
+
+    def __init__(self, quality):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def process(self, data):
+        return self._compressor.process(data)
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+def accepted_encodings(header):
+    """Return the content codings an Accept-Encoding header allows, without those with q=0."""
+    accepted = set()
+    for item in header.split(','):
+        coding, *params = item.split(';')
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding.strip() and quality > 0:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+class CompressionMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.min_size = getattr(settings, 'COMPRESSION_MIN_SIZE', 1024)
+        self.content_types = frozenset(getattr(settings, 'COMPRESSION_CONTENT_TYPES', DEFAULT_CONTENT_TYPES))
+        self.gzip_level = getattr(settings, 'COMPRESSION_GZIP_LEVEL', 6)
+        self.brotli_quality = getattr(settings, 'COMPRESSION_BROTLI_QUALITY', 5)
+        if asyncio.iscoroutinefunction(get_response):
+            # Mark the instance as a coroutine function for Django's middleware adaption
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        return self.process_response(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.process_response(request, await self.get_response(request))
+
+    def get_encoder(self, request):
+        accepted = accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if brotli is not None and 'br' in accepted:
+            return BrotliEncoder(self.brotli_quality)
+        if 'gzip' in accepted:
+            return GzipEncoder(self.gzip_level)
+        return None
+
+    def process_response(self, request, response):
+        if response.has_header('Content-Encoding') or response.status_code in (204, 304):
+            return response
+        if response.get('Content-Type', '').split(';')[0].strip().lower() not in self.content_types:
+            return response
+        if not response.streaming and len(response.content) < self.min_size:
+            return response
+
+        # The representation depends on Accept-Encoding from here on, even if it is not compressed
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoder = self.get_encoder(request)
+        if encoder is None:
+            return response
+
+        if response.streaming:
+            response.streaming_content = self._compress_stream(encoder, response.streaming_content)
+            del response['Content-Length']
+        else:
+            compressed = encoder.process(response.content) + encoder.finish()
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response['Content-Length'] = str(len(compressed))
+
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = encoder.name
+        return response
+
+    @staticmethod
+    def _compress_stream(encoder, content):
+        for chunk in content:
+            data = encoder.process(chunk)
+            if data:
+                yield data
+        yield encoder.finish()
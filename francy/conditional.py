@@ -0,0 +1,88 @@
+#
+# Created on Mon Nov 02 2020
+#
+# Copyright (c) 2020 - Simon Prast
+#
+
+
+"""
+Conditional GET support.
+
+Views decorated with `conditional()` compute a cheap validator (e.g. the
+row_version of a User) before doing any other work. A request whose
+If-None-Match matches is answered with 304 Not Modified, without running
+the view or serializing anything. Other responses get the ETag and the
+given Cache-Control directives.
+"""
+
+import asyncio
+import hashlib
+from functools import wraps
+
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import quote_etag
+
+
+def make_etag(request, *parts):
+    """Return an ETag for the given validator parts.
+
+    The path, query string and Accept header are part of it, so the
+    different representations of a resource (formats, field projections)
+    get different ETags.
+    """
+    key = '\n'.join([request.get_full_path(), request.META.get('HTTP_ACCEPT', '')] + [str(part) for part in parts])
+    return quote_etag(hashlib.blake2b(key.encode(), digest_size=12).hexdigest())
+
+
+def not_modified(request, etag):
+    """Return a 304 response if the request's validators match `etag`, else None."""
+    if etag is None or request.method not in ('GET', 'HEAD'):
+        return None
+    return get_conditional_response(request, etag=etag)
+
+
+def add_validators(request, response, etag, cache_control=None):
+    if request.method not in ('GET', 'HEAD'):
+        return response
+    if etag is not None and response.status_code in (200, 304) and not response.has_header('ETag'):
+        response['ETag'] = etag
+    if cache_control:
+        patch_cache_control(response, **cache_control)
+        if cache_control.get('private'):
+            patch_vary_headers(response, ['Authorization'])
+    return response
+
+
+def conditional(etag_func, **cache_control):
+    """Decorate a view (sync or async) with conditional GET handling,
+    other methods are passed through.
+
+    `etag_func(request, *args, **kwargs)` returns the ETag of the requested
+    resource or None to skip the validation. For async views it may be a
+    coroutine function.
+    """
+    def decorator(view_func):
+        if asyncio.iscoroutinefunction(view_func):
+            @wraps(view_func)
+            async def view(request, *args, **kwargs):
+                if request.method not in ('GET', 'HEAD'):
+                    return await view_func(request, *args, **kwargs)
+                etag = etag_func(request, *args, **kwargs)
+                if asyncio.iscoroutine(etag):
+                    etag = await etag
+                response = not_modified(request, etag)
+                if response is None:
+                    response = await view_func(request, *args, **kwargs)
+                return add_validators(request, response, etag, cache_control)
+        else:
+            @wraps(view_func)
+            def view(request, *args, **kwargs):
+                if request.method not in ('GET', 'HEAD'):
+                    return view_func(request, *args, **kwargs)
+                etag = etag_func(request, *args, **kwargs)
+                response = not_modified(request, etag)
+                if response is None:
+                    response = view_func(request, *args, **kwargs)
+                return add_validators(request, response, etag, cache_control)
+        return view
+    return decorator
@@ -0,0 +1,115 @@
+#
+# Created on Mon Nov 02 2020
+#
+# Copyright (c) 2020 - Simon Prast
+#
+
+
+import os
+import queue
+import threading
+
+
+class HealthCheckMixin:
+    """Checks a persistent connection once per request before reusing it.
+
+    Enabled through CONN_HEALTH_CHECKS, the same way Django 4.1+ does it:
+    the check runs lazily on the first database access of a request, so
+    requests that do not touch the database don't pay for it.
+    """
+    health_check_done = False
+
+    @property
+    def health_check_enabled(self):
+        return self.settings_dict.get('CONN_HEALTH_CHECKS', False)
+
+    def connect(self):
+        super().connect()
+        # A fresh connection doesn't need to be checked
+        self.health_check_done = True
+
+    def close_if_unusable_or_obsolete(self):
+        super().close_if_unusable_or_obsolete()
+        self.health_check_done = False
+
+    def ensure_connection(self):
+        if self.connection is not None and self.health_check_enabled and not self.health_check_done:
+            if not self.is_usable():
+                self.close()
+            self.health_check_done = True
+        super().ensure_connection()
+
+
+class ConnectionPoolMixin:
+    """Keeps up to CONN_POOL_SIZE closed connections per database for reuse.
+
+    Closing a connection (at the end of CONN_MAX_AGE or after a request with
+    CONN_MAX_AGE = 0) hands it back to the pool instead, and opening one takes
+    a pooled connection first. Pools are per process, as connections cannot
+    be shared across fork().
+    """
+    _pools = {}
+    _pools_lock = threading.Lock()
+
+    @property
+    def pool_size(self):
+        return self.settings_dict.get('CONN_POOL_SIZE', 0)
+
+    def _get_pool(self):
+        # Closing an in-memory SQLite database would destroy it, Django never does
+        if self.pool_size <= 0 or getattr(self, 'is_in_memory_db', lambda: False)():
+            return None
+        key = (os.getpid(), self.alias)
+        with self._pools_lock:
+            pool = self._pools.get(key)
+            if pool is None:
+                pool = self._pools[key] = queue.LifoQueue(maxsize=self.pool_size)
+            return pool
+
+    def get_new_connection(self, conn_params):
+        pool = self._get_pool()
+        while pool is not None:
+            try:
+                connection = pool.get_nowait()
+            except queue.Empty:
+                break
+            if not self.health_check_enabled or self._ping(connection):
+                return connection
+            self._discard(connection)
+        return super().get_new_connection(conn_params)
+
+    def _close(self):
+        pool = self._get_pool()
+        if pool is not None and self.connection is not None and self._reset(self.connection):
+            try:
+                pool.put_nowait(self.connection)
+                return
+            except queue.Full:
+                pass
+        return super()._close()
+
+    @staticmethod
+    def _reset(connection):
+        # Don't hand out a connection with a pending transaction
+        try:
+            connection.rollback()
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _ping(connection):
+        try:
+            cursor = connection.cursor()
+            cursor.execute('SELECT 1')
+            cursor.close()
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _discard(connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
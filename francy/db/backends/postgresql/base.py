@@ -0,0 +1,14 @@
+#
+# Created on Mon Nov 02 2020
+#
+# Copyright (c) 2020 - Simon Prast
+#
+
+
+from django.db.backends.postgresql import base
+
+from ..mixins import ConnectionPoolMixin, HealthCheckMixin
+
+
+class DatabaseWrapper(ConnectionPoolMixin, HealthCheckMixin, base.DatabaseWrapper):
+    pass
@@ -0,0 +1,41 @@
+#
+# Created on Mon Nov 02 2020
+#
+# Copyright (c) 2020 - Simon Prast
+#
+
+
+"""
+SQLite backend tuned for concurrent web workloads.
+
+Applies the PRAGMAS of the database settings on every new connection. By
+default the database runs in WAL mode, so readers don't block the writer,
+with synchronous=NORMAL (safe in WAL mode), a larger page cache, memory
+mapped I/O and a busy timeout instead of immediate "database is locked"
+errors.
+"""
+
+from django.db.backends.sqlite3 import base
+
+from ..mixins import ConnectionPoolMixin, HealthCheckMixin
+
+
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    # Negative values are KiB, i.e. 64 MiB of page cache
+    'cache_size': -64000,
+    'mmap_size': 268435456,
+    'busy_timeout': 5000,
+    'temp_store': 'MEMORY',
+}
+
+
+class DatabaseWrapper(ConnectionPoolMixin, HealthCheckMixin, base.DatabaseWrapper):
+    def get_new_connection(self, conn_params):
+        connection = super().get_new_connection(conn_params)
+        pragmas = dict(DEFAULT_PRAGMAS, **self.settings_dict.get('PRAGMAS', {}))
+        for name, value in pragmas.items():
+            if value is not None:
+                connection.execute('PRAGMA {} = {}'.format(name, value))
+        return connection
@@ -0,0 +1,63 @@
+#
+# Created on Mon Nov 02 2020
+#
+# Copyright (c) 2020 - Simon Prast
+#
+
+
+"""
+Environment driven database configuration.
+
+    FRANCY_DB_ENGINE            sqlite3 (default) or postgresql
+    FRANCY_DB_NAME              database name, or the file path for SQLite
+    FRANCY_DB_USER, FRANCY_DB_PASSWORD, FRANCY_DB_HOST, FRANCY_DB_PORT
+    FRANCY_DB_CONN_MAX_AGE      seconds a connection is kept open, 0 closes it
+                                after every request (default: 60)
+    FRANCY_DB_HEALTH_CHECKS     check persistent connections before reuse (default: 1)
+    FRANCY_DB_POOL_SIZE         closed connections kept for reuse per process (default: 0)
+    FRANCY_DB_SQLITE_<PRAGMA>   overrides a SQLite pragma, e.g. FRANCY_DB_SQLITE_SYNCHRONOUS=FULL
+"""
+
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+
+ENGINES = {
+    'sqlite3': 'francy.db.backends.sqlite3',
+    'postgresql': 'francy.db.backends.postgresql',
+}
+
+SQLITE_PRAGMA_PREFIX = 'FRANCY_DB_SQLITE_'
+
+
+def _flag(value):
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def database_from_env(default_name, env=None):
+    env = os.environ if env is None else env
+
+    engine = env.get('FRANCY_DB_ENGINE', 'sqlite3')
+    if engine not in ENGINES:
+        raise ImproperlyConfigured(
+            'FRANCY_DB_ENGINE must be one of {}, not {!r}.'.format(', '.join(ENGINES), engine))
+
+    config = {
+        'ENGINE': ENGINES[engine],
+        'NAME': env.get('FRANCY_DB_NAME', default_name),
+        'CONN_MAX_AGE': int(env.get('FRANCY_DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': _flag(env.get('FRANCY_DB_HEALTH_CHECKS', '1')),
+        'CONN_POOL_SIZE': int(env.get('FRANCY_DB_POOL_SIZE', 0)),
+    }
+
+    if engine == 'sqlite3':
+        config['PRAGMAS'] = {
+            name[len(SQLITE_PRAGMA_PREFIX):].lower(): value
+            for name, value in env.items() if name.startswith(SQLITE_PRAGMA_PREFIX)
+        }
+    else:
+        for key in ('USER', 'PASSWORD', 'HOST', 'PORT'):
+            config[key] = env.get('FRANCY_DB_' + key, '')
+
+    return config
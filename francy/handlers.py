@@ -0,0 +1,75 @@
+#
+# Created on Mon Nov 02 2020
+#
+# Copyright (c) 2020 - Simon Prast
+#
+
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import django
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIHandler as DjangoASGIHandler
+from django.db import connections
+
+
+_END = object()
+
+
+def _next_part(iterator):
+    return next(iterator, _END)
+
+
+class ASGIHandler(DjangoASGIHandler):
+    """Django's ASGI handler, producing the parts of streaming responses off the event loop.
+
+    Django 3.1 iterates streaming responses on the event loop, so every part
+    (e.g. the next rows of a database cursor, see the user export) blocked all
+    other requests, and database access raised SynchronousOnlyOperation.
+    Here the parts are awaited from a thread of the response's own, as the
+    cursor of a queryset iterator belongs to the connection of one thread.
+    That thread's connections are closed once the response is sent.
+    """
+
+    async def send_response(self, response, send):
+        if not response.streaming:
+            return await super().send_response(response, send)
+
+        response_headers = []
+        for header, value in response.items():
+            if isinstance(header, str):
+                header = header.encode('ascii')
+            if isinstance(value, str):
+                value = value.encode('latin1')
+            response_headers.append((bytes(header), bytes(value)))
+        for c in response.cookies.values():
+            response_headers.append((b'Set-Cookie', c.output(header='').encode('ascii').strip()))
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': response_headers,
+        })
+
+        loop = asyncio.get_running_loop()
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='streaming')
+        try:
+            # Access `__iter__` and not `streaming_content` directly, like Django
+            iterator = iter(response)
+            while True:
+                part = await loop.run_in_executor(executor, _next_part, iterator)
+                if part is _END:
+                    break
+                for chunk, _ in self.chunk_bytes(part):
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            await send({'type': 'http.response.body'})
+        finally:
+            await loop.run_in_executor(executor, connections.close_all)
+            executor.shutdown(wait=False)
+        await sync_to_async(response.close, thread_sensitive=True)()
+
+
+def get_asgi_application():
+    """Like django.core.asgi.get_asgi_application(), with the handler above."""
+    django.setup(set_prefix=False)
+    return ASGIHandler()
@@ -0,0 +1,224 @@
+#
+# Created on Mon Nov 02 2020
+#
+# Copyright (c) 2020 - Simon Prast
+#
+
+
+"""
+Request instrumentation.
+
+MetricsMiddleware records the latency, the number and duration of SQL queries
+and the time spent hashing passwords of every sampled request, per URL route.
+The numbers are kept in process memory and exported in the Prometheus text
+format by api.api_views.show_metrics (/api/metrics) to scrapers presenting
+METRICS_TOKEN.
+
+METRICS_SAMPLE_RATE selects the share of requests that are measured; the
+rest only cost a call to random(). Queries are counted by an execute wrapper
+installed on every database connection, which does nothing outside of
+sampled requests.
+"""
+
+import asyncio
+import contextvars
+import random
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from francy.cache.namespaces import namespaces
+from user.api.authentication import token_cache
+from user.api.throttling import SCOPES, password_throttle
+from user.hashing import hashing_executor, hashing_time
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Method labels, any other method is counted as 'other' so clients cannot create new series
+METHODS = frozenset(('GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'))
+
+# Query count and seconds of the request measured in the current context
+_query_stats = contextvars.ContextVar('query_stats', default=None)
+
+
+def _count_queries(execute, sql, params, many, context):
+    stats = _query_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats[0] += 1
+        stats[1] += time.perf_counter() - started
+
+
+@receiver(connection_created)
+def install_query_counter(sender, connection, **kwargs):
+    if _count_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_count_queries)
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latency = {}
+        self.totals = {}
+
+    def observe_request(self, route, method, status, seconds, queries, query_seconds, hashing_seconds):
+        with self._lock:
+            key = (route, method, str(status))
+            histogram = self.latency.get(key)
+            if histogram is None:
+                histogram = self.latency[key] = Histogram()
+            histogram.observe(seconds)
+
+            totals = self.totals.setdefault((route, method), [0, 0, 0.0, 0.0])
+            totals[0] += 1
+            totals[1] += queries
+            totals[2] += query_seconds
+            totals[3] += hashing_seconds
+
+    def clear(self):
+        with self._lock:
+            self.latency.clear()
+            self.totals.clear()
+
+    def render(self):
+        """Return all metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            lines += [
+                '# HELP francy_request_duration_seconds Latency of sampled requests.',
+                '# TYPE francy_request_duration_seconds histogram',
+            ]
+            for (route, method, status), histogram in sorted(self.latency.items()):
+                labels = 'route="{}",method="{}",status="{}"'.format(_escape(route), method, status)
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + ('+Inf',), histogram.counts):
+                    cumulative += count
+                    lines.append('francy_request_duration_seconds_bucket{{{},le="{}"}} {}'.format(
+                        labels, bound, cumulative))
+                lines.append('francy_request_duration_seconds_sum{{{}}} {}'.format(labels, histogram.sum))
+                lines.append('francy_request_duration_seconds_count{{{}}} {}'.format(labels, histogram.count))
+
+            for index, (name, kind, help) in enumerate((
+                ('francy_requests_sampled_total', 'counter', 'Number of sampled requests.'),
+                ('francy_request_db_queries_total', 'counter', 'SQL queries of sampled requests.'),
+                ('francy_request_db_query_seconds_total', 'counter', 'Time spent in SQL queries of sampled requests.'),
+                ('francy_request_hashing_seconds_total', 'counter',
+                 'Time spent hashing passwords in sampled requests.'),
+            )):
+                lines += ['# HELP {} {}'.format(name, help), '# TYPE {} {}'.format(name, kind)]
+                for (route, method), totals in sorted(self.totals.items()):
+                    lines.append('{}{{route="{}",method="{}"}} {}'.format(name, _escape(route), method, totals[index]))
+
+        for prefix, stats in (('francy_password_hashing', hashing_executor.stats()),
+                              ('francy_token_cache', token_cache.stats())):
+            for key, value in sorted(stats.items()):
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    lines += ['# TYPE {}_{} gauge'.format(prefix, key), '{}_{} {}'.format(prefix, key, value)]
+
+        lines += ['# TYPE francy_cache_lookups_total counter']
+        for name, namespace in sorted(namespaces.items()):
+            stats = namespace.stats()
+            for result in ('hits', 'misses'):
+                lines.append('francy_cache_lookups_total{{namespace="{}",result="{}"}} {}'.format(
+                    _escape(name), result, stats[result]))
+
+        throttle_stats = password_throttle.stats()
+        lines += [
+            '# HELP francy_password_throttle_total Requests checked by the password endpoint throttle.',
+            '# TYPE francy_password_throttle_total counter',
+            'francy_password_throttle_total{{result="allowed"}} {}'.format(throttle_stats['allowed']),
+        ]
+        for scope in SCOPES:
+            lines.append('francy_password_throttle_total{{result="rejected",scope="{}"}} {}'.format(
+                scope, throttle_stats['rejected_' + scope]))
+
+        lines.append('')
+        return '\n'.join(lines)
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+registry = MetricsRegistry()
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'METRICS_SAMPLE_RATE', 1.0)
+        if asyncio.iscoroutinefunction(get_response):
+            # Mark the instance as a coroutine function for Django's middleware adaption
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if self.sample_rate <= 0 or (self.sample_rate < 1 and random.random() >= self.sample_rate):
+            return self.get_response(request)
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self._acall(request)
+
+        started, tokens = self._start()
+        try:
+            response = self.get_response(request)
+        finally:
+            measured = self._stop(tokens)
+        self._record(request, response, started, measured)
+        return response
+
+    async def _acall(self, request):
+        started, tokens = self._start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            measured = self._stop(tokens)
+        self._record(request, response, started, measured)
+        return response
+
+    @staticmethod
+    def _start():
+        queries, hashing = [0, 0.0], [0.0]
+        tokens = (_query_stats.set(queries), hashing_time.set(hashing), queries, hashing)
+        return time.perf_counter(), tokens
+
+    @staticmethod
+    def _stop(tokens):
+        query_token, hashing_token, queries, hashing = tokens
+        _query_stats.reset(query_token)
+        hashing_time.reset(hashing_token)
+        return queries, hashing
+
+    @staticmethod
+    def _record(request, response, started, measured):
+        (queries, query_seconds), (hashing_seconds,) = measured
+        match = getattr(request, 'resolver_match', None)
+        route = match.route if match is not None else 'unmatched'
+        method = request.method if request.method in METHODS else 'other'
+        registry.observe_request(
+            route, method, response.status_code, time.perf_counter() - started,
+            queries, query_seconds, hashing_seconds
+        )
@@ -0,0 +1,73 @@
+#
+# Created on Mon Nov 02 2020
+#
+# Copyright (c) 2020 - Simon Prast
+#
+
+
+"""
+Paginator for admin changelists of large tables.
+
+A changelist counts its rows on every page load. COUNT(*) reads the whole
+table (or a whole index), which takes seconds once a table holds hundreds
+of thousands of rows. EstimatedCountPaginator instead
+    - takes the row count of an unfiltered queryset from the planner
+      statistics (pg_class.reltuples on PostgreSQL, sqlite_stat1 once
+      ANALYZE ran on SQLite, else the largest rowid) when the table is
+      larger than ADMIN_COUNT_ESTIMATE_THRESHOLD rows,
+    - stops counting the rows of a filtered queryset, e.g. a search, at
+      ADMIN_COUNT_LIMIT.
+Counts may therefore be approximate, and the last pages of a list may be
+empty. Use it together with `show_full_result_count = False`.
+"""
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections
+from django.utils.functional import cached_property
+
+
+def estimate_count(model, using='default'):
+    """Return the estimated number of rows of the table of `model`, None if unknown."""
+    connection = connections[using]
+    table = model._meta.db_table
+    try:
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [table])
+                row = cursor.fetchone()
+                # Not positive for tables that were never analyzed
+                return row[0] if row and row[0] > 0 else None
+            if connection.vendor == 'sqlite':
+                # sqlite_stat1 exists once ANALYZE ran. The first number of the
+                # row of every index of a table is the table's row count.
+                cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'")
+                if cursor.fetchone():
+                    cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1', [table])
+                    row = cursor.fetchone()
+                    if row:
+                        return int(row[0].split()[0])
+                # An upper bound, read from the end of the table's B-tree
+                cursor.execute('SELECT MAX(rowid) FROM {}'.format(connection.ops.quote_name(table)))
+                return cursor.fetchone()[0]
+    except DatabaseError:
+        return None
+    return None
+
+
+class EstimatedCountPaginator(Paginator):
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not hasattr(queryset, 'query'):
+            return super().count
+
+        if not queryset.query.where:
+            threshold = getattr(settings, 'ADMIN_COUNT_ESTIMATE_THRESHOLD', 10000)
+            estimate = estimate_count(queryset.model, queryset.db)
+            if estimate is not None and estimate > threshold:
+                return estimate
+            return queryset.count()
+
+        # Counting a sliced queryset wraps it in a subquery with a LIMIT
+        return queryset.order_by()[:getattr(settings, 'ADMIN_COUNT_LIMIT', 10000)].count()
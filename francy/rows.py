@@ -0,0 +1,110 @@
+#
+# Created on Mon Nov 02 2020
+#
+# Copyright (c) 2020 - Simon Prast
+#
+
+
+"""
+Read-only serialization of `.values_list()` rows.
+
+A ModelSerializer with many=True instantiates a model per row and asks
+every field for its attribute and representation. RowBuilder looks at the
+serializer's fields once and compiles the output of a row from the plain
+column values instead:
+    - values of fields whose representation is the value itself (text,
+      integers, booleans and primary keys of relations) are copied,
+    - all other values go through the field's to_representation(), None
+      stays None, exactly like Serializer.to_representation() does it.
+The resulting dicts render to the same JSON as the serializer's data.
+
+Only fields reading a column of the model itself are supported; computed
+fields (SerializerMethodField, dotted sources, nested serializers) raise
+ImproperlyConfigured when the builder is created.
+"""
+
+from django.core.exceptions import ImproperlyConfigured
+
+from rest_framework import fields as drf_fields, relations
+from rest_framework.response import Response
+
+
+# Representations returning the value read from the database unchanged
+_IDENTITY = (
+    drf_fields.CharField.to_representation,
+    drf_fields.IntegerField.to_representation,
+    drf_fields.BooleanField.to_representation,
+)
+
+
+def _is_identity(field):
+    if isinstance(field, relations.PrimaryKeyRelatedField):
+        # values_list() returns the key itself, to_representation() would read value.pk
+        return field.pk_field is None
+    return type(field).to_representation in _IDENTITY
+
+
+class RowBuilder:
+    def __init__(self, serializer_fields):
+        fields = [field for field in serializer_fields.values() if not field.write_only]
+        unsupported = [
+            field.field_name for field in fields
+            if '.' in field.source or field.source == '*' or (
+                isinstance(field, relations.RelatedField) and not isinstance(field, relations.PrimaryKeyRelatedField))
+        ]
+        if unsupported:
+            raise ImproperlyConfigured('RowBuilder cannot read the fields ' + ', '.join(unsupported))
+
+        # Output keys, and the columns to pass to values_list() in the same order
+        self.names = tuple(field.field_name for field in fields)
+        self.columns = tuple(field.source for field in fields)
+        self._converted = tuple(
+            (index, field.field_name, field.to_representation)
+            for index, field in enumerate(fields) if not _is_identity(field)
+        )
+
+    def __call__(self, row):
+        """Return the serialized dict of a row of values in the order of `columns`."""
+        data = dict(zip(self.names, row))
+        for index, name, to_representation in self._converted:
+            value = row[index]
+            if value is not None:
+                data[name] = to_representation(value)
+        return data
+
+    def build_many(self, rows):
+        return [self(row) for row in rows]
+
+
+class ValuesListModelMixin:
+    """ListModelMixin serializing rows fetched with `.values_list()` through a RowBuilder.
+
+    Supports the serializers RowBuilder supports, with or without pagination.
+    Rows are named tuples, so cursor pagination can read its position from them.
+    """
+
+    def get_row_builder(self):
+        return RowBuilder(self.get_serializer().fields)
+
+    def list(self, request, *args, **kwargs):
+        builder = self.get_row_builder()
+        columns = builder.columns + self._extra_ordering_columns(builder.columns)
+        queryset = self.filter_queryset(self.get_queryset()).values_list(*columns, named=True)
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(builder.build_many(page))
+        return Response(builder.build_many(queryset))
+
+    def _extra_ordering_columns(self, columns):
+        # Columns the paginator orders by but the serializer does not output, e.g.
+        # the id when projecting ?fields=username. They follow the serialized columns.
+        ordering = getattr(self.paginator, 'ordering', None) or ()
+        if isinstance(ordering, str):
+            ordering = (ordering,)
+        extra = []
+        for name in ordering:
+            name = name.lstrip('-')
+            if name not in columns and name not in extra:
+                extra.append(name)
+        return tuple(extra)
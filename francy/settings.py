@@ -17,8 +17,12 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from .cache.config import caches_from_env
+from .db.config import database_from_env
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -37,22 +41,26 @@ ALLOWED_HOSTS = []
 # Whether users are allowed to create user accounts through the endpoint at /users/create/ or not
 ALLOW_REGISTER = True
 
+# Account created after `migrate` if it does not exist, see user.models.create_admin_user().
+# The default password is refused unless DEBUG is on.
 ADMIN_USER = 'admin'
-ADMIN_PASSWORD = 'admin'
+ADMIN_PASSWORD = os.environ.get('FRANCY_ADMIN_PASSWORD', 'admin')
 
 VERSION = '0.1.0'
 
+# Serve the user API with async views. Enabled by francy/asgi.py, WSGI deployments keep the DRF views.
+ASYNC_API = os.environ.get('FRANCY_ASYNC_API', '0') == '1'
+
 
 # Application definition
 
 INSTALLED_APPS = [
     # Custom apps
-    'user',
-    'design',
+    'user.apps.UserConfig',
+    'design.apps.DesignConfig',
 
     # REST API
     'rest_framework',
-    'rest_framework.authtoken',
 
     # Default Django apps
     'django.contrib.admin',
@@ -64,7 +72,11 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so the measured latency covers all other middleware
+    'francy.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    # Before all middleware reading or changing the response body
+    'francy.compression.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -76,18 +88,51 @@ MIDDLEWARE = [
 ROOT_URLCONF = 'francy.urls'
 
 REST_FRAMEWORK = {
-    # Use Django's standard `django.contrib.auth` permissions,
-    # or allow read-only access for unauthenticated users.
+    # Permissions by user type and action, see user/permissions.py.
+    # Views list the actions of every method in `permission_actions`.
     'DEFAULT_PERMISSION_CLASSES': [
-        'rest_framework.permissions.DjangoModelPermissionsOrAnonReadOnly'
+        'user.api.permissions.UtypePermission'
     ],
     # For default, DRF uses Basic Authentication using Username and Password.
     # We're using TokenAuth for our application.
+    # Resolved tokens are kept in an in-process LRU cache to save the Token + User query.
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'user.api.authentication.CachedTokenAuthentication',
+    ],
+    # JSON is encoded and decoded with orjson if it is installed, see user/api/jsoncodec.py.
+    'DEFAULT_RENDERER_CLASSES': [
+        'user.api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'user.api.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
     ],
+    # Reverse proxies in front of the app. Throttles identify clients by X-Forwarded-For
+    # only behind that many proxies, with 0 by the connection's REMOTE_ADDR.
+    'NUM_PROXIES': 0,
 }
 
+# JSON implementation of the API: 'orjson', 'json' or None for orjson if it is installed
+JSON_BACKEND = None
+
+# Maximum number of tokens and seconds a resolved token is kept in the authentication cache.
+# Every worker process has its own cache, so keep the TTL short when running multiple workers.
+TOKEN_CACHE_SIZE = 10000
+TOKEN_CACHE_TTL = 60
+
+# API tokens (user.models.AuthToken) expire TOKEN_TTL seconds after their last use.
+# The last use is written at most once per TOKEN_TOUCH_INTERVAL seconds and token.
+# Expired tokens are deleted by `manage.py purgetokens`.
+TOKEN_TTL = 14 * 24 * 60 * 60
+TOKEN_TOUCH_INTERVAL = 5 * 60
+
+# Cache of serialized users for the user detail and self views, see user/api/cache.py.
+# It has to be shared by all processes, as saves invalidate it only in the cache they see.
+USER_RESPONSE_CACHE = 'shared'
+USER_RESPONSE_CACHE_TIMEOUT = 300
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -110,19 +155,100 @@ WSGI_APPLICATION = 'francy.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/3.1/ref/settings/#databases
 
+# Configured through FRANCY_DB_* environment variables, see francy/db/config.py.
+# Defaults to SQLite in WAL mode with persistent, health checked connections.
+
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': database_from_env(default_name=BASE_DIR / 'db.sqlite3'),
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/3.1/ref/settings/#caches
+
+# Configured through FRANCY_CACHE_* and FRANCY_SHARED_CACHE_* environment variables,
+# see francy/cache/config.py. 'default' is local to every process, 'shared' has to be seen
+# by all of them: configure FRANCY_CACHE_DIR (file caches outside the source tree) or memcached
+# when running several processes, it defaults to locmem. 'locks' holds the WOPI locks only,
+# so culling never drops one.
+
+CACHES = caches_from_env()
+
+# Runs the tests against empty locmem caches, see francy/testing.py
+TEST_RUNNER = 'francy.testing.TestRunner'
+
+# Namespaced cache keys, see francy/cache/namespaces.py.
+# Bumping the version of a namespace drops all of its entries, e.g. {'user-response': 2}.
+CACHE_NAMESPACE_VERSIONS = {}
+# Cache holding the hit and miss counters reported by `manage.py cachestats`,
+# and the seconds between two updates of them by every process
+CACHE_STATS_CACHE = 'shared'
+CACHE_STATS_FLUSH_INTERVAL = 10
+
+
+# Admin changelists of large tables, see francy/paginator.py.
+# Unfiltered lists larger than ADMIN_COUNT_ESTIMATE_THRESHOLD rows show an estimated count,
+# filtered lists count at most ADMIN_COUNT_LIMIT rows.
+ADMIN_COUNT_ESTIMATE_THRESHOLD = 10000
+ADMIN_COUNT_LIMIT = 10000
+
+
+# Sessions
+# Admin sessions are read from the shared cache and written through to the database
+
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+SESSION_CACHE_ALIAS = 'shared'
+
+
 # Authentication User model
 
 AUTH_USER_MODEL = 'user.User'
 
 
+# Password hashing
+# Hashing runs on a worker pool so it never occupies a request worker.
+# Backends: 'process' (pool sized to the CPU cores), 'thread' or 'inline'.
+# At most PASSWORD_HASHING_MAX_PENDING hashes are in flight (default: 4 per worker),
+# further requests wait up to PASSWORD_HASHING_TIMEOUT seconds and are then answered with 503.
+
+PASSWORD_HASHING_BACKEND = 'process'
+PASSWORD_HASHING_WORKERS = None
+PASSWORD_HASHING_MAX_PENDING = None
+PASSWORD_HASHING_TIMEOUT = 10
+
+# Token-bucket throttle of the endpoints hashing passwords (registration and login),
+# checked before any database work. Buckets as (burst, requests per minute), see user/api/throttling.py.
+# Remove an entry to disable its bucket. Backends: 'local' (per process) or 'cache' (THROTTLE_CACHE).
+THROTTLE_BACKEND = 'local'
+THROTTLE_CACHE = 'shared'
+THROTTLE_MAX_KEYS = 100000
+THROTTLE_BUCKETS = {
+    'ip': (10, 20),
+    'username': (5, 10),
+    'global': (100, 3000),
+}
+
+
+# Request metrics, exported at /api/metrics (see francy/metrics.py)
+# Share of requests measured, lower it to e.g. 0.01 in production. 0 disables the measurement.
+METRICS_SAMPLE_RATE = 1.0
+# Bearer token scrapers have to send to read the metrics endpoint ("Authorization: Bearer <token>").
+# Empty disables the endpoint.
+METRICS_TOKEN = os.environ.get('FRANCY_METRICS_TOKEN', '')
+
+
+# Response compression, see francy/compression.py
+# Responses of these types are compressed with brotli (if installed) or gzip,
+# regular responses only from COMPRESSION_MIN_SIZE bytes on.
+COMPRESSION_CONTENT_TYPES = [
+    'application/json', 'application/x-ndjson', 'application/javascript', 'application/xml', 'image/svg+xml',
+    'text/css', 'text/csv', 'text/html', 'text/javascript', 'text/plain', 'text/xml',
+]
+COMPRESSION_MIN_SIZE = 1024
+COMPRESSION_GZIP_LEVEL = 6
+COMPRESSION_BROTLI_QUALITY = 5
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
 
@@ -160,3 +286,38 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/3.1/howto/static-files/
 
 STATIC_URL = '/static/'
+STATIC_ROOT = BASE_DIR / 'static'
+
+# With FRANCY_STATIC_MANIFEST=1 (production), collectstatic stores hashed names and gzip/brotli
+# compressed copies of them for the web server, see francy/staticfiles.py. Static URLs are then
+# looked up in the manifest it writes, so collectstatic has to run before the server starts:
+# with DEBUG = False, every page referencing a missing entry (e.g. the admin) fails.
+if os.environ.get('FRANCY_STATIC_MANIFEST', '0') == '1':
+    STATICFILES_STORAGE = 'francy.staticfiles.CompressedManifestStaticFilesStorage'
+COMPRESSION_STATIC_EXTENSIONS = [
+    '.css', '.js', '.map', '.json', '.svg', '.html', '.txt', '.xml', '.ttf', '.otf', '.eot',
+]
+
+# Uploaded files, e.g. the contents of design documents
+MEDIA_ROOT = BASE_DIR / 'media'
+
+# Bytes read and written at once when streaming document contents
+WOPI_CHUNK_SIZE = 64 * 1024
+
+# WOPI file locks, see design/locks.py
+# 'local' keeps them in process memory and requires a single server process,
+# 'cache' shares them through the cache WOPI_LOCK_CACHE (e.g. memcached).
+WOPI_LOCK_BACKEND = 'local'
+WOPI_LOCK_CACHE = 'locks'
+# Seconds until a lock expires unless it is refreshed
+WOPI_LOCK_TIMEOUT = 30 * 60
+# Seconds between purges of expired locks from the local lock table
+WOPI_LOCK_SWEEP_INTERVAL = 60
+
+# Content-addressed store of the document versions saved through WOPI, see design/versions.py
+WOPI_VERSION_ROOT = BASE_DIR / 'versions'
+
+# Lifetime of signed WOPI access tokens in seconds, see design/tokens.py
+WOPI_ACCESS_TOKEN_TTL = 10 * 60 * 60
+# Cache holding revoked access tokens. Shared, so a logout ends the WOPI sessions in every process.
+WOPI_REVOCATION_CACHE = 'shared'
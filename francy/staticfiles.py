@@ -0,0 +1,84 @@
+#
+# Created on Mon Nov 02 2020
+#
+# Copyright (c) 2020 - Simon Prast
+#
+
+
+"""
+Static files storage writing pre-compressed copies.
+
+`manage.py collectstatic` stores every file under a name containing a hash
+of its content (ManifestStaticFilesStorage), and then writes `<name>.gz`
+and, if the `brotli` package is installed, `<name>.br` next to every hashed
+file
+    - with an extension listed in COMPRESSION_STATIC_EXTENSIONS,
+    - of at least COMPRESSION_MIN_SIZE bytes,
+    - whose compressed copy saves at least 5 %.
+Both use the highest compression level, as they are compressed only once.
+Hashed names never change their content, so copies written by an earlier
+run are kept. The web server serves them to clients accepting the encoding,
+e.g. nginx with `gzip_static on;` and `brotli_static on;`.
+
+The storage is used with FRANCY_STATIC_MANIFEST=1 only. Static URLs then
+come from the manifest of the last collectstatic run, a file missing in it
+raises ValueError once DEBUG is off, so deployments run collectstatic before
+starting the server.
+"""
+
+import gzip
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+from .compression import brotli
+
+
+DEFAULT_EXTENSIONS = ('.css', '.js', '.map', '.json', '.svg', '.html', '.txt', '.xml', '.ttf', '.otf', '.eot')
+
+
+def _gzip(data):
+    # mtime 0, so the same file always gives the same bytes
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def _brotli(data):
+    return brotli.compress(data, quality=11)
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.compress_extensions = tuple(getattr(settings, 'COMPRESSION_STATIC_EXTENSIONS', DEFAULT_EXTENSIONS))
+        self.compress_min_size = getattr(settings, 'COMPRESSION_MIN_SIZE', 1024)
+        self.compressors = [('.gz', _gzip)]
+        if brotli is not None:
+            self.compressors.append(('.br', _brotli))
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        for name in sorted(set(self.hashed_files.values())):
+            if name.lower().endswith(self.compress_extensions):
+                for compressed_name in self.compress(name):
+                    yield name, compressed_name, True
+
+    def compress(self, name):
+        """Write the compressed copies of the stored file `name`, return their names."""
+        pending = [(suffix, func) for suffix, func in self.compressors if not self.exists(name + suffix)]
+        if not pending:
+            return []
+        with self.open(name) as original:
+            data = original.read()
+        if len(data) < self.compress_min_size:
+            return []
+
+        written = []
+        for suffix, func in pending:
+            compressed = func(data)
+            if len(compressed) <= len(data) * 0.95:
+                self._save(name + suffix, ContentFile(compressed))
+                written.append(name + suffix)
+        return written
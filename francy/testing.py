@@ -0,0 +1,56 @@
+#
+# Created on Mon Nov 02 2020
+#
+# Copyright (c) 2020 - Simon Prast
+#
+
+
+import unittest
+
+from django.conf import settings
+from django.core.cache import caches
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+def clear_caches():
+    for alias in settings.CACHES:
+        caches[alias].clear()
+
+
+class IsolatedCachesResult:
+    def startTest(self, test):
+        clear_caches()
+        super().startTest(test)
+
+
+class TestRunner(DiscoverRunner):
+    """Runs the tests against locmem caches instead of the configured ones, emptied before every test.
+
+    With FRANCY_CACHE_DIR or memcached configured, the tests would otherwise
+    read entries of the development server and leave theirs behind. Within
+    the run, test cases roll back their database, so the next test reuses the
+    same primary keys and row versions while entries of the last one are
+    still cached.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._caches = override_settings(CACHES={
+            alias: {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                'LOCATION': 'francy-test-' + alias,
+                'TIMEOUT': config.get('TIMEOUT', 300),
+                'KEY_PREFIX': config.get('KEY_PREFIX', ''),
+            }
+            for alias, config in settings.CACHES.items()
+        })
+        self._caches.enable()
+
+    def get_resultclass(self):
+        resultclass = super().get_resultclass() or unittest.TextTestResult
+        return type('IsolatedCaches' + resultclass.__name__, (IsolatedCachesResult, resultclass), {})
+
+    def teardown_test_environment(self, **kwargs):
+        self._caches.disable()
+        super().teardown_test_environment(**kwargs)
@@ -20,11 +20,11 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include
 # from django.views.decorators.csrf import csrf_exempt
 
-from user.models import create_admin_user
 from api import api_views as main_api_views
 
 
@@ -37,7 +37,9 @@ urlpatterns = [
     # Use users/create/ to authenticate
 
     # API versioning
-    path('api/version', main_api_views.show_version),
+    path('api/version', main_api_views.show_version_async if settings.ASYNC_API else main_api_views.show_version),
+    # Prometheus metrics, for scrapers presenting METRICS_TOKEN
+    path('api/metrics', main_api_views.show_metrics),
     # Development version /api/dev/
     # Include all modules using API endpoints through the API module, not directly through the root URLs file.
     path('api/dev/', include('api.dev.urls')),
@@ -48,6 +50,3 @@ urlpatterns = [
     # PATCH version when you make backwards compatible bug fixes.
     # path('api/v1/', include('user.api.v1.urls')),
 ]
-
-
-create_admin_user()
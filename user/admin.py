@@ -11,7 +11,9 @@ from django.contrib.auth.models import Group
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib.auth.forms import ReadOnlyPasswordHashField
 
-from .models import User
+from francy.paginator import EstimatedCountPaginator
+
+from .models import AuthToken, User
 
 
 class UserCreationForm(forms.ModelForm):
@@ -82,13 +84,27 @@ class UserAdmin(BaseUserAdmin):
             "fields": ("username", "email", "utype", "password1", "password2")}
          ),
     )
-    search_fields = ("username", "email")
+    # Prefix searches, answered from the case-insensitive indexes of migration 0007
+    search_fields = ("^username", "^email")
     ordering = ("username", "email")
     filter_horizontal = ()
+    # Avoid counting all users on every page load
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class AuthTokenAdmin(admin.ModelAdmin):
+    list_display = ("key", "user", "created", "last_used", "expires")
+    raw_id_fields = ("user",)
+    search_fields = ("^user__username",)
+    ordering = ("-created",)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 # Now register the new UserAdmin...
 admin.site.register(User, UserAdmin)
+admin.site.register(AuthToken, AuthTokenAdmin)
 # ... and, since we"re not using Django"s built-in permissions,
 # unregister the Group model from admin.
 admin.site.unregister(Group)
@@ -6,24 +6,45 @@
 
 
 from django.conf import settings
+from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
 
-from rest_framework import exceptions, generics, mixins, permissions, status
+from rest_framework import exceptions, generics, mixins, parsers, permissions, status
+from rest_framework.authtoken.serializers import AuthTokenSerializer
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from .authentication import obtain_auth_token, refresh_token, remove_token
+from francy.conditional import conditional
+from francy.rows import ValuesListModelMixin
+
+from .authentication import (
+    create_auth_token, get_or_create_token, obtain_auth_token_for_user, refresh_token, remove_token, token_cache
+)
 
 from ..models import User
+from ..permissions import (
+    USER_CHANGE, USER_CHANGE_OWN, USER_CHANGE_UTYPE, USER_LIST, USER_VIEW, USER_VIEW_OWN, has_action
+)
 from .serializers import UserSerializer, RegisterUserSerializer
-
-
-class UserList(mixins.ListModelMixin,
+from .cache import user_response_cache
+from .conditional import own_user_etag, user_etag
+from .mixins import FieldProjectionMixin
+from .pagination import UserCursorPagination
+from .parsers import FastJSONParser
+from .renderers import FastJSONRenderer
+from .throttling import PasswordRateThrottle
+from .permissions import UtypePermission
+
+
+class UserList(FieldProjectionMixin,
+               ValuesListModelMixin,
                generics.GenericAPIView):
     queryset = User.objects.all()
     serializer_class = UserSerializer
-    permission_classes = [permissions.IsAuthenticated]
+    permission_classes = [UtypePermission]
+    permission_actions = {'GET': (USER_LIST, USER_VIEW_OWN)}
+    pagination_class = UserCursorPagination
 
     def get_object(self, pk):
         try:
@@ -32,42 +53,49 @@ class UserList(mixins.ListModelMixin,
         except User.DoesNotExist:
             raise exceptions.NotFound
 
+    @method_decorator(conditional(own_user_etag, private=True, no_cache=True))
     def get(self, request, *args, **kwargs):
-        # A staff user is allowed to see all users
-        if request.user.is_staff:
+        # Staff users are allowed to see all users, serialized from values_list() rows
+        if has_action(request.user, USER_LIST):
             return self.list(request, *args, **kwargs)
-        # AnonymousUsers are denied.
-        # If the User is not anonymous, only show the requesting user himself.
-        elif not request.user.is_anonymous:
-            user = self.get_object(request.user.id)
-            serializer = UserSerializer(user)
-            return Response(serializer.data)
-        else:
-            exceptions.PermissionDenied
+        # Everyone else only sees the requesting user himself,
+        # served from the response cache per field projection.
+        fields = self.get_projected_fields()
+        data = user_response_cache.get_or_serialize(
+            request.user.id, self.get_object, lambda user: self.get_serializer(user).data,
+            variant=','.join(fields or ()))
+        return Response(data)
 
 
 class UserCreateOrLogin(generics.GenericAPIView):
     serializer_class = RegisterUserSerializer
     permission_classes = [permissions.AllowAny]
+    throttle_classes = [PasswordRateThrottle]
 
     def post(self, request, *args, **kwargs):
         if not request.user.is_anonymous:
             # Deny any request thats not from an AnonymousUser
-            return Response({'detail': 'You cannot create an account while authenticated.'}, status=status.HTTP_403_FORBIDDENe)
+            return Response(
+                {'detail': 'You cannot create an account while authenticated.'},
+                status=status.HTTP_403_FORBIDDEN
+            )
         else:
-            serializer = RegisterUserSerializer(data=request.data)
-
-            if settings.ALLOW_REGISTER:
+            username = request.data.get('username')
+            password = request.data.get('password')
+            existing_user = User.objects.filter(username=username).first() if username else None
+            token = None
+
+            if existing_user is not None:
+                # Authenticate the existing user with given username and password combination.
+                # Registering cannot succeed for a taken username, so its validation is skipped.
+                token, created, user = obtain_auth_token_for_user(existing_user, password)
+            elif settings.ALLOW_REGISTER:
+                serializer = RegisterUserSerializer(data=request.data)
                 if serializer.is_valid():
-                    # Creates the user using create_user()
-                    serializer.save()
-
-            # Authenticate the newly created user
-            # OR authenticate the existing user with given username and password combination.
-            token, created, user = obtain_auth_token(
-                request.data.__getitem__('username'),
-                request.data.__getitem__('password')
-            )
+                    # Creates the user using create_user(). The password has just been
+                    # hashed, so the new user gets a token without authenticating again.
+                    user = serializer.save()
+                    token, created = create_auth_token(user), True
 
             # If a user with given username does already exist but the username password
             # combination is wrong, 'token', 'created' and 'user' will be set to 'None'.
@@ -97,7 +125,9 @@ class UserDetail(mixins.RetrieveModelMixin,
                  generics.GenericAPIView):
     queryset = User.objects.all()
     serializer_class = UserSerializer
-    permission_classes = [permissions.IsAuthenticated]
+    # Staff users may see and change all users, everyone else only himself
+    permission_classes = [UtypePermission]
+    permission_actions = {'GET': (USER_VIEW, USER_VIEW_OWN), 'PUT': (USER_CHANGE, USER_CHANGE_OWN)}
 
     def check_requested_object(self, pk):
         try:
@@ -106,58 +136,69 @@ class UserDetail(mixins.RetrieveModelMixin,
         except User.DoesNotExist:
             raise exceptions.NotFound
 
+    @method_decorator(conditional(user_etag, private=True, no_cache=True))
     def get(self, request, pk, *args, **kwargs):
-        # Get the requested user
-        requested_user = self.check_requested_object(pk=pk)
-        # Only allow staff users and own requests
-        if request.user.is_staff or requested_user == request.user:
-            return self.retrieve(request, *args, **kwargs)
-        else:
-            raise exceptions.PermissionDenied
+        # Served from the response cache, the user is only fetched on a miss
+        data = user_response_cache.get_or_serialize(
+            pk, self.check_requested_object, lambda user: self.get_serializer(user).data)
+        return Response(data)
 
     def put(self, request, pk, *args, **kwargs):
         # Get the requested user
         requested_user = self.check_requested_object(pk=pk)
-        # Only allow staff users and own requests
-        if request.user.is_staff or requested_user == request.user:
-            # This copies the request.data dictionary,
-            # as request.data is read-only.
-            altered_request_data = request.data.copy()
-
-            # last_login cannot be altered.
-            if altered_request_data.__contains__('last_login'):
-                altered_request_data.pop('last_login')
-
-            # utype can only be altered by administrative accounts.
-            if altered_request_data.__contains__('utype') and not request.user.is_staff:
-                altered_request_data.pop('utype')
-
-            # Update the object using the serializer.
-            partial = kwargs.pop('partial', False)
-            instance = self.get_object()
-            serializer = self.get_serializer(
-                instance, data=altered_request_data, partial=partial)
-            serializer.is_valid(raise_exception=True)
-            self.perform_update(serializer)
-
-            # Copy the read-only serializer.data dictionary.
-            serializer_data = serializer.data
-
-            # Set a new password if it was sent through the request body
-            password = request.data.get('password', False)
-            if password:
-                requested_user.set_password(password)
-                requested_user.save()
-
-                # If the user who requests the password change is the user itself,
-                # the user is given a new token. If the password is changed by an admin,
-                # the valid login token is deleted.
-                if requested_user == request.user:
-                    token = refresh_token(requested_user)
-                    serializer_data.update({'token': str(token)})
-                else:
-                    remove_token(requested_user)
-
-            return Response(serializer_data)
-        else:
-            raise exceptions.PermissionDenied
+        # UtypePermission only lets staff users and the user himself through.
+
+        # This copies the request.data dictionary,
+        # as request.data is read-only.
+        altered_request_data = request.data.copy()
+
+        # last_login cannot be altered.
+        if altered_request_data.__contains__('last_login'):
+            altered_request_data.pop('last_login')
+
+        # utype can only be altered by administrative accounts.
+        if altered_request_data.__contains__('utype') and not has_action(request.user, USER_CHANGE_UTYPE):
+            altered_request_data.pop('utype')
+
+        # Update the object using the serializer.
+        partial = kwargs.pop('partial', False)
+        serializer = self.get_serializer(
+            requested_user, data=altered_request_data, partial=partial)
+        serializer.is_valid(raise_exception=True)
+        self.perform_update(serializer)
+        # Drop cached authentications so the next request sees the updated user.
+        token_cache.invalidate_user(requested_user)
+
+        # Copy the read-only serializer.data dictionary.
+        serializer_data = serializer.data
+
+        # Set a new password if it was sent through the request body
+        password = request.data.get('password', False)
+        if password:
+            requested_user.set_password(password)
+            requested_user.save()
+
+            # If the user who requests the password change is the user itself,
+            # the user is given a new token. If the password is changed by an admin,
+            # the valid login token is deleted.
+            if requested_user == request.user:
+                token = refresh_token(requested_user)
+                serializer_data.update({'token': str(token)})
+            else:
+                remove_token(requested_user)
+
+        return Response(serializer_data)
+
+
+class ObtainAuthToken(APIView):
+    """rest_framework.authtoken's view for `AuthToken`, also returning the expiry."""
+    throttle_classes = (PasswordRateThrottle,)
+    permission_classes = ()
+    parser_classes = (parsers.FormParser, parsers.MultiPartParser, FastJSONParser,)
+    renderer_classes = (FastJSONRenderer,)
+
+    def post(self, request, *args, **kwargs):
+        serializer = AuthTokenSerializer(data=request.data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        token, created = get_or_create_token(serializer.validated_data['user'])
+        return Response({'token': token.key, 'expires': token.expires})
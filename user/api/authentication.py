@@ -5,25 +5,203 @@
 #
 
 
-from rest_framework.authtoken.models import Token
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
 from rest_framework.authtoken.serializers import AuthTokenSerializer
 
+from user.models import AuthToken, token_ttl
+
+
+class TokenCache:
+    """A bounded LRU map of token keys to (user, token) pairs.
+
+    Every entry expires `ttl` seconds after it was stored. The cache lives in
+    the memory of a single process, so invalidations only reach the process
+    they were issued in; other workers pick up the change once their entry
+    expires. Keep the TTL short for multi-process deployments.
+    """
+
+    def __init__(self, max_size=10000, ttl=60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        # Maps user primary keys to their cached token keys for invalidation
+        self._keys_by_user = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                self._discard(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, user, token):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._discard(key)
+            self._entries[key] = (time.monotonic() + self.ttl, (user, token))
+            self._keys_by_user.setdefault(user.pk, set()).add(key)
+            while len(self._entries) > self.max_size:
+                self._discard(next(iter(self._entries)))
+
+    def invalidate(self, key):
+        with self._lock:
+            self._discard(key)
+
+    def invalidate_user(self, user):
+        with self._lock:
+            for key in self._keys_by_user.pop(user.pk, ()):
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_user.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+            }
+
+    def _discard(self, key):
+        # Must be called with the lock held
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        user_pk = entry[1][0].pk
+        keys = self._keys_by_user.get(user_pk)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_user[user_pk]
+
+
+token_cache = TokenCache(
+    max_size=getattr(settings, 'TOKEN_CACHE_SIZE', 10000),
+    ttl=getattr(settings, 'TOKEN_CACHE_TTL', 60),
+)
+
+
+TOKEN_TOUCH_INTERVAL = timedelta(seconds=getattr(settings, 'TOKEN_TOUCH_INTERVAL', 5 * 60))
+
+
+def touch_token(token, now=None):
+    """Record a use of `token`, extending its expiry.
+
+    Writes at most once per TOKEN_TOUCH_INTERVAL and token: uses in between
+    only compare timestamps. The UPDATE is conditional, so of several workers
+    touching the same token at once only the first one writes.
+    """
+    now = now or timezone.now()
+    if now - token.last_used < TOKEN_TOUCH_INTERVAL:
+        return
+    expires = now + token_ttl()
+    AuthToken.objects.filter(pk=token.pk, last_used__lt=now - TOKEN_TOUCH_INTERVAL).update(
+        last_used=now, expires=expires)
+    token.last_used, token.expires = now, expires
+
+
+def cached_credentials(key):
+    """Return the cached (user, token) pair of `key` if it can be used without any query, else None."""
+    cached = token_cache.get(key)
+    if cached is None:
+        return None
+    now = timezone.now()
+    token = cached[1]
+    if token.expires <= now or now - token.last_used >= TOKEN_TOUCH_INTERVAL:
+        return None
+    return cached
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication of expiring `AuthToken`s that remembers resolved
+    tokens in `token_cache`, saving the Token + User query on repeated requests."""
+    model = AuthToken
+
+    def authenticate_credentials(self, key):
+        now = timezone.now()
+        cached = token_cache.get(key)
+        if cached is None or cached[1].expires <= now:
+            # Another process may have extended the expiry of a cached token
+            cached = super().authenticate_credentials(key)
+            token_cache.set(key, *cached)
+        user, token = cached
+        if token.expires <= now:
+            token_cache.invalidate(key)
+            raise exceptions.AuthenticationFailed('Token has expired.')
+        touch_token(token, now)
+        return user, token
+
+
+def get_or_create_token(user):
+    """Return (token, created) for `user`. An expired token gets a new key."""
+    token, created = AuthToken.objects.get_or_create(user=user)
+    if not created:
+        if token.is_expired():
+            token_cache.invalidate(token.key)
+            token = AuthToken.objects.rotate(user)
+        else:
+            touch_token(token)
+    return token, created
+
 
 def obtain_auth_token(username, password):
     serializer_auth = AuthTokenSerializer(
         data={'username': username, 'password': password})
     if serializer_auth.is_valid():
         user = serializer_auth.validated_data['user']
-        token, created = Token.objects.get_or_create(user=user)
+        token, created = get_or_create_token(user)
+        return token, created, user
+    return None, None, None
+
+
+def obtain_auth_token_for_user(user, password):
+    # Same as obtain_auth_token() for an already fetched user, saving the second lookup.
+    if password and user.check_password(password):
+        token, created = get_or_create_token(user)
         return token, created, user
     return None, None, None
 
 
+def create_auth_token(user):
+    # For users without a token, e.g. right after registration
+    return AuthToken.objects.create(user=user)
+
+
 def remove_token(user):
-    Token.objects.filter(user=user).delete()
+    AuthToken.objects.filter(user=user).delete()
+    token_cache.invalidate_user(user)
 
 
 def refresh_token(user):
-    remove_token(user)
-    token = Token.objects.create(user=user)
-    return token
+    # Replaces the key in place instead of deleting and inserting the row
+    token_cache.invalidate_user(user)
+    return AuthToken.objects.rotate(user)
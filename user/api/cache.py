@@ -0,0 +1,114 @@
+#
+# Created on Mon Nov 02 2020
+#
+# Copyright (c) 2020 - Simon Prast
+#
+
+
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.db import connections, router, transaction
+
+from francy.cache.namespaces import CacheNamespace
+
+
+class UserResponseCache:
+    """Serialized users in the Django cache, keyed by the user's row_version.
+
+    A pointer entry holds the current row_version of every cached user, the
+    serialized representations are stored under that version. Saving a user
+    moves the pointer to the new version once the save is committed (see
+    user/apps.py), which makes all older representations unreachable at once;
+    they simply expire. With the pointer cached, the ETag and the body of a
+    user cost no query.
+
+    Primary keys and row_versions repeat across databases, and in the same
+    database once it is flushed. All keys are therefore scoped by the database
+    alias and name and by a generation, which post_migrate (also sent by
+    `manage.py flush`) replaces.
+    """
+
+    def __init__(self, cache_alias='default', timeout=300, name='user-response'):
+        self.namespace = CacheNamespace(name, cache_alias, timeout)
+
+    def version(self, pk):
+        """Return the current row_version of the user `pk`, None if there is no such user."""
+        scope, generation, version = self._lookup(pk)
+        if version is None:
+            from user.models import User
+            version = User.objects.filter(pk=pk).values_list('row_version', flat=True).first()
+            if version is not None:
+                # add() never overwrites a newer version set by a concurrent save
+                self.namespace.add(scope + (pk,), (generation, version))
+        return version
+
+    def get_or_serialize(self, pk, load, serialize, variant=''):
+        """Return the cached representation of the user `pk`, or `serialize(load(pk))`.
+
+        `variant` tells different representations (e.g. field projections) apart.
+        """
+        scope, generation, version = self._lookup(pk)
+        if version is not None:
+            data = self.namespace.get(scope + (generation, pk, version, variant))
+            if data is not None:
+                return data
+
+        user = load(pk)
+        data = dict(serialize(user))
+        self.namespace.add(scope + (pk,), (generation, user.row_version))
+        self.namespace.set(scope + (generation, pk, user.row_version, variant), data)
+        return data
+
+    def user_saved(self, user, using):
+        # A pointer set before the commit would let other processes cache the old row under the new version
+        transaction.on_commit(lambda: self._set_pointer(using, user.pk, user.row_version), using=using)
+
+    def invalidate(self, pk, using):
+        scope = self._scope(using)
+        transaction.on_commit(lambda: self.namespace.delete(scope + (pk,)), using=using)
+
+    def new_generation(self, using):
+        """Make all entries of the database `using` unreachable."""
+        self.namespace.set(self._scope(using) + ('generation',), uuid.uuid4().hex, None)
+
+    def _scope(self, using=None):
+        if using is None:
+            from user.models import User
+            using = router.db_for_read(User)
+        name = str(connections[using].settings_dict['NAME'])
+        return using, hashlib.md5(name.encode()).hexdigest()[:12]
+
+    def _generation(self, scope, found):
+        generation = found.get(scope + ('generation',))
+        if generation is None:
+            generation = uuid.uuid4().hex
+            if not self.namespace.add(scope + ('generation',), generation, None):
+                generation = self.namespace.get(scope + ('generation',), generation)
+        return generation
+
+    def _lookup(self, pk):
+        """Return the scope, the generation and the cached row_version of the user `pk` (None if unknown)."""
+        scope = self._scope()
+        found = self.namespace.get_many([scope + ('generation',), scope + (pk,)])
+        generation = self._generation(scope, found)
+        pointer = found.get(scope + (pk,))
+        if pointer is None:
+            return scope, generation, None
+        if pointer[0] != generation:
+            # Left from before a flush, it would keep add() from storing the current version
+            self.namespace.delete(scope + (pk,))
+            return scope, generation, None
+        return scope, generation, pointer[1]
+
+    def _set_pointer(self, using, pk, version):
+        scope = self._scope(using)
+        generation = self._generation(scope, self.namespace.get_many([scope + ('generation',)]))
+        self.namespace.set(scope + (pk,), (generation, version))
+
+
+user_response_cache = UserResponseCache(
+    cache_alias=getattr(settings, 'USER_RESPONSE_CACHE', 'default'),
+    timeout=getattr(settings, 'USER_RESPONSE_CACHE_TIMEOUT', 300),
+)
@@ -0,0 +1,27 @@
+#
+# Created on Mon Nov 02 2020
+#
+# Copyright (c) 2020 - Simon Prast
+#
+
+
+from francy.conditional import make_etag
+from user.api.cache import user_response_cache
+from user.permissions import USER_LIST, USER_VIEW, USER_VIEW_OWN, has_action, has_action_on
+
+
+def user_etag(request, pk, *args, **kwargs):
+    """ETag of the user `pk` from its row_version, if the requesting user may see it.
+    The row_version comes from the response cache, so it usually costs no query."""
+    user = request.user
+    if not has_action_on(user, USER_VIEW, USER_VIEW_OWN, pk):
+        return None
+    row_version = user_response_cache.version(pk)
+    return None if row_version is None else make_etag(request, pk, row_version)
+
+
+def own_user_etag(request, *args, **kwargs):
+    # Only the self view of the user list, staff users get all users without a validator
+    if request.user.is_anonymous or has_action(request.user, USER_LIST):
+        return None
+    return user_etag(request, request.user.pk)
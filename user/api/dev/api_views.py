@@ -5,22 +5,45 @@
 #
 
 
+import csv
+
 from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.utils.decorators import method_decorator
 
 from rest_framework import exceptions, generics, mixins, permissions, status
 from rest_framework.response import Response
 
-from .authentication import obtain_auth_token, refresh_token, remove_token
+from francy.conditional import conditional
+from francy.rows import ValuesListModelMixin
+
+from .authentication import create_auth_token, obtain_auth_token_for_user, refresh_token, remove_token
+from user.api.authentication import token_cache
 
+from user.bulk import format_for_content_type, read_rows
 from user.models import User
+from user.api.permissions import UtypePermission
+from user.api.throttling import PasswordRateThrottle
+from user.permissions import (
+    USER_CHANGE, USER_CHANGE_OWN, USER_CHANGE_UTYPE, USER_EXPORT, USER_IMPORT, USER_LIST, USER_VIEW, USER_VIEW_OWN,
+    has_action
+)
 from .serializers import UserSerializer, RegisterUserSerializer
+from user.api.cache import user_response_cache
+from user.api.conditional import own_user_etag, user_etag
+from user.api.mixins import FieldProjectionMixin
+from user.api.pagination import UserCursorPagination
+from user.api.renderers import CSVRenderer, NDJSONRenderer
 
 
-class UserList(mixins.ListModelMixin,
+class UserList(FieldProjectionMixin,
+               ValuesListModelMixin,
                generics.GenericAPIView):
     queryset = User.objects.all()
     serializer_class = UserSerializer
-    permission_classes = [permissions.IsAuthenticated]
+    permission_classes = [UtypePermission]
+    permission_actions = {'GET': (USER_LIST, USER_VIEW_OWN)}
+    pagination_class = UserCursorPagination
 
     def get_object(self, pk):
         try:
@@ -29,23 +52,98 @@ class UserList(mixins.ListModelMixin,
         except User.DoesNotExist:
             raise exceptions.NotFound
 
+    @method_decorator(conditional(own_user_etag, private=True, no_cache=True))
     def get(self, request, *args, **kwargs):
-        # A staff user is allowed to see all users
-        if request.user.is_staff:
+        # Staff users are allowed to see all users, serialized from values_list() rows
+        if has_action(request.user, USER_LIST):
             return self.list(request, *args, **kwargs)
-        # AnonymousUsers are denied.
-        # If the User is not anonymous, only show the requesting user himself.
-        elif not request.user.is_anonymous:
-            user = self.get_object(request.user.id)
-            serializer = UserSerializer(user)
-            return Response(serializer.data)
-        else:
-            exceptions.PermissionDenied
+        # Everyone else only sees the requesting user himself,
+        # served from the response cache per field projection.
+        fields = self.get_projected_fields()
+        data = user_response_cache.get_or_serialize(
+            request.user.id, self.get_object, lambda user: self.get_serializer(user).data,
+            variant=','.join(fields or ()))
+        return Response(data)
+
+
+class UserExport(FieldProjectionMixin,
+                 generics.GenericAPIView):
+    """Streams all users as NDJSON (default) or CSV, selected through
+    `?format=csv`, the `.csv` suffix or the Accept header.
+
+    Rows are read with a chunked iterator and never collected, so memory
+    use does not grow with the number of exported users.
+    """
+    queryset = User.objects.order_by('id')
+    serializer_class = UserSerializer
+    permission_classes = [UtypePermission]
+    permission_actions = {'GET': (USER_EXPORT,)}
+    renderer_classes = [NDJSONRenderer, CSVRenderer]
+    chunk_size = 2000
+
+    def get(self, request, *args, **kwargs):
+        serializer_fields = self.get_serializer().fields
+        fieldnames = self.get_projected_fields() or list(serializer_fields)
+        representations = [serializer_fields[name].to_representation for name in fieldnames]
+
+        # Skip model instantiation and map the raw column values through
+        # the serializer's fields, so the output matches UserSerializer.
+        rows = (
+            [None if value is None else to_representation(value)
+             for to_representation, value in zip(representations, row)]
+            for row in self.get_queryset().values_list(*fieldnames).iterator(chunk_size=self.chunk_size)
+        )
+
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(
+            renderer.stream(fieldnames, rows),
+            content_type='{}; charset={}'.format(renderer.media_type, renderer.charset)
+        )
+        response['Content-Disposition'] = 'attachment; filename="users.{}"'.format(renderer.format)
+        return response
+
+
+class UserImport(generics.GenericAPIView):
+    """Creates users in bulk from a CSV, NDJSON or JSON array request body,
+    selected by its Content-Type. Pass `?tokens=1` to create API tokens too.
+
+    Responds with the number of created and failed rows plus one result per row.
+    """
+    permission_classes = [UtypePermission]
+    permission_actions = {'POST': (USER_IMPORT,)}
+    batch_size = 500
+
+    def post(self, request, *args, **kwargs):
+        format = format_for_content_type(request.content_type)
+        if format is None:
+            raise exceptions.UnsupportedMediaType(request.content_type)
+
+        # Read the body line by line instead of letting DRF parse it as a whole,
+        # lines that cannot be read are reported as failed rows
+        create_tokens = request.query_params.get('tokens') in ('1', 'true')
+        results = []
+        try:
+            for result in User.objects.import_users(
+                    read_rows(request._request, format), batch_size=self.batch_size, create_tokens=create_tokens):
+                results.append(result)
+        except (ValueError, csv.Error) as exc:
+            if not results:
+                raise exceptions.ParseError(str(exc))
+            # The reported rows are committed, the rest of the body was not imported
+            results.append({'row': len(results), 'username': None, 'status': 'error',
+                            'errors': {'non_field_errors': ['Import stopped: {}'.format(exc)]}})
+
+        created = sum(1 for result in results if result['status'] == 'created')
+        return Response(
+            {'created': created, 'failed': len(results) - created, 'results': results},
+            status=status.HTTP_201_CREATED if created else status.HTTP_400_BAD_REQUEST
+        )
 
 
 class UserCreateOrLogin(generics.GenericAPIView):
     serializer_class = RegisterUserSerializer
     permission_classes = [permissions.AllowAny]
+    throttle_classes = [PasswordRateThrottle]
 
     def post(self, request, *args, **kwargs):
         if not request.user.is_anonymous:
@@ -55,19 +153,22 @@ class UserCreateOrLogin(generics.GenericAPIView):
                 status=status.HTTP_403_FORBIDDEN
             )
         else:
-            serializer = RegisterUserSerializer(data=request.data)
+            username = request.data.get('username')
+            password = request.data.get('password')
+            existing_user = User.objects.filter(username=username).first() if username else None
+            token = None
 
-            if settings.ALLOW_REGISTER:
+            if existing_user is not None:
+                # Authenticate the existing user with given username and password combination.
+                # Registering cannot succeed for a taken username, so its validation is skipped.
+                token, created, user = obtain_auth_token_for_user(existing_user, password)
+            elif settings.ALLOW_REGISTER:
+                serializer = RegisterUserSerializer(data=request.data)
                 if serializer.is_valid():
-                    # Creates the user using create_user()
-                    serializer.save()
-
-            # Authenticate the newly created user
-            # OR authenticate the existing user with given username and password combination.
-            token, created, user = obtain_auth_token(
-                request.data.__getitem__('username'),
-                request.data.__getitem__('password')
-            )
+                    # Creates the user using create_user(). The password has just been
+                    # hashed, so the new user gets a token without authenticating again.
+                    user = serializer.save()
+                    token, created = create_auth_token(user), True
 
             # If a user with given username does already exist but the username password
             # combination is wrong, 'token', 'created' and 'user' will be set to 'None'.
@@ -97,7 +198,9 @@ class UserDetail(mixins.RetrieveModelMixin,
                  generics.GenericAPIView):
     queryset = User.objects.all()
     serializer_class = UserSerializer
-    permission_classes = [permissions.IsAuthenticated]
+    # Staff users may see and change all users, everyone else only himself
+    permission_classes = [UtypePermission]
+    permission_actions = {'GET': (USER_VIEW, USER_VIEW_OWN), 'PUT': (USER_CHANGE, USER_CHANGE_OWN)}
 
     def check_requested_object(self, pk):
         try:
@@ -106,58 +209,55 @@ class UserDetail(mixins.RetrieveModelMixin,
         except User.DoesNotExist:
             raise exceptions.NotFound
 
+    @method_decorator(conditional(user_etag, private=True, no_cache=True))
     def get(self, request, pk, *args, **kwargs):
-        # Get the requested user
-        requested_user = self.check_requested_object(pk=pk)
-        # Only allow staff users and own requests
-        if request.user.is_staff or requested_user == request.user:
-            return self.retrieve(request, *args, **kwargs)
-        else:
-            raise exceptions.PermissionDenied
+        # Served from the response cache, the user is only fetched on a miss
+        data = user_response_cache.get_or_serialize(
+            pk, self.check_requested_object, lambda user: self.get_serializer(user).data)
+        return Response(data)
 
     def put(self, request, pk, *args, **kwargs):
         # Get the requested user
         requested_user = self.check_requested_object(pk=pk)
-        # Only allow staff users and own requests
-        if request.user.is_staff or requested_user == request.user:
-            # This copies the request.data dictionary,
-            # as request.data is read-only.
-            altered_request_data = request.data.copy()
-
-            # last_login cannot be altered.
-            if altered_request_data.__contains__('last_login'):
-                altered_request_data.pop('last_login')
-
-            # utype can only be altered by administrative accounts.
-            if altered_request_data.__contains__('utype') and not request.user.is_staff:
-                altered_request_data.pop('utype')
-
-            # Update the object using the serializer.
-            partial = kwargs.pop('partial', False)
-            instance = self.get_object()
-            serializer = self.get_serializer(
-                instance, data=altered_request_data, partial=partial)
-            serializer.is_valid(raise_exception=True)
-            self.perform_update(serializer)
-
-            # Copy the read-only serializer.data dictionary.
-            serializer_data = serializer.data
-
-            # Set a new password if it was sent through the request body
-            password = request.data.get('password', False)
-            if password:
-                requested_user.set_password(password)
-                requested_user.save()
-
-                # If the user who requests the password change is the user itself,
-                # the user is given a new token. If the password is changed by an admin,
-                # the valid login token is deleted.
-                if requested_user == request.user:
-                    token = refresh_token(requested_user)
-                    serializer_data.update({'token': str(token)})
-                else:
-                    remove_token(requested_user)
-
-            return Response(serializer_data)
-        else:
-            raise exceptions.PermissionDenied
+        # UtypePermission only lets staff users and the user himself through.
+
+        # This copies the request.data dictionary,
+        # as request.data is read-only.
+        altered_request_data = request.data.copy()
+
+        # last_login cannot be altered.
+        if altered_request_data.__contains__('last_login'):
+            altered_request_data.pop('last_login')
+
+        # utype can only be altered by administrative accounts.
+        if altered_request_data.__contains__('utype') and not has_action(request.user, USER_CHANGE_UTYPE):
+            altered_request_data.pop('utype')
+
+        # Update the object using the serializer.
+        partial = kwargs.pop('partial', False)
+        serializer = self.get_serializer(
+            requested_user, data=altered_request_data, partial=partial)
+        serializer.is_valid(raise_exception=True)
+        self.perform_update(serializer)
+        # Drop cached authentications so the next request sees the updated user.
+        token_cache.invalidate_user(requested_user)
+
+        # Copy the read-only serializer.data dictionary.
+        serializer_data = serializer.data
+
+        # Set a new password if it was sent through the request body
+        password = request.data.get('password', False)
+        if password:
+            requested_user.set_password(password)
+            requested_user.save()
+
+            # If the user who requests the password change is the user itself,
+            # the user is given a new token. If the password is changed by an admin,
+            # the valid login token is deleted.
+            if requested_user == request.user:
+                token = refresh_token(requested_user)
+                serializer_data.update({'token': str(token)})
+            else:
+                remove_token(requested_user)
+
+        return Response(serializer_data)
@@ -0,0 +1,17 @@
+#
+# Created on Mon Nov 02 2020
+#
+# Copyright (c) 2020 - Simon Prast
+#
+
+
+from django.urls import path
+
+from . import async_views
+
+urlpatterns = [
+    path('users/', async_views.user_list),
+    path('users/<int:pk>/', async_views.user_detail),
+    path('users/create/', async_views.user_create_or_login),
+    path('users/login/', async_views.user_create_or_login),
+]
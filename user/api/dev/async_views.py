@@ -0,0 +1,224 @@
+#
+# Created on Mon Nov 02 2020
+#
+# Copyright (c) 2020 - Simon Prast
+#
+
+
+"""
+ASGI-native counterparts of the views in api_views.
+
+They are mounted instead of the DRF views when the project runs with
+ASYNC_API enabled (see francy/asgi.py). Authentication is answered from the
+token cache and password hashes are awaited on the hashing executor, both
+without leaving the event loop. Django has no async ORM interface yet, so
+the remaining database work of a request is grouped into a single
+sync_to_async call per step.
+"""
+
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpResponse
+
+from rest_framework import exceptions, status
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from francy.conditional import conditional
+from user.api.authentication import CachedTokenAuthentication, cached_credentials, get_or_create_token, token_cache
+from user.api.cache import user_response_cache
+from user.api.conditional import own_user_etag, user_etag
+from user.api.jsoncodec import dumps
+from user.api.throttling import check_password_throttle
+from user.hashing import hashing_executor
+from user.models import User
+from user.permissions import (
+    USER_CHANGE, USER_CHANGE_OWN, USER_CHANGE_UTYPE, USER_LIST, USER_VIEW, USER_VIEW_OWN, has_action, has_action_on
+)
+from .api_views import UserList
+from .authentication import create_auth_token, refresh_token, remove_token
+from .serializers import UserSerializer, RegisterUserSerializer
+
+
+async def authenticate(request):
+    """Return the user of the request's API token, resolved once per request:
+    conditional() resolves it for the ETag, the view reuses it."""
+    try:
+        return request._api_user
+    except AttributeError:
+        pass
+    user = request._api_user = await _authenticate(request)
+    return user
+
+
+async def _authenticate(request):
+    auth = request.headers.get('Authorization', '').split()
+    if not auth or auth[0].lower() != CachedTokenAuthentication.keyword.lower():
+        return AnonymousUser()
+    if len(auth) != 2:
+        raise exceptions.AuthenticationFailed('Invalid token header.')
+
+    cached = cached_credentials(auth[1])
+    if cached is not None:
+        return cached[0]
+    user, token = await sync_to_async(CachedTokenAuthentication().authenticate_credentials)(auth[1])
+    return user
+
+
+def async_api_view(methods):
+    """Wraps an async view with token authentication, method checks and
+    DRF-style error responses. The view receives a DRF `Request`."""
+    def decorator(view_func):
+        @wraps(view_func)
+        async def view(request, *args, **kwargs):
+            try:
+                if request.method not in methods:
+                    raise exceptions.MethodNotAllowed(request.method)
+                user = await authenticate(request)
+                request = Request(request, parsers=[parser() for parser in api_settings.DEFAULT_PARSER_CLASSES])
+                request.user = user
+                data, response_status = await view_func(request, *args, **kwargs)
+            except exceptions.APIException as exc:
+                data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+                response = HttpResponse(dumps(data), status=exc.status_code, content_type='application/json')
+                if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+                    response['WWW-Authenticate'] = CachedTokenAuthentication.keyword
+                elif isinstance(exc, exceptions.Throttled) and exc.wait:
+                    response['Retry-After'] = '%d' % exc.wait
+                return response
+            return HttpResponse(dumps(data), status=response_status, content_type='application/json')
+
+        # Token authenticated API, no session cookies involved
+        view.csrf_exempt = True
+        return view
+    return decorator
+
+
+def token_authenticated(etag_func):
+    """Runs a sync ETag function for `conditional()` with the user of the API token."""
+    async def etag(request, *args, **kwargs):
+        try:
+            request.user = await authenticate(request)
+        except exceptions.APIException:
+            # Answered by the view
+            return None
+        return await sync_to_async(etag_func)(request, *args, **kwargs)
+    return etag
+
+
+def _get_user(pk):
+    try:
+        return User.objects.get(pk=pk)
+    except User.DoesNotExist:
+        raise exceptions.NotFound
+
+
+def _serialize_user(pk):
+    return user_response_cache.get_or_serialize(pk, _get_user, lambda user: UserSerializer(user).data)
+
+
+def _list_users(request):
+    # Reuses the pagination and field projection of the sync view
+    view = UserList(request=request, args=(), kwargs={}, format_kwarg=None)
+    return view.list(request).data
+
+
+@conditional(token_authenticated(own_user_etag), private=True, no_cache=True)
+@async_api_view(['GET'])
+async def user_list(request):
+    if request.user.is_anonymous:
+        raise exceptions.NotAuthenticated
+    # A staff user is allowed to see all users
+    if has_action(request.user, USER_LIST):
+        return await sync_to_async(_list_users)(request), status.HTTP_200_OK
+    # Otherwise only show the requesting user himself.
+    return await sync_to_async(_serialize_user)(request.user.pk), status.HTTP_200_OK
+
+
+@async_api_view(['POST'])
+async def user_create_or_login(request):
+    if not request.user.is_anonymous:
+        # Deny any request thats not from an AnonymousUser
+        return {'detail': 'You cannot create an account while authenticated.'}, status.HTTP_403_FORBIDDEN
+    # Before any database work or password hashing
+    check_password_throttle(request)
+
+    username = request.data.get('username')
+    password = request.data.get('password')
+    existing_user = await sync_to_async(User.objects.filter(username=username).first)() if username else None
+    token = None
+
+    if existing_user is not None:
+        # Registering cannot succeed for a taken username, so only authenticate.
+        if password and await existing_user.acheck_password(password):
+            token, created = await sync_to_async(get_or_create_token)(existing_user)
+            user = existing_user
+    elif settings.ALLOW_REGISTER:
+        serializer = RegisterUserSerializer(data=request.data)
+        if await sync_to_async(serializer.is_valid)():
+            user = await serializer.asave()
+            token, created = await sync_to_async(create_auth_token)(user), True
+
+    if not token:
+        errors = {
+            'username': [
+                'user with this username already exists',
+                'username and password combination wrong'
+            ]
+        }
+        return errors, status.HTTP_400_BAD_REQUEST
+
+    auth_status = status.HTTP_201_CREATED if created else status.HTTP_200_OK
+    return {'username': user.username, 'token': token.key, 'created': str(created)}, auth_status
+
+
+def _update_user(request, requested_user, data, encoded_password):
+    serializer = UserSerializer(requested_user, data=data)
+    serializer.is_valid(raise_exception=True)
+    serializer.save()
+    token_cache.invalidate_user(requested_user)
+    serializer_data = serializer.data
+
+    if encoded_password:
+        requested_user.password = encoded_password
+        requested_user.save()
+
+        # The user changing his own password gets a new token,
+        # a password changed by an admin deletes the token.
+        if requested_user == request.user:
+            serializer_data.update({'token': str(refresh_token(requested_user))})
+        else:
+            remove_token(requested_user)
+    return serializer_data
+
+
+@conditional(token_authenticated(user_etag), private=True, no_cache=True)
+@async_api_view(['GET', 'PUT'])
+async def user_detail(request, pk):
+    if request.user.is_anonymous:
+        raise exceptions.NotAuthenticated
+    # Only allow staff users and own requests, see user/permissions.py
+    if request.method == 'GET':
+        if not has_action_on(request.user, USER_VIEW, USER_VIEW_OWN, pk):
+            raise exceptions.PermissionDenied
+        return await sync_to_async(_serialize_user)(pk), status.HTTP_200_OK
+
+    if not has_action_on(request.user, USER_CHANGE, USER_CHANGE_OWN, pk):
+        raise exceptions.PermissionDenied
+    requested_user = await sync_to_async(_get_user)(pk)
+
+    data = request.data.copy()
+    # last_login cannot be altered, utype only by administrative accounts.
+    data.pop('last_login', None)
+    if not has_action(request.user, USER_CHANGE_UTYPE):
+        data.pop('utype', None)
+
+    # Hash a new password before touching the database
+    password = request.data.get('password', False)
+    encoded_password = await hashing_executor.amake_password(password) if password else None
+
+    serializer_data = await sync_to_async(_update_user)(request, requested_user, data, encoded_password)
+    return serializer_data, status.HTTP_200_OK
@@ -5,25 +5,41 @@
 #
 
 
-from rest_framework.authtoken.models import Token
 from rest_framework.authtoken.serializers import AuthTokenSerializer
 
+from user.api.authentication import get_or_create_token, token_cache
+from user.models import AuthToken
+
 
 def obtain_auth_token(username, password):
     serializer_auth = AuthTokenSerializer(
         data={'username': username, 'password': password})
     if serializer_auth.is_valid():
         user = serializer_auth.validated_data['user']
-        token, created = Token.objects.get_or_create(user=user)
+        token, created = get_or_create_token(user)
         return token, created, user
     return None, None, None
 
 
+def obtain_auth_token_for_user(user, password):
+    # Same as obtain_auth_token() for an already fetched user, saving the second lookup.
+    if password and user.check_password(password):
+        token, created = get_or_create_token(user)
+        return token, created, user
+    return None, None, None
+
+
+def create_auth_token(user):
+    # For users without a token, e.g. right after registration
+    return AuthToken.objects.create(user=user)
+
+
 def remove_token(user):
-    Token.objects.filter(user=user).delete()
+    AuthToken.objects.filter(user=user).delete()
+    token_cache.invalidate_user(user)
 
 
 def refresh_token(user):
-    remove_token(user)
-    token = Token.objects.create(user=user)
-    return token
+    # Replaces the key in place instead of deleting and inserting the row
+    token_cache.invalidate_user(user)
+    return AuthToken.objects.rotate(user)
@@ -15,7 +15,6 @@ class ReadOnly(permissions.BasePermission):
 
 class IsStaff(permissions.BasePermission):
     def has_permission(self, request, view):
-        print(request.user.is_staff)
         return request.user.is_staff
 
 
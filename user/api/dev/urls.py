@@ -6,20 +6,21 @@
 
 
 from django.urls import path
-from rest_framework.authtoken.views import obtain_auth_token
 from rest_framework.urlpatterns import format_suffix_patterns
 
+from user.api.api_views import ObtainAuthToken
 from . import api_views
 
 urlpatterns = [
     path('users/', api_views.UserList.as_view()),
     path('users/<int:pk>/', api_views.UserDetail.as_view()),
+    path('users/export/', api_views.UserExport.as_view()),
+    path('users/import/', api_views.UserImport.as_view()),
     path('users/create/', api_views.UserCreateOrLogin.as_view()),
     path('users/login/', api_views.UserCreateOrLogin.as_view()),
 
-    # Todo:
-    # https://stackoverflow.com/questions/14567586/token-authentication-for-restful-api-should-the-token-be-periodically-changed
-    path('auth/', obtain_auth_token, name='api_token_auth'),
+    # Tokens expire TOKEN_TTL seconds after their last use
+    path('auth/', ObtainAuthToken.as_view(), name='api_token_auth'),
 ]
 
 urlpatterns = format_suffix_patterns(urlpatterns)
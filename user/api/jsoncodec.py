@@ -0,0 +1,94 @@
+#
+# Created on Mon Nov 02 2020
+#
+# Copyright (c) 2020 - Simon Prast
+#
+
+
+"""
+JSON encoding and decoding of the API responses and request bodies.
+
+JSON_BACKEND selects the implementation:
+    'orjson'    orjson, several times faster, in particular at encoding
+                long lists of rows like the staff user list
+    'json'      the standard library, with one encoder reused by all calls
+    None        orjson if it is installed, else json
+
+Both produce the output of DRF's compact JSONRenderer: datetimes in ISO 8601
+with 'Z' for UTC, Decimals as numbers, UUIDs and lazy translations as
+strings, and U+2028 / U+2029 escaped. Types neither library knows are
+handed to DRF's JSONEncoder.default().
+"""
+
+import json
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+BACKENDS = ('orjson', 'json')
+
+_encoder = JSONEncoder(ensure_ascii=False, allow_nan=not api_settings.STRICT_JSON, separators=(',', ':'))
+
+
+def get_backend():
+    backend = getattr(settings, 'JSON_BACKEND', None)
+    if backend is None:
+        return 'orjson' if orjson is not None else 'json'
+    if backend not in BACKENDS:
+        raise ImproperlyConfigured('JSON_BACKEND must be one of {}, not {!r}.'.format(', '.join(BACKENDS), backend))
+    if backend == 'orjson' and orjson is None:
+        raise ImproperlyConfigured('JSON_BACKEND is orjson, but orjson is not installed.')
+    return backend
+
+
+def _escape_separators(content):
+    # Valid in JSON strings, but not in JavaScript ones
+    if b'\xe2\x80\xa8' in content or b'\xe2\x80\xa9' in content:
+        content = content.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+    return content
+
+
+def _strict_constant(value):
+    # NaN and Infinity, rejected like by DRF's JSONParser with STRICT_JSON
+    raise ValueError('Out of range float values are not JSON compliant: ' + value)
+
+
+def _orjson_dumps(data):
+    """Return `data` encoded as compact JSON bytes."""
+    return _escape_separators(orjson.dumps(data, default=_encoder.default, option=_orjson_options))
+
+
+def _json_dumps(data):
+    """Return `data` encoded as compact JSON bytes."""
+    return _escape_separators(_encoder.encode(data).encode())
+
+
+def _orjson_loads(content):
+    """Return the data of the JSON document `content` (bytes or str), raise ValueError if invalid."""
+    return orjson.loads(content)
+
+
+def _json_loads(content):
+    """Return the data of the JSON document `content` (bytes or str), raise ValueError if invalid."""
+    if isinstance(content, (bytes, bytearray)):
+        content = content.decode()
+    return json.loads(content, parse_constant=_strict_constant if api_settings.STRICT_JSON else None)
+
+
+# (dumps, loads) by backend
+CODECS = {'json': (_json_dumps, _json_loads)}
+if orjson is not None:
+    # Compact like separators=(',', ':'), 'Z' like DRF's encoder, and int keys like json
+    _orjson_options = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+    CODECS['orjson'] = (_orjson_dumps, _orjson_loads)
+
+dumps, loads = CODECS[get_backend()]
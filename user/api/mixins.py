@@ -0,0 +1,50 @@
+#
+# Created on Mon Nov 02 2020
+#
+# Copyright (c) 2020 - Simon Prast
+#
+
+
+from rest_framework import exceptions
+
+
+class FieldProjectionMixin:
+    """Restricts a view to the fields requested through `?fields=a,b,c`.
+
+    The projection is pushed down to the queryset with `.only()` and to the
+    serializer through its `fields` argument, so unrequested columns are
+    neither loaded nor serialized.
+    """
+    fields_query_param = 'fields'
+
+    def get_projected_fields(self):
+        if not hasattr(self, '_projected_fields'):
+            self._projected_fields = self._parse_projected_fields()
+        return self._projected_fields
+
+    def _parse_projected_fields(self):
+        raw = self.request.query_params.get(self.fields_query_param)
+        if not raw:
+            return None
+
+        requested = [name.strip() for name in raw.split(',') if name.strip()]
+        available = self.get_serializer_class()().fields
+        unknown = [name for name in requested if name not in available]
+        if unknown:
+            raise exceptions.ValidationError(
+                {self.fields_query_param: ['Unknown field(s): ' + ', '.join(unknown)]})
+        return requested
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        fields = self.get_projected_fields()
+        if fields:
+            concrete = {field.name for field in queryset.model._meta.concrete_fields}
+            queryset = queryset.only(*[name for name in fields if name in concrete])
+        return queryset
+
+    def get_serializer(self, *args, **kwargs):
+        fields = self.get_projected_fields()
+        if fields:
+            kwargs.setdefault('fields', fields)
+        return super().get_serializer(*args, **kwargs)
@@ -7,6 +7,8 @@
 
 from rest_framework import permissions
 
+from user.permissions import bits, permission_mask
+
 
 class ReadOnly(permissions.BasePermission):
     def has_permission(self, request, view):
@@ -15,10 +17,64 @@ class ReadOnly(permissions.BasePermission):
 
 class IsStaff(permissions.BasePermission):
     def has_permission(self, request, view):
-        print(request.user.is_staff)
         return request.user.is_staff
 
 
 class OnlyShowSelf(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
         return obj == request.user
+
+
+class UtypePermission(permissions.BasePermission):
+    """Checks requests against the permission matrix of user/permissions.py.
+
+    Views list the actions granting each method in `permission_actions`,
+    e.g. {'GET': (USER_VIEW, USER_VIEW_OWN)}. Any of them grants a request,
+    '_own' actions only for the requesting user's own object: the user `pk`
+    of the URL, or the user itself on URLs without a `pk`. Methods without
+    an entry are denied, views without `permission_actions` entirely.
+
+    The actions of a view class are compiled to masks on its first request
+    and kept in `_compiled`, which therefore holds one entry per view class.
+    Actions given to a single view instance (e.g. through as_view()) are
+    compiled on every request instead.
+    """
+    _compiled = {}
+
+    def has_permission(self, request, view):
+        actions = getattr(view, 'permission_actions', None)
+        if actions is None:
+            return False
+        cached = self._compiled.get(type(view))
+        if cached is not None and cached[0] is actions:
+            compiled = cached[1]
+        else:
+            compiled = self.compile(actions)
+            if actions is getattr(type(view), 'permission_actions', None):
+                self._compiled[type(view)] = (actions, compiled)
+        # The HttpRequest's attribute, the proxy of DRF's Request costs a microsecond
+        required = compiled.get(request._request.method)
+        if required is None:
+            return False
+        any_mask, own_mask = required
+        user = request.user
+        mask = permission_mask(user)
+        if mask & any_mask:
+            return True
+        if mask & own_mask:
+            pk = view.kwargs.get('pk')
+            return pk is None or pk == user.pk
+        return False
+
+    @staticmethod
+    def compile(permission_actions):
+        compiled = {
+            method: (bits(*[action for action in actions if not action.endswith('_own')]),
+                     bits(*[action for action in actions if action.endswith('_own')]))
+            for method, actions in permission_actions.items()
+        }
+        # HEAD and OPTIONS need the permissions of GET
+        if 'GET' in compiled:
+            compiled.setdefault('HEAD', compiled['GET'])
+            compiled.setdefault('OPTIONS', compiled['GET'])
+        return compiled
@@ -0,0 +1,76 @@
+#
+# Created on Mon Nov 02 2020
+#
+# Copyright (c) 2020 - Simon Prast
+#
+
+
+import csv
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+from .jsoncodec import dumps
+
+
+class _Echo:
+    """Pseudo-buffer for csv.writer that hands every written line back."""
+
+    def write(self, value):
+        return value
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer encoding with `jsoncodec.dumps`, e.g. orjson.
+
+    Indented output, requested with 'application/json; indent=4' or by the
+    browsable API, is left to DRF's implementation.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if (accepted_media_type and 'indent' in accepted_media_type) or (renderer_context or {}).get('indent'):
+            return super().render(data, accepted_media_type, renderer_context)
+        return dumps(data)
+
+
+class NDJSONRenderer(BaseRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # Used for regular (e.g. error) responses, a single JSON line.
+        if data is None:
+            return b''
+        return self._line(data)
+
+    def stream(self, fieldnames, rows):
+        """Yield one JSON object per row, without materializing the rows."""
+        for row in rows:
+            yield self._line(dict(zip(fieldnames, row)))
+
+    @staticmethod
+    def _line(data):
+        return dumps(data) + b'\n'
+
+
+class CSVRenderer(BaseRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # Used for regular (e.g. error) responses, a header and a single row.
+        if data is None:
+            return b''
+        if not isinstance(data, dict):
+            data = {'detail': data}
+        return ''.join(self.stream(list(data), [list(data.values())])).encode(self.charset)
+
+    def stream(self, fieldnames, rows):
+        """Yield the header line followed by one CSV line per row."""
+        writer = csv.writer(_Echo())
+        yield writer.writerow(fieldnames)
+        for row in rows:
+            yield writer.writerow(['' if value is None else value for value in row])
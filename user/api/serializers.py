@@ -13,7 +13,14 @@ from user.models import User
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
-        exclude = ['password', 'is_admin']
+        exclude = ['password', 'is_admin', 'row_version']
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Only keep the given subset of fields (used by ?fields= projections)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
 
 
 class RegisterUserSerializer(serializers.ModelSerializer):
@@ -24,7 +31,14 @@ class RegisterUserSerializer(serializers.ModelSerializer):
         fields = ['id', 'username', 'email', 'password']
 
     def save(self):
-        User.objects.create_user(
+        return User.objects.create_user(
+            username=self.validated_data.get('username'),
+            email=self.validated_data.get('email'),
+            password=self.validated_data.get('password')
+        )
+
+    async def asave(self):
+        return await User.objects.acreate_user(
             username=self.validated_data.get('username'),
             email=self.validated_data.get('email'),
             password=self.validated_data.get('password')
@@ -0,0 +1,188 @@
+#
+# Created on Mon Nov 02 2020
+#
+# Copyright (c) 2020 - Simon Prast
+#
+
+
+"""
+Token-bucket throttling of the endpoints that hash passwords.
+
+Registering and logging in (users/create/, users/login/, auth/) run PBKDF2
+on the submitted password. Without a limit a flood of such requests keeps
+every core busy hashing and starves the rest of the API. `password_throttle`
+takes one token per request from three buckets and answers with 429 once
+one of them is empty:
+
+    'ip'        per client address: REMOTE_ADDR, or the address the last of
+                REST_FRAMEWORK['NUM_PROXIES'] reverse proxies reports in
+                X-Forwarded-For. Unset, DRF would trust the whole header,
+                which every client can set to get a fresh bucket.
+    'username'  per submitted username, against guessing one user's password
+                from many addresses
+    'global'    all requests, bounding the hashes per second of the process
+                (or of all processes with the 'cache' backend)
+
+Buckets are configured in THROTTLE_BUCKETS as (burst, requests per minute),
+a missing entry disables its bucket. The check runs before any database or
+hashing work: the throttle class is applied by DRF right after the (token)
+authentication, which does not query anything for anonymous requests.
+
+THROTTLE_BACKEND selects where the buckets live:
+    'local'     process memory, bounded to THROTTLE_MAX_KEYS buckets
+    'cache'     the Django cache THROTTLE_CACHE, shared between processes.
+                Updates are not atomic, so concurrent requests for the same
+                bucket may slightly exceed its rate.
+"""
+
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+
+from rest_framework import exceptions, throttling
+
+from francy.cache.namespaces import CacheNamespace
+
+
+SCOPES = ('ip', 'username', 'global')
+
+
+class LocalBucketStore:
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def take(self, key, burst, rate):
+        """Take a token from the bucket `key`, return 0 or the seconds until one is available."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            if tokens >= 1:
+                wait, tokens = 0.0, tokens - 1
+            else:
+                wait = (1 - tokens) / rate
+            # Re-inserted at the end, so the dict stays ordered by last use
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._prune()
+        return wait
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def _prune(self):
+        # Must be called with the lock held. Drop the least recently used tenth,
+        # mostly buckets which have long refilled anyway.
+        for key in list(self._buckets)[:max(1, self.max_keys // 10)]:
+            del self._buckets[key]
+
+
+class CacheBucketStore:
+    def __init__(self, cache_alias='default', name='throttle'):
+        self.namespace = CacheNamespace(name, cache_alias)
+
+    def take(self, key, burst, rate):
+        now = time.time()
+        tokens, updated = self.namespace.get(key) or (burst, now)
+        tokens = min(burst, tokens + max(0.0, now - updated) * rate)
+        if tokens >= 1:
+            wait, tokens = 0.0, tokens - 1
+        else:
+            wait = (1 - tokens) / rate
+        # Kept until the bucket would have refilled
+        self.namespace.set(key, (tokens, now), int((burst - tokens) / rate) + 1)
+        return wait
+
+    def clear(self):
+        pass
+
+
+class PasswordThrottle:
+    def __init__(self, store, buckets):
+        self.store = store
+        # Burst and tokens per second by scope
+        self.buckets = {
+            scope: (burst, per_minute / 60.0) for scope, (burst, per_minute) in buckets.items() if scope in SCOPES
+        }
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.rejected = dict.fromkeys(SCOPES, 0)
+
+    def check(self, ident, username=None):
+        """Return None if the request may proceed, else the seconds to wait."""
+        for scope, key in (('ip', ident), ('username', username), ('global', '')):
+            bucket = self.buckets.get(scope)
+            if bucket is None or key is None:
+                continue
+            wait = self.store.take((scope, _digest(key)), *bucket)
+            if wait:
+                with self._lock:
+                    self.rejected[scope] += 1
+                return wait
+        with self._lock:
+            self.allowed += 1
+        return None
+
+    def stats(self):
+        with self._lock:
+            stats = {'allowed': self.allowed}
+            stats.update(('rejected_' + scope, count) for scope, count in self.rejected.items())
+            return stats
+
+    def clear(self):
+        self.store.clear()
+        with self._lock:
+            self.allowed = 0
+            self.rejected = dict.fromkeys(SCOPES, 0)
+
+
+def _digest(value):
+    # Usernames are arbitrary text and IPv6 addresses contain colons, neither is a safe cache key
+    return hashlib.blake2b(str(value).encode(), digest_size=12).hexdigest()
+
+
+def get_bucket_store(name):
+    if name == 'local':
+        return LocalBucketStore(max_keys=getattr(settings, 'THROTTLE_MAX_KEYS', 100000))
+    if name == 'cache':
+        return CacheBucketStore(cache_alias=getattr(settings, 'THROTTLE_CACHE', 'default'))
+    raise ValueError('Unknown throttle backend: ' + str(name))
+
+
+password_throttle = PasswordThrottle(
+    get_bucket_store(getattr(settings, 'THROTTLE_BACKEND', 'local')),
+    getattr(settings, 'THROTTLE_BUCKETS', {}),
+)
+
+
+def submitted_username(request):
+    username = request.data.get('username') if hasattr(request.data, 'get') else None
+    return username if isinstance(username, str) and username else None
+
+
+class PasswordRateThrottle(throttling.BaseThrottle):
+    """DRF throttle class of `password_throttle`."""
+
+    def allow_request(self, request, view):
+        # Requests without a client address share one bucket
+        ident = self.get_ident(request) or ''
+        self.wait_seconds = password_throttle.check(ident, submitted_username(request))
+        return self.wait_seconds is None
+
+    def wait(self):
+        return self.wait_seconds
+
+
+def check_password_throttle(request):
+    """Raise Throttled if the DRF `request` exceeds `password_throttle`, for views outside of APIView."""
+    throttle = PasswordRateThrottle()
+    if not throttle.allow_request(request, None):
+        raise exceptions.Throttled(throttle.wait())
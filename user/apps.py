@@ -1,5 +1,49 @@
+import sys
+
 from django.apps import AppConfig
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models.signals import post_delete, post_migrate, post_save
+
+
+def create_admin_user_after_migrate(sender, verbosity=1, **kwargs):
+    from .models import create_admin_user
+    try:
+        create_admin_user(verbosity=verbosity)
+    except ImproperlyConfigured as exc:
+        # The migrations are applied, createadminuser can be run once the password is set
+        if verbosity:
+            print("ADMIN ACCOUNT NOT CREATED: {}".format(exc), file=sys.stderr)
+
+
+def reset_response_cache_after_migrate(sender, using='default', **kwargs):
+    from .api.cache import user_response_cache
+    # Also sent by `manage.py flush`, which frees the primary keys of all users
+    user_response_cache.new_generation(using)
+
+
+def user_saved(sender, instance, raw=False, using='default', **kwargs):
+    from .api.authentication import token_cache
+    from .api.cache import user_response_cache
+    if not raw:
+        user_response_cache.user_saved(instance, using)
+        # Cached tokens hold a copy of the user, e.g. its utype and is_admin
+        token_cache.invalidate_user(instance)
+
+
+def user_deleted(sender, instance, using='default', **kwargs):
+    from .api.authentication import token_cache
+    from .api.cache import user_response_cache
+    user_response_cache.invalidate(instance.pk, using)
+    token_cache.invalidate_user(instance)
 
 
 class UserConfig(AppConfig):
     name = 'user'
+
+    def ready(self):
+        # Create the admin account once per deploy instead of on every URLconf import
+        post_migrate.connect(create_admin_user_after_migrate, sender=self)
+        post_migrate.connect(reset_response_cache_after_migrate, sender=self)
+        # Updates, admin changes and password changes all pass through User.save()
+        post_save.connect(user_saved, sender='user.User')
+        post_delete.connect(user_deleted, sender='user.User')
@@ -0,0 +1,87 @@
+#
+# Created on Mon Nov 02 2020
+#
+# Copyright (c) 2020 - Simon Prast
+#
+
+
+import csv
+import json
+
+
+# Content types of the supported import formats
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+    'json': 'application/json',
+}
+
+
+def format_for_content_type(content_type):
+    media_type = (content_type or '').split(';')[0].strip().lower()
+    for name, format_media_type in FORMATS.items():
+        if media_type == format_media_type:
+            return name
+    return None
+
+
+class InvalidRow:
+    """Stands in for a row read_rows() could not read, import_users() reports it as failed."""
+
+    def __init__(self, message):
+        self.message = message
+
+    def __str__(self):
+        return self.message
+
+
+class _DecodedLines:
+    # Decodes byte lines one by one. Unlike a generator, it goes on with the
+    # next line after one raised UnicodeDecodeError, so csv readers can too.
+    def __init__(self, lines):
+        self.lines = iter(lines)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        line = next(self.lines)
+        return line.decode('utf-8') if isinstance(line, bytes) else line
+
+
+def read_rows(lines, format='ndjson'):
+    """Yield user dicts from an iterable of text or UTF-8 encoded byte lines.
+
+    'csv' expects a header line, 'ndjson' one JSON value per line; both are
+    read lazily, and a line that cannot be read yields an `InvalidRow`.
+    'json' expects a single array and is read in one go.
+    """
+    if format == 'csv':
+        reader = csv.DictReader(_DecodedLines(lines))
+        while True:
+            try:
+                row = next(reader)
+            except StopIteration:
+                return
+            except (csv.Error, UnicodeDecodeError) as exc:
+                row = InvalidRow('Line {}: {}'.format(reader.line_num, exc))
+            yield row
+    elif format == 'ndjson':
+        for number, line in enumerate(lines, start=1):
+            try:
+                if isinstance(line, bytes):
+                    line = line.decode('utf-8')
+                if not line.strip():
+                    continue
+                row = json.loads(line)
+            except ValueError as exc:
+                # Invalid UTF-8 or JSON
+                row = InvalidRow('Line {}: {}'.format(number, exc))
+            yield row
+    elif format == 'json':
+        rows = json.loads(''.join(_DecodedLines(lines)))
+        if not isinstance(rows, list):
+            raise ValueError('Expected a JSON array of users.')
+        yield from rows
+    else:
+        raise ValueError('Unsupported import format: ' + str(format))
@@ -0,0 +1,248 @@
+#
+# Created on Mon Nov 02 2020
+#
+# Copyright (c) 2020 - Simon Prast
+#
+
+
+"""
+Password hashing executor.
+
+PBKDF2 costs tens of milliseconds of pure CPU per call. Running it on the
+request worker lets a burst of logins starve every other endpoint, so all
+password hashing of the `User` model goes through `hashing_executor`, which
+runs it on a bounded pool and caps the number of hashes in flight. Async
+callers wait for a free slot on threads of the executor's own, never on the
+event loop or its default executor.
+
+The backend is selected through the PASSWORD_HASHING_* settings:
+    'process'   a process pool sized to the CPU cores (default)
+    'thread'    a thread pool (hashlib releases the GIL while hashing)
+    'inline'    hash in the calling thread, e.g. for tests and benchmarks
+"""
+
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import hashers
+
+from rest_framework import exceptions, status
+
+
+# Set to a one-element list to have the seconds spent hashing in the current
+# context (e.g. a request, see francy.metrics) added to it.
+hashing_time = contextvars.ContextVar('hashing_time', default=None)
+
+
+class HashingBusy(exceptions.APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Too many concurrent password operations, please retry later.'
+    default_code = 'hashing_busy'
+
+
+def _init_worker(settings_module):
+    # Spawned (not forked) workers have to find the settings on their own
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+
+
+def _make_password(raw_password):
+    return hashers.make_password(raw_password)
+
+
+def _check_password(raw_password, encoded):
+    # The setter cannot cross the process boundary, so only report
+    # whether the stored hash has to be upgraded.
+    must_update = []
+    valid = hashers.check_password(raw_password, encoded, setter=must_update.append)
+    return valid, bool(must_update)
+
+
+class HashingExecutor:
+    def __init__(self, backend='process', max_workers=None, max_pending=None, timeout=None):
+        if backend not in ('process', 'thread', 'inline'):
+            raise ValueError('Unknown password hashing backend: ' + str(backend))
+        self.backend = backend
+        self.max_workers = max_workers or os.cpu_count() or 1
+        # Hashes in flight (queued + running) before callers have to wait
+        self.max_pending = max_pending or self.max_workers * 4
+        self.timeout = timeout
+
+        self._pool = None
+        self._pool_pid = None
+        self._waiters = None
+        self._waiters_pid = None
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._lock = threading.Lock()
+
+        self.pending = 0
+        self.peak_pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.seconds = 0.0
+
+    def make_password(self, raw_password):
+        if raw_password is None:
+            # Unusable passwords are not hashed
+            return hashers.make_password(None)
+        return self._run(_make_password, raw_password)
+
+    def check_password(self, raw_password, encoded):
+        """Return a (valid, must_update) tuple."""
+        if raw_password is None or not hashers.is_password_usable(encoded):
+            return False, False
+        return self._run(_check_password, raw_password, encoded)
+
+    def make_passwords(self, raw_passwords):
+        """Hash many passwords in parallel, keeping at most max_pending in flight."""
+        if self.backend == 'inline':
+            return [self.make_password(raw_password) for raw_password in raw_passwords]
+
+        futures = []
+        for raw_password in raw_passwords:
+            if raw_password is None:
+                futures.append(None)
+                continue
+            self._acquire()
+            started = time.perf_counter()
+            try:
+                future = self._get_pool().submit(_make_password, raw_password)
+            except BaseException:
+                self._release(0.0)
+                raise
+            # Done callbacks run on a pool thread, so hand over the caller's accumulator
+            future.add_done_callback(lambda _, started=started, accumulator=hashing_time.get(): self._release(
+                time.perf_counter() - started, accumulator))
+            futures.append(future)
+        return [hashers.make_password(None) if future is None else future.result() for future in futures]
+
+    async def amake_password(self, raw_password):
+        if raw_password is None:
+            return hashers.make_password(None)
+        return await self._arun(_make_password, raw_password)
+
+    async def acheck_password(self, raw_password, encoded):
+        if raw_password is None or not hashers.is_password_usable(encoded):
+            return False, False
+        return await self._arun(_check_password, raw_password, encoded)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'backend': self.backend,
+                'workers': self.max_workers,
+                'max_pending': self.max_pending,
+                'pending': self.pending,
+                'peak_pending': self.peak_pending,
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'seconds': self.seconds,
+            }
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            pools = [self._pool, self._waiters]
+            self._pool = self._waiters = None
+        for pool in pools:
+            if pool is not None:
+                pool.shutdown(wait=wait)
+
+    def _run(self, fn, *args):
+        self._acquire()
+        try:
+            started = time.perf_counter()
+            if self.backend == 'inline':
+                return fn(*args)
+            return self._get_pool().submit(fn, *args).result()
+        finally:
+            self._release(time.perf_counter() - started, hashing_time.get())
+
+    async def _arun(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            # Wait for a free slot without blocking the event loop, on threads of our own:
+            # on the loop's default executor the waits would hold up sync_to_async() calls.
+            # Queued behind other waits, the timeout still counts from now.
+            deadline = None if self.timeout is None else time.monotonic() + self.timeout
+            acquiring = asyncio.get_running_loop().run_in_executor(self._get_waiters(), self._acquire, deadline)
+            try:
+                # Shielded, so a cancelled caller leaves the acquiring future intact
+                await asyncio.shield(acquiring)
+            except asyncio.CancelledError:
+                # The waiting thread may still get the slot, give it back then
+                acquiring.add_done_callback(self._abandon)
+                raise
+        else:
+            self._track_acquired()
+        try:
+            started = time.perf_counter()
+            if self.backend == 'inline':
+                return fn(*args)
+            return await asyncio.wrap_future(self._get_pool().submit(fn, *args))
+        finally:
+            self._release(time.perf_counter() - started, hashing_time.get())
+
+    def _acquire(self, deadline=None):
+        timeout = self.timeout if deadline is None else max(deadline - time.monotonic(), 0)
+        if not self._slots.acquire(timeout=timeout):
+            with self._lock:
+                self.rejected += 1
+            raise HashingBusy
+        self._track_acquired()
+
+    def _track_acquired(self):
+        with self._lock:
+            self.pending += 1
+            self.peak_pending = max(self.peak_pending, self.pending)
+
+    def _release(self, seconds, accumulator=None):
+        with self._lock:
+            if accumulator is not None:
+                accumulator[0] += seconds
+            self.pending -= 1
+            self.completed += 1
+            self.seconds += seconds
+        self._slots.release()
+
+    def _abandon(self, acquiring):
+        # Return a slot acquired for a caller that stopped waiting for it
+        if not acquiring.cancelled() and acquiring.exception() is None:
+            with self._lock:
+                self.pending -= 1
+            self._slots.release()
+
+    def _get_pool(self):
+        with self._lock:
+            # A pool inherited through fork() (e.g. a preloading server) belongs
+            # to the parent process and cannot be used, so create our own.
+            if self._pool is None or self._pool_pid != os.getpid():
+                if self.backend == 'process':
+                    self._pool = ProcessPoolExecutor(
+                        max_workers=self.max_workers,
+                        initializer=_init_worker,
+                        initargs=(os.environ.get('DJANGO_SETTINGS_MODULE', 'francy.settings'),),
+                    )
+                else:
+                    self._pool = ThreadPoolExecutor(
+                        max_workers=self.max_workers, thread_name_prefix='password-hashing')
+                self._pool_pid = os.getpid()
+            return self._pool
+
+    def _get_waiters(self):
+        with self._lock:
+            if self._waiters is None or self._waiters_pid != os.getpid():
+                self._waiters = ThreadPoolExecutor(
+                    max_workers=self.max_pending, thread_name_prefix='password-hashing-wait')
+                self._waiters_pid = os.getpid()
+            return self._waiters
+
+
+hashing_executor = HashingExecutor(
+    backend=getattr(settings, 'PASSWORD_HASHING_BACKEND', 'process'),
+    max_workers=getattr(settings, 'PASSWORD_HASHING_WORKERS', None),
+    max_pending=getattr(settings, 'PASSWORD_HASHING_MAX_PENDING', None),
+    timeout=getattr(settings, 'PASSWORD_HASHING_TIMEOUT', None),
+)
@@ -0,0 +1,46 @@
+#
+# Created on Mon Nov 02 2020
+#
+# Copyright (c) 2020 - Simon Prast
+#
+
+
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from francy.cache.namespaces import reset_shared_stats, shared_stats
+
+
+class Command(BaseCommand):
+    help = ('Prints the hit ratio of every cache namespace, summed over all processes. '
+            'Counts of running processes are added every CACHE_STATS_FLUSH_INTERVAL seconds.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--json', action='store_true', help='Print the statistics as JSON.')
+        parser.add_argument('--reset', action='store_true', help='Reset the counters after printing them.')
+
+    def handle(self, *args, **options):
+        stats = {}
+        for name, counters in shared_stats().items():
+            lookups = counters['hits'] + counters['misses']
+            stats[name] = dict(
+                counters,
+                lookups=lookups,
+                hit_ratio=round(counters['hits'] / lookups, 4) if lookups else None,
+                version=getattr(settings, 'CACHE_NAMESPACE_VERSIONS', {}).get(name, 1),
+            )
+
+        if options['json']:
+            self.stdout.write(json.dumps(stats, indent=2))
+        elif not stats:
+            self.stdout.write('No cache lookups counted yet.')
+        else:
+            self.stdout.write('{:<24} {:>12} {:>12} {:>10}'.format('namespace', 'hits', 'misses', 'hit ratio'))
+            for name, row in sorted(stats.items()):
+                ratio = '{:.1%}'.format(row['hit_ratio']) if row['hit_ratio'] is not None else '-'
+                self.stdout.write('{:<24} {:>12} {:>12} {:>10}'.format(name, row['hits'], row['misses'], ratio))
+
+        if options['reset']:
+            reset_shared_stats()
@@ -0,0 +1,25 @@
+#
+# Created on Mon Nov 02 2020
+#
+# Copyright (c) 2020 - Simon Prast
+#
+
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+
+from user.models import create_admin_user
+
+
+class Command(BaseCommand):
+    help = 'Creates the ADMIN_USER account with ADMIN_PASSWORD unless it exists.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset-password', action='store_true',
+                            help='Set the password of an existing account to ADMIN_PASSWORD.')
+
+    def handle(self, *args, **options):
+        try:
+            create_admin_user(verbosity=options['verbosity'], reset_password=options['reset_password'])
+        except ImproperlyConfigured as exc:
+            raise CommandError(exc)
@@ -0,0 +1,48 @@
+#
+# Created on Mon Nov 02 2020
+#
+# Copyright (c) 2020 - Simon Prast
+#
+
+
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from user.bulk import FORMATS, read_rows
+from user.models import User
+
+
+class Command(BaseCommand):
+    help = 'Imports users from a CSV, NDJSON or JSON file (or stdin) and prints one result per row as NDJSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to import, "-" reads from stdin.')
+        parser.add_argument('--format', choices=list(FORMATS), help='Defaults to the file extension, else ndjson.')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--tokens', action='store_true', help='Create an API token for every new user.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        format = options['format'] or next(
+            (name for name in FORMATS if path.endswith('.' + name)), 'ndjson')
+
+        stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        created = failed = 0
+        try:
+            rows = read_rows(stream, format)
+            for result in User.objects.import_users(
+                    rows, batch_size=options['batch_size'], create_tokens=options['tokens']):
+                if result['status'] == 'created':
+                    created += 1
+                else:
+                    failed += 1
+                self.stdout.write(json.dumps(result))
+        except ValueError as exc:
+            raise CommandError(exc)
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        self.stderr.write('{} users created, {} rows failed.'.format(created, failed))
@@ -0,0 +1,29 @@
+#
+# Created on Mon Nov 02 2020
+#
+# Copyright (c) 2020 - Simon Prast
+#
+
+
+from django.core.management.base import BaseCommand
+
+from user.models import AuthToken
+
+
+class Command(BaseCommand):
+    help = ('Deletes expired API tokens in batches, each in its own short transaction. '
+            'Meant to run periodically, e.g. from cron.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--pause', type=float, default=0.05,
+                            help='Seconds to sleep between two batches, letting other writers in.')
+
+    def handle(self, *args, **options):
+        deleted = 0
+        for count in AuthToken.objects.purge_expired(batch_size=options['batch_size'], pause=options['pause']):
+            deleted += count
+            if options['verbosity'] > 1:
+                self.stdout.write('Deleted {} tokens'.format(deleted))
+        if options['verbosity']:
+            self.stdout.write('Deleted {} expired tokens.'.format(deleted))
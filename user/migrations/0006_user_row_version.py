@@ -0,0 +1,18 @@
+# Generated by Django 3.1.2 on 2020-11-02 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0005_auto_20201014_1431'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='row_version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+    ]
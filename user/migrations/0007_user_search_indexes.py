@@ -0,0 +1,44 @@
+# Generated by Django 3.1.2 on 2020-11-02 12:00
+
+from django.db import migrations, models
+
+
+# Indexes for the case-insensitive prefix searches (istartswith) of the admin.
+# Django 3.1 has no expression indexes, so they are created per database vendor,
+# matching the SQL of the lookup: UPPER("col"::text) LIKE on PostgreSQL, and
+# "col" LIKE on SQLite, which is case-insensitive and needs a NOCASE index.
+SEARCH_INDEXES = {
+    'postgresql': [
+        ('user_user_username_upper_like', 'UPPER("username"::text) text_pattern_ops'),
+        ('user_user_email_upper_like', 'UPPER("email"::text) text_pattern_ops'),
+    ],
+    'sqlite': [
+        ('user_user_username_nocase', '"username" COLLATE NOCASE'),
+        ('user_user_email_nocase', '"email" COLLATE NOCASE'),
+    ],
+}
+
+
+def create_search_indexes(apps, schema_editor):
+    for name, expression in SEARCH_INDEXES.get(schema_editor.connection.vendor, []):
+        schema_editor.execute('CREATE INDEX "{}" ON "user_user" ({})'.format(name, expression))
+
+
+def drop_search_indexes(apps, schema_editor):
+    for name, expression in SEARCH_INDEXES.get(schema_editor.connection.vendor, []):
+        schema_editor.execute('DROP INDEX IF EXISTS "{}"'.format(name))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0006_user_row_version'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['username', 'email'], name='user_username_email_idx'),
+        ),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
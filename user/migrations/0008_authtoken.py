@@ -0,0 +1,47 @@
+# Generated by Django 3.1.2 on 2020-11-02 12:00
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import user.models
+
+
+def copy_drf_tokens(apps, schema_editor):
+    # Keep the tokens of rest_framework.authtoken, which is no longer installed.
+    # They start a fresh expiry period.
+    connection = schema_editor.connection
+    if 'authtoken_token' not in connection.introspection.table_names():
+        return
+    AuthToken = apps.get_model('user', 'AuthToken')
+    now = django.utils.timezone.now()
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT key, user_id, created FROM authtoken_token')
+        rows = cursor.fetchall()
+    AuthToken.objects.bulk_create([
+        AuthToken(key=key, user_id=user_id, created=created, last_used=now, expires=user.models.token_expiry())
+        for key, user_id, created in rows
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0007_user_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthToken',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(default=user.models.generate_token_key, max_length=40, unique=True)),
+                ('created', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_used', models.DateTimeField(default=django.utils.timezone.now)),
+                ('expires', models.DateTimeField(db_index=True, default=user.models.token_expiry)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='auth_token',
+                                              to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.RunPython(copy_drf_tokens, migrations.RunPython.noop),
+    ]
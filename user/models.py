@@ -4,13 +4,38 @@
 # Copyright (c) 2020 - Simon Prast
 #
 
+import binascii
+import os
+import time
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
 from django.conf import settings
 from django.contrib.auth.models import BaseUserManager, AbstractBaseUser
-from django.db import models
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.db import IntegrityError, models, router, transaction
+from django.utils import timezone
+
+from .bulk import InvalidRow
+from .hashing import hashing_executor
+from .permissions import ADMIN_SITE, has_action
 
 
 class UserManager(BaseUserManager):
     def create_user(self, username, password, **kwargs):
+        user = self._build_user(username, **kwargs)
+        user.set_password(password)
+        user.save(using=self._db)
+        return user
+
+    async def acreate_user(self, username, password, **kwargs):
+        # create_user() for async views, the password hash is awaited off the event loop
+        user = self._build_user(username, **kwargs)
+        await user.aset_password(password)
+        await sync_to_async(user.save)(using=self._db)
+        return user
+
+    def _build_user(self, username, **kwargs):
         email_raw = kwargs.get("email", None)
         email = self.normalize_email(
             email_raw) if email_raw is not None else None
@@ -20,16 +45,12 @@ class UserManager(BaseUserManager):
         if not username:
             raise ValueError("Users must have an username")
 
-        user = self.model(
+        return self.model(
             username=username,
             email=email,
             utype=utype,
         )
 
-        user.set_password(password)
-        user.save(using=self._db)
-        return user
-
     def create_superuser(self, username, password=None):
         user = self.create_user(
             username=username,
@@ -40,6 +61,133 @@ class UserManager(BaseUserManager):
         user.save(using=self._db)
         return user
 
+    def import_users(self, rows, batch_size=500, create_tokens=False):
+        """Create users from an iterable of dicts with username, password and
+        optionally email and utype, `batch_size` rows at a time.
+
+        Yields one result dict per row, in input order. Every batch costs one
+        query to check uniqueness, one INSERT, and with `create_tokens` one
+        query for the new ids plus one INSERT of tokens; the passwords of a
+        batch are hashed in parallel on the hashing executor.
+        """
+        batch = []
+        for index, row in enumerate(rows):
+            batch.append((index, row))
+            if len(batch) >= batch_size:
+                yield from self._import_batch(batch, create_tokens)
+                batch = []
+        if batch:
+            yield from self._import_batch(batch, create_tokens)
+
+    def _import_batch(self, batch, create_tokens):
+        results = {}
+        candidates = []
+        seen_usernames, seen_emails = set(), set()
+        for index, row in batch:
+            if not isinstance(row, dict):
+                # e.g. a JSON array or string instead of an object, or a line read_rows() could not read
+                message = str(row) if isinstance(row, InvalidRow) else "Expected an object of user fields."
+                results[index] = {"row": index, "username": None, "status": "error",
+                                  "errors": {"non_field_errors": [message]}}
+                continue
+            errors = {}
+            try:
+                utype = row.get("utype", 1)
+                if utype == "":
+                    # An empty CSV cell
+                    utype = 1
+                if isinstance(utype, bool) or not isinstance(utype, (int, str)):
+                    raise ValidationError({"utype": ["A valid integer is required."]})
+                user = self._build_user(row.get("username"), email=row.get("email") or None, utype=utype)
+                # Field validation only, uniqueness is checked for the whole batch below.
+                # The email is optional, like in create_user(). Cleaning converts a CSV utype to int.
+                user.clean_fields(exclude=["password", "last_login"] + (["email"] if user.email is None else []))
+            except ValueError as exc:
+                errors["username"] = [str(exc)]
+            except ValidationError as exc:
+                errors = exc.message_dict
+            if not errors:
+                if user.username in seen_usernames:
+                    errors["username"] = ["duplicate username in import"]
+                if user.email and user.email in seen_emails:
+                    errors["email"] = ["duplicate email in import"]
+            if errors:
+                results[index] = {"row": index, "username": row.get("username"), "status": "error", "errors": errors}
+                continue
+            seen_usernames.add(user.username)
+            if user.email:
+                seen_emails.add(user.email)
+            candidates.append((index, user, row.get("password") or None))
+
+        taken_usernames, taken_emails = self._taken(seen_usernames, seen_emails)
+        new_users = []
+        for index, user, password in candidates:
+            errors = self._uniqueness_errors(user, taken_usernames, taken_emails)
+            if errors:
+                results[index] = {"row": index, "username": user.username, "status": "error", "errors": errors}
+            else:
+                new_users.append((index, user, password))
+
+        for (index, user, _), encoded in zip(new_users, hashing_executor.make_passwords(
+                [password for _, _, password in new_users])):
+            user.password = encoded
+
+        try:
+            with transaction.atomic(using=self._db):
+                self.bulk_create([user for _, user, _ in new_users], batch_size=len(new_users) or None)
+        except IntegrityError:
+            # A concurrent import or signup took a username or email since the check above,
+            # insert the users one by one to fail only their rows
+            new_users = self._create_one_by_one(new_users, results)
+
+        with transaction.atomic(using=self._db):
+            # bulk_create() doesn't set primary keys on every backend, so look them up once
+            ids = dict(self.filter(username__in=[user.username for _, user, _ in new_users])
+                       .values_list("username", "id"))
+            tokens = {}
+            if create_tokens and ids:
+                tokens = {token.user_id: token.key for token in AuthToken.objects.bulk_create(
+                    [AuthToken(user_id=user_id) for user_id in ids.values()])}
+
+        for index, user, _ in new_users:
+            user_id = ids[user.username]
+            results[index] = {"row": index, "username": user.username, "status": "created", "id": user_id}
+            if create_tokens:
+                results[index]["token"] = tokens[user_id]
+
+        for index, _ in batch:
+            yield results[index]
+
+    def _taken(self, usernames, emails):
+        """Return the sets of the given usernames and emails that exist, in one query."""
+        taken = self.filter(models.Q(username__in=usernames) | models.Q(email__in=emails)).values_list(
+            "username", "email")
+        return {username for username, _ in taken}, {email for _, email in taken if email}
+
+    @staticmethod
+    def _uniqueness_errors(user, taken_usernames, taken_emails):
+        errors = {}
+        if user.username in taken_usernames:
+            errors["username"] = ["user with this username already exists."]
+        if user.email and user.email in taken_emails:
+            errors["email"] = ["user with this Email Address already exists."]
+        return errors
+
+    def _create_one_by_one(self, new_users, results):
+        created = []
+        for index, user, password in new_users:
+            try:
+                with transaction.atomic(using=self._db):
+                    self.bulk_create([user])
+            except IntegrityError:
+                taken = self._taken([user.username], [user.email] if user.email else [])
+                errors = self._uniqueness_errors(user, *taken)
+                results[index] = {"row": index, "username": user.username, "status": "error",
+                                  "errors": errors or {"non_field_errors": ["The user could not be created."]}}
+            else:
+                created.append((index, user, password))
+        return created
+
 
 class User(AbstractBaseUser):
     username = models.CharField(max_length=40, unique=True)
@@ -47,6 +195,8 @@ class User(AbstractBaseUser):
         verbose_name="Email Address", null=True, max_length=320, unique=True)
     utype = models.IntegerField(verbose_name="User Type", default=0)
     is_admin = models.BooleanField(default=False)
+    # Incremented on every save, a cheap validator for conditional requests
+    row_version = models.PositiveIntegerField(default=1, editable=False)
 
     objects = UserManager()
 
@@ -55,21 +205,67 @@ class User(AbstractBaseUser):
 
     REQUIRED_FIELDS = []
 
+    class Meta:
+        # Matches the ordering of the admin changelist
+        indexes = [models.Index(fields=["username", "email"], name="user_username_email_idx")]
+
     def __str__(self):
         return self.username
 
     def save(self, *args, **kwargs):
-        super(User, self).save(*args, **kwargs)
+        if self._state.adding:
+            return super(User, self).save(*args, **kwargs)
+        # Incremented by the UPDATE itself, which locks the row until the commit,
+        # so concurrent saves never store (and cache) the same version twice
+        self.row_version = models.F("row_version") + 1
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            kwargs["update_fields"] = set(update_fields) | {"row_version"}
+        using = kwargs.get("using") or router.db_for_write(User, instance=self)
+        # Without a transaction, the on_commit() handlers of post_save (see user/apps.py)
+        # would run before row_version is readable again
+        with transaction.atomic(using=using, savepoint=False):
+            try:
+                super(User, self).save(*args, **kwargs)
+            finally:
+                # Deferred: read back from the database on first access only
+                del self.row_version
 
     def has_perm(self, perm, obj=None):
         "Does the user have a specific permission?"
-        # Simplest possible answer: Yes, always
-        return True
+        # Django's model permissions are not used, the admin site is all or nothing.
+        return has_action(self, ADMIN_SITE)
 
     def has_module_perms(self, app_label):
         "Does the user have permissions to view the app `app_label`?"
-        # Simplest possible answer: Yes, always
-        return True
+        return has_action(self, ADMIN_SITE)
+
+    def set_password(self, raw_password):
+        # Hash on the hashing executor instead of the request worker
+        self.password = hashing_executor.make_password(raw_password)
+        self._password = raw_password
+
+    def check_password(self, raw_password):
+        valid, must_update = hashing_executor.check_password(raw_password, self.password)
+        if valid and must_update:
+            # Rehash with the preferred hasher, see AbstractBaseUser.check_password().
+            # Password hash upgrades shouldn't be considered password changes.
+            self.set_password(raw_password)
+            self._password = None
+            self.save(update_fields=["password"])
+        return valid
+
+    async def aset_password(self, raw_password):
+        self.password = await hashing_executor.amake_password(raw_password)
+        self._password = raw_password
+
+    async def acheck_password(self, raw_password):
+        valid, must_update = await hashing_executor.acheck_password(raw_password, self.password)
+        if valid and must_update:
+            await self.aset_password(raw_password)
+            self._password = None
+            await sync_to_async(self.save)(update_fields=["password"])
+        return valid
 
     @property
     def is_active(self):
@@ -85,10 +281,94 @@ class User(AbstractBaseUser):
     #     super(User, self).save(*args, **kwargs)
 
 
-def create_admin_user():
-    if User.objects.filter(username=settings.ADMIN_USER).exists():
-        User.objects.get(username=settings.ADMIN_USER).set_password(settings.ADMIN_PASSWORD)
-        print("EXISTING ADMIN ACCOUNT (SET ADMIN PASSWORD): " + settings.ADMIN_USER)
-    else:
+def token_ttl():
+    return timedelta(seconds=getattr(settings, "TOKEN_TTL", 14 * 24 * 60 * 60))
+
+
+def generate_token_key():
+    return binascii.hexlify(os.urandom(20)).decode()
+
+
+def token_expiry():
+    return timezone.now() + token_ttl()
+
+
+class AuthTokenManager(models.Manager):
+    def rotate(self, user):
+        """Give the token of `user` a new key and a fresh expiry, creating it if needed.
+
+        The row is updated in place instead of being deleted and inserted again.
+        """
+        now = timezone.now()
+        token, created = self.update_or_create(user=user, defaults={
+            "key": generate_token_key(), "created": now, "last_used": now, "expires": now + token_ttl(),
+        })
+        return token
+
+    def purge_expired(self, batch_size=1000, pause=0.0):
+        """Delete expired tokens in batches of `batch_size`, yielding the number deleted per batch.
+
+        Every batch is deleted in its own short transaction, sleeping `pause`
+        seconds in between, so concurrent logins never wait for the whole purge.
+        """
+        now = timezone.now()
+        while True:
+            ids = list(self.filter(expires__lte=now).values_list("pk", flat=True)[:batch_size])
+            if not ids:
+                return
+            with transaction.atomic(using=self._db):
+                # Delete through the ORM, so post_delete receivers (design.apps) run
+                deleted, _ = self.filter(pk__in=ids, expires__lte=now).delete()
+            yield deleted
+            if pause:
+                time.sleep(pause)
+
+
+class AuthToken(models.Model):
+    """The API token of a user, replacing rest_framework.authtoken.
+
+    A token expires TOKEN_TTL seconds after its last use (sliding expiry).
+    `last_used` and `expires` are written at most once per
+    TOKEN_TOUCH_INTERVAL, see user.api.authentication.touch_token().
+    """
+    key = models.CharField(max_length=40, unique=True, default=generate_token_key)
+    user = models.OneToOneField(User, related_name="auth_token", on_delete=models.CASCADE)
+    created = models.DateTimeField(default=timezone.now)
+    last_used = models.DateTimeField(default=timezone.now)
+    # Indexed for the purge of expired tokens
+    expires = models.DateTimeField(default=token_expiry, db_index=True)
+
+    objects = AuthTokenManager()
+
+    def __str__(self):
+        return self.key
+
+    def is_expired(self, now=None):
+        return self.expires <= (now or timezone.now())
+
+
+def create_admin_user(verbosity=1, reset_password=False):
+    """Create the ADMIN_USER account with ADMIN_PASSWORD unless it exists.
+
+    Runs once per deploy after `migrate` (see UserConfig) and can be run
+    manually with `manage.py createadminuser`. The password of an existing
+    account is only set with `reset_password` (createadminuser --reset-password).
+    Raises ImproperlyConfigured instead of using the default password 'admin'
+    while DEBUG is off.
+    """
+    user = User.objects.filter(username=settings.ADMIN_USER).first()
+    if user is not None and not reset_password:
+        return
+    if settings.ADMIN_PASSWORD == "admin" and not settings.DEBUG:
+        raise ImproperlyConfigured(
+            "Set ADMIN_PASSWORD (FRANCY_ADMIN_PASSWORD) to create the admin account, "
+            "the default password is only used with DEBUG on.")
+    if user is None:
         User.objects.create_superuser(settings.ADMIN_USER, settings.ADMIN_PASSWORD)
-        print("CREATE NEW ADMIN ACCOUNT: " + settings.ADMIN_USER)
+        if verbosity:
+            print("CREATE NEW ADMIN ACCOUNT: " + settings.ADMIN_USER)
+    else:
+        user.set_password(settings.ADMIN_PASSWORD)
+        user.save()
+        if verbosity:
+            print("EXISTING ADMIN ACCOUNT (SET ADMIN PASSWORD): " + settings.ADMIN_USER)
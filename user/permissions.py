@@ -0,0 +1,120 @@
+#
+# Created on Mon Nov 02 2020
+#
+# Copyright (c) 2020 - Simon Prast
+#
+
+
+"""
+Permission matrix keyed by `User.utype`.
+
+PERMISSIONS lists the actions every user type may perform; it can be
+replaced through the USER_PERMISSIONS setting. The table is compiled once,
+at import, into one bitmask per user type, so checking an action costs a
+dict lookup and a bitwise and. Administrators (`is_admin`) always get the
+permissions of ADMIN_UTYPE, anonymous users those of the `None` entry and
+unknown user types those of DEFAULT_UTYPE.
+
+The ADMIN_ONLY actions are granted to administrators only, whatever the
+table says for their user type: like the former is_staff checks, a utype
+of 9 alone grants nothing beyond a regular user's actions.
+
+Actions ending in '_own' only apply to the user's own objects, e.g. the
+user itself or the documents it owns.
+"""
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+
+ADMIN_SITE = 'admin.site'
+USER_LIST = 'user.list'
+USER_VIEW = 'user.view'
+USER_VIEW_OWN = 'user.view_own'
+USER_CHANGE = 'user.change'
+USER_CHANGE_OWN = 'user.change_own'
+USER_CHANGE_UTYPE = 'user.change_utype'
+USER_EXPORT = 'user.export'
+USER_IMPORT = 'user.import'
+DOCUMENT_READ = 'document.read'
+DOCUMENT_READ_OWN = 'document.read_own'
+DOCUMENT_WRITE = 'document.write'
+DOCUMENT_WRITE_OWN = 'document.write_own'
+
+ACTIONS = (
+    ADMIN_SITE,
+    USER_LIST, USER_VIEW, USER_VIEW_OWN, USER_CHANGE, USER_CHANGE_OWN, USER_CHANGE_UTYPE, USER_EXPORT, USER_IMPORT,
+    DOCUMENT_READ, DOCUMENT_READ_OWN, DOCUMENT_WRITE, DOCUMENT_WRITE_OWN,
+)
+
+# Actions on the site or on other users' objects, which require `is_admin`
+ADMIN_ONLY = (
+    ADMIN_SITE,
+    USER_LIST, USER_VIEW, USER_CHANGE, USER_CHANGE_UTYPE, USER_EXPORT, USER_IMPORT,
+    DOCUMENT_READ, DOCUMENT_WRITE,
+)
+
+ADMIN_UTYPE = 9
+DEFAULT_UTYPE = 0
+
+_REGULAR = (USER_VIEW_OWN, USER_CHANGE_OWN, DOCUMENT_READ_OWN, DOCUMENT_WRITE_OWN)
+
+PERMISSIONS = {
+    # Anonymous users
+    None: (),
+    # Regular users, 0 is the model default and 1 the default of create_user()
+    0: _REGULAR,
+    1: _REGULAR,
+    # Administrators, see UserManager.create_superuser()
+    ADMIN_UTYPE: ACTIONS,
+}
+
+# Bit of every action
+BITS = {action: 1 << index for index, action in enumerate(ACTIONS)}
+
+
+def bits(*actions):
+    """Return the mask of `actions`."""
+    mask = 0
+    for action in actions:
+        try:
+            mask |= BITS[action]
+        except KeyError:
+            raise ImproperlyConfigured('Unknown permission action: {!r}'.format(action))
+    return mask
+
+
+def compile_permissions(table):
+    """Return the masks of a permission table by user type."""
+    masks = {utype: bits(*actions) for utype, actions in table.items()}
+    if DEFAULT_UTYPE not in masks or ADMIN_UTYPE not in masks:
+        raise ImproperlyConfigured(
+            'The permission table needs entries for the utypes {} and {}.'.format(DEFAULT_UTYPE, ADMIN_UTYPE))
+    return masks
+
+
+_masks = compile_permissions(getattr(settings, 'USER_PERMISSIONS', PERMISSIONS))
+_admin_mask = _masks[ADMIN_UTYPE]
+# Users without is_admin never get the ADMIN_ONLY actions, including those of utype ADMIN_UTYPE
+_not_admin_only = ~bits(*ADMIN_ONLY)
+_masks = {utype: mask & _not_admin_only for utype, mask in _masks.items()}
+_anonymous_mask = _masks.get(None, 0)
+_default_mask = _masks[DEFAULT_UTYPE]
+
+
+def permission_mask(user):
+    if user.is_anonymous:
+        return _anonymous_mask
+    if user.is_admin:
+        return _admin_mask
+    return _masks.get(user.utype, _default_mask)
+
+
+def has_action(user, action):
+    return bool(permission_mask(user) & BITS[action])
+
+
+def has_action_on(user, action, own_action, owner_id):
+    """Whether `user` may perform `action`, or `own_action` on an object of the user `owner_id`."""
+    mask = permission_mask(user)
+    return bool(mask & BITS[action] or (mask & BITS[own_action] and owner_id == user.pk))
@@ -0,0 +1,60 @@
+#
+# Created on Mon Nov 02 2020
+#
+# Copyright (c) 2020 - Simon Prast
+#
+
+
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import TestCase, override_settings
+
+from francy.paginator import EstimatedCountPaginator, estimate_count
+from user.models import User
+
+
+class EstimatedCountPaginatorTests(TestCase):
+    def setUp(self):
+        User.objects.bulk_create([User(username='user{}'.format(i)) for i in range(10)])
+
+    def count(self, queryset):
+        return EstimatedCountPaginator(queryset, 5).count
+
+    @skipUnless(connection.vendor == 'sqlite', 'Estimated from the rowid on SQLite')
+    def test_estimate(self):
+        # The largest rowid on SQLite without ANALYZE, an upper bound
+        User.objects.filter(username='user0').delete()
+        self.assertEqual(estimate_count(User), User.objects.order_by('-pk').values_list('pk', flat=True)[0])
+
+    @skipUnless(connection.vendor == 'sqlite', 'Estimated from the rowid on SQLite')
+    @override_settings(ADMIN_COUNT_ESTIMATE_THRESHOLD=5)
+    def test_large_tables_are_estimated(self):
+        estimate = estimate_count(User)
+        with self.assertNumQueries(2) as queries:
+            self.assertEqual(self.count(User.objects.all()), estimate)
+        self.assertFalse([query for query in queries.captured_queries if 'COUNT' in query['sql']])
+
+    def test_small_tables_are_counted(self):
+        User.objects.filter(username='user9').delete()
+        self.assertEqual(self.count(User.objects.all()), 9)
+
+    @override_settings(ADMIN_COUNT_LIMIT=3)
+    def test_filtered_counts_stop_at_the_limit(self):
+        self.assertEqual(self.count(User.objects.filter(username__startswith='user')), 3)
+        self.assertEqual(self.count(User.objects.filter(username='user1')), 1)
+
+
+class UserAdminTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create(username='site-admin', utype=9, is_admin=True)
+        self.client.force_login(self.admin)
+
+    def test_changelist(self):
+        User.objects.bulk_create([User(username='user{}'.format(i), email='user{}@example.com'.format(i))
+                                  for i in range(5)])
+        response = self.client.get('/admin/user/user/')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'user4')
+        response = self.client.get('/admin/user/user/', {'q': 'USER3'})
+        self.assertEqual(list(response.context['cl'].result_list), [User.objects.get(username='user3')])
@@ -0,0 +1,50 @@
+#
+# Created on Mon Nov 02 2020
+#
+# Copyright (c) 2020 - Simon Prast
+#
+
+
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+
+from user.apps import create_admin_user_after_migrate
+from user.models import User
+
+
+@override_settings(ADMIN_USER='root', ADMIN_PASSWORD='s3cret-password')
+class CreateAdminUserTests(TestCase):
+    def call(self, *args):
+        call_command('createadminuser', *args, verbosity=0, stdout=StringIO())
+
+    def test_creates_a_missing_account(self):
+        create_admin_user_after_migrate(sender=None, verbosity=0)
+        admin = User.objects.get(username='root')
+        self.assertTrue(admin.is_staff)
+        self.assertTrue(admin.check_password('s3cret-password'))
+
+    def test_keeps_the_password_of_an_existing_account(self):
+        admin = User.objects.create_superuser('root', 'changed-password')
+        create_admin_user_after_migrate(sender=None, verbosity=0)
+        self.call()
+        admin.refresh_from_db()
+        self.assertTrue(admin.check_password('changed-password'))
+
+        self.call('--reset-password')
+        admin.refresh_from_db()
+        self.assertTrue(admin.check_password('s3cret-password'))
+
+    @override_settings(ADMIN_PASSWORD='admin', DEBUG=False)
+    def test_refuses_the_default_password_in_production(self):
+        with self.assertRaises(CommandError):
+            self.call()
+        # migrate goes on without the account
+        create_admin_user_after_migrate(sender=None, verbosity=0)
+        self.assertFalse(User.objects.filter(username='root').exists())
+
+    @override_settings(ADMIN_PASSWORD='admin', DEBUG=True)
+    def test_default_password_in_development(self):
+        self.call()
+        self.assertTrue(User.objects.get(username='root').check_password('admin'))
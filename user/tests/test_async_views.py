@@ -0,0 +1,118 @@
+#
+# Created on Mon Nov 02 2020
+#
+# Copyright (c) 2020 - Simon Prast
+#
+
+
+import asyncio
+import json
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from asgiref.testing import ApplicationCommunicator
+from django.test import AsyncClient, TransactionTestCase, override_settings
+from django.urls import include, path
+
+from francy.handlers import ASGIHandler
+from user.api.authentication import CachedTokenAuthentication, token_cache
+from user.hashing import hashing_executor
+from user.models import AuthToken, User
+
+
+urlpatterns = [
+    path('api/dev/', include('user.api.dev.async_urls')),
+    path('api/dev/', include('user.api.dev.urls')),
+]
+
+
+@override_settings(ROOT_URLCONF=__name__, PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class AsyncViewTests(TransactionTestCase):
+    def setUp(self):
+        token_cache.clear()
+        self.user = User.objects.create_user('async-user', 'password')
+        self.token = AuthToken.objects.create(user=self.user)
+        self.client = AsyncClient()
+
+    def request(self, method, url, data=None, authorization=True, **headers):
+        # Django 3.1's AsyncClient takes headers only as the list of the ASGI scope,
+        # and sends a broken content-length with a body.
+        headers = {'host': 'testserver', **headers}
+        if authorization:
+            headers['authorization'] = 'Token ' + self.token.key
+        kwargs = {}
+        if data is not None:
+            kwargs.update(data=json.dumps(data), content_type='application/json')
+            headers.update({'content-type': 'application/json', 'content-length': str(len(kwargs['data']))})
+        return async_to_sync(getattr(self.client, method))(
+            url, headers=[(name.encode(), value.encode()) for name, value in headers.items()], **kwargs)
+
+    def get(self, url, **headers):
+        return self.request('get', url, **headers)
+
+    def test_user_list_shows_the_user_itself(self):
+        response = self.get('/api/dev/users/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)['username'], 'async-user')
+        self.assertEqual(self.get('/api/dev/users/', **{'if-none-match': response['ETag']}).status_code, 304)
+
+    def test_token_is_resolved_once_per_request(self):
+        authenticate = CachedTokenAuthentication.authenticate_credentials
+        with mock.patch.object(CachedTokenAuthentication, 'authenticate_credentials', autospec=True,
+                               side_effect=authenticate) as authenticate_credentials:
+            response = self.get('/api/dev/users/{}/'.format(self.user.pk))
+        self.assertEqual(response.status_code, 200)
+        # Resolved for the ETag and reused by the view
+        self.assertEqual(authenticate_credentials.call_count, 1)
+
+    def test_errors(self):
+        other = User.objects.create(username='other-user')
+        self.assertEqual(self.get('/api/dev/users/{}/'.format(other.pk)).status_code, 403)
+        response = self.get('/api/dev/users/', authorization=False)
+        self.assertEqual((response.status_code, response['WWW-Authenticate']), (401, 'Token'))
+        self.assertEqual(self.request('delete', '/api/dev/users/').status_code, 405)
+
+    def test_create_and_login(self):
+        credentials = {'username': 'new-user', 'password': 'new-password'}
+        with mock.patch.object(hashing_executor, 'backend', 'inline'):
+            created = self.request('post', '/api/dev/users/create/', credentials, authorization=False)
+            login = self.request('post', '/api/dev/users/login/', credentials, authorization=False)
+            wrong = self.request('post', '/api/dev/users/login/', {**credentials, 'password': 'wrong'},
+                                 authorization=False)
+            authenticated = self.request('post', '/api/dev/users/login/', credentials)
+        self.assertEqual(created.status_code, 201)
+        self.assertEqual(login.status_code, 200)
+        self.assertEqual(json.loads(login.content)['token'], json.loads(created.content)['token'])
+        self.assertEqual(wrong.status_code, 400)
+        self.assertEqual(authenticated.status_code, 403)
+
+
+@override_settings(ROOT_URLCONF=__name__)
+class StreamingHandlerTests(TransactionTestCase):
+    def request(self, path, headers):
+        async def communicate():
+            communicator = ApplicationCommunicator(ASGIHandler(), {
+                'type': 'http', 'method': 'GET', 'path': path, 'query_string': b'',
+                'headers': [(name.encode(), value.encode()) for name, value in headers.items()],
+            })
+            await communicator.send_input({'type': 'http.request'})
+            start = await communicator.receive_output(5)
+            body = b''
+            while True:
+                message = await communicator.receive_output(5)
+                body += message.get('body', b'')
+                if not message.get('more_body'):
+                    return start, body
+
+        return asyncio.run(communicate())
+
+    def test_export_reads_the_database_off_the_event_loop(self):
+        admin = User.objects.create(username='export-admin', utype=9, is_admin=True)
+        User.objects.bulk_create([User(username='user{}'.format(i)) for i in range(50)])
+        token = AuthToken.objects.create(user=admin)
+        start, body = self.request('/api/dev/users/export/',
+                                   {'host': 'testserver', 'authorization': 'Token ' + token.key})
+        self.assertEqual(start['status'], 200)
+        rows = [json.loads(line) for line in body.decode().splitlines()]
+        self.assertEqual(len(rows), 51)
+        self.assertEqual(rows[0]['username'], 'export-admin')
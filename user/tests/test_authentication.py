@@ -0,0 +1,31 @@
+#
+# Created on Mon Nov 02 2020
+#
+# Copyright (c) 2020 - Simon Prast
+#
+
+
+from django.test import TestCase
+
+from user.api.authentication import CachedTokenAuthentication, token_cache
+from user.models import AuthToken, User
+
+
+class TokenCacheTests(TestCase):
+    def setUp(self):
+        token_cache.clear()
+        self.user = User.objects.create(username='token-user')
+        self.token = AuthToken.objects.create(user=self.user)
+
+    def test_valid_token_is_cached(self):
+        authentication = CachedTokenAuthentication()
+        self.assertEqual(authentication.authenticate_credentials(self.token.key)[0], self.user)
+        with self.assertNumQueries(0):
+            self.assertEqual(authentication.authenticate_credentials(self.token.key)[0], self.user)
+
+    def test_saving_the_user_drops_cached_tokens(self):
+        authentication = CachedTokenAuthentication()
+        authentication.authenticate_credentials(self.token.key)
+        self.user.utype, self.user.is_admin = 9, True
+        self.user.save()
+        self.assertTrue(authentication.authenticate_credentials(self.token.key)[0].is_admin)
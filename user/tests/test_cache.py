@@ -0,0 +1,111 @@
+#
+# Created on Mon Nov 02 2020
+#
+# Copyright (c) 2020 - Simon Prast
+#
+
+
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+
+from francy.cache.backends import FileBasedCache
+from francy.cache.config import caches_from_env
+from francy.cache.namespaces import CacheNamespace, reset_shared_stats
+
+
+class CacheConfigTests(SimpleTestCase):
+    def test_defaults_to_locmem(self):
+        config = caches_from_env(env={})
+        self.assertEqual({cache['BACKEND'] for cache in config.values()},
+                         {'django.core.cache.backends.locmem.LocMemCache'})
+
+    def test_cache_dir(self):
+        config = caches_from_env(env={'FRANCY_CACHE_DIR': '/var/cache/francy'})
+        self.assertEqual(config['default']['BACKEND'], 'django.core.cache.backends.locmem.LocMemCache')
+        for alias in ('shared', 'locks'):
+            self.assertEqual(config[alias]['BACKEND'], 'francy.cache.backends.FileBasedCache')
+            self.assertEqual(config[alias]['LOCATION'], os.path.join('/var/cache/francy', alias))
+
+    def test_file_cache_needs_a_location(self):
+        with self.assertRaises(ImproperlyConfigured):
+            caches_from_env(env={'FRANCY_SHARED_CACHE_BACKEND': 'file'})
+        config = caches_from_env(env={'FRANCY_SHARED_CACHE_BACKEND': 'file',
+                                      'FRANCY_SHARED_CACHE_LOCATION': '/srv/shared'})
+        self.assertEqual(config['shared']['LOCATION'], '/srv/shared')
+
+    def test_memcached_servers(self):
+        config = caches_from_env(env={'FRANCY_SHARED_CACHE_BACKEND': 'memcached',
+                                      'FRANCY_SHARED_CACHE_LOCATION': 'a:11211, b:11211'})
+        self.assertEqual(config['shared']['LOCATION'], ['a:11211', 'b:11211'])
+        self.assertNotIn('OPTIONS', config['shared'])
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ImproperlyConfigured):
+            caches_from_env(env={'FRANCY_CACHE_BACKEND': 'redis'})
+
+
+class FileBasedCacheCullTests(SimpleTestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir, ignore_errors=True)
+
+    def cache(self, **options):
+        return FileBasedCache(self.dir, {'OPTIONS': dict({'MAX_ENTRIES': 10, 'CULL_FREQUENCY': 2}, **options)})
+
+    def test_culls_expired_entries_first(self):
+        cache = self.cache(CULL_INTERVAL=0)
+        for i in range(5):
+            cache.set('expired{}'.format(i), i, -1)
+        for i in range(5):
+            cache.set('live{}'.format(i), i)
+        cache.set('last', 1)
+        self.assertEqual(len(cache._list_cache_files()), 6)
+        self.assertEqual(cache.get_many(['live{}'.format(i) for i in range(5)] + ['last']),
+                         dict({'live{}'.format(i): i for i in range(5)}, last=1))
+
+    def test_lists_the_directory_once_per_interval(self):
+        cache = self.cache(CULL_INTERVAL=60)
+        with mock.patch.object(cache, '_list_cache_files', wraps=cache._list_cache_files) as listing:
+            for i in range(20):
+                cache.set(i, i)
+                cache.add('add{}'.format(i), i)
+        self.assertEqual(listing.call_count, 1)
+        self.assertEqual(len(cache._list_cache_files()), 40)
+
+
+@override_settings(CACHE_STATS_CACHE='shared', CACHE_STATS_FLUSH_INTERVAL=3600)
+class CacheStatsTests(SimpleTestCase):
+    def setUp(self):
+        reset_shared_stats()
+        self.addCleanup(reset_shared_stats)
+
+    def test_counts_are_summed_in_the_shared_cache(self):
+        namespace = CacheNamespace('stats-test', cache_alias='default')
+        namespace.set('a', 1)
+        namespace.get('a')
+        namespace.get_many(['a', 'b', 'c'])
+        self.assertEqual(namespace.stats()['hits'], 2)
+        # Not flushed yet
+        self.assertIsNone(caches['shared'].get('cache-stats:stats-test:hits'))
+
+        namespace.flush_stats()
+        out = StringIO()
+        call_command('cachestats', '--json', stdout=out)
+        self.assertEqual(json.loads(out.getvalue())['stats-test'],
+                         {'hits': 2, 'misses': 2, 'lookups': 4, 'hit_ratio': 0.5, 'version': 1})
+
+        out = StringIO()
+        call_command('cachestats', '--reset', stdout=out)
+        self.assertIn('stats-test', out.getvalue())
+        out = StringIO()
+        call_command('cachestats', stdout=out)
+        self.assertEqual(out.getvalue().strip(), 'No cache lookups counted yet.')
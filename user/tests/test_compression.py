@@ -0,0 +1,103 @@
+#
+# Created on Mon Nov 02 2020
+#
+# Copyright (c) 2020 - Simon Prast
+#
+
+
+import gzip
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.management import call_command
+from django.http import HttpRequest, HttpResponse, StreamingHttpResponse
+from django.templatetags.static import static
+from django.test import SimpleTestCase, override_settings
+
+from francy import compression
+from francy.compression import CompressionMiddleware, accepted_encodings
+
+
+class CompressionMiddlewareTests(SimpleTestCase):
+    body = b'{"username": "user"}' * 100
+
+    def process(self, response, accept_encoding='gzip, br'):
+        request = HttpRequest()
+        request.META['HTTP_ACCEPT_ENCODING'] = accept_encoding
+        return CompressionMiddleware(lambda request: response)(request)
+
+    def test_accepted_encodings(self):
+        self.assertEqual(accepted_encodings('gzip;q=0.5, br;q=0, identity'), {'gzip', 'identity'})
+        self.assertEqual(accepted_encodings(''), set())
+
+    def test_gzip(self):
+        response = HttpResponse(self.body, content_type='application/json')
+        response['ETag'] = '"abc"'
+        with mock.patch.object(compression, 'brotli', None):
+            response = self.process(response)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), self.body)
+        self.assertEqual(response['Content-Length'], str(len(response.content)))
+        self.assertEqual((response['Vary'], response['ETag']), ('Accept-Encoding', 'W/"abc"'))
+
+    def test_brotli(self):
+        if compression.brotli is None:
+            self.skipTest('brotli is not installed')
+        response = self.process(HttpResponse(self.body, content_type='application/json'))
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(compression.brotli.decompress(response.content), self.body)
+
+    def test_passed_through(self):
+        for response, accept_encoding in (
+                (HttpResponse(self.body[:100], content_type='application/json'), 'gzip'),
+                (HttpResponse(self.body, content_type='application/octet-stream'), 'gzip'),
+                (HttpResponse(self.body, content_type='application/json'), 'gzip;q=0, deflate')):
+            with self.subTest(content_type=response['Content-Type'], accept_encoding=accept_encoding):
+                self.assertFalse(self.process(response, accept_encoding).has_header('Content-Encoding'))
+
+    def test_streaming(self):
+        response = StreamingHttpResponse((self.body for _ in range(10)), content_type='application/x-ndjson')
+        with mock.patch.object(compression, 'brotli', None):
+            response = self.process(response)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), self.body * 10)
+
+
+class CompressedManifestStorageTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        source, self.root = os.path.join(directory, 'source'), os.path.join(directory, 'static')
+        os.mkdir(source)
+        with open(os.path.join(source, 'app.css'), 'w') as f:
+            f.write('body { color: black; }\n' * 200)
+        with open(os.path.join(source, 'small.css'), 'w') as f:
+            f.write('p {}\n')
+        settings_override = override_settings(
+            STATIC_ROOT=self.root, STATICFILES_DIRS=[source],
+            STATICFILES_FINDERS=['django.contrib.staticfiles.finders.FileSystemFinder'],
+            STATICFILES_STORAGE='francy.staticfiles.CompressedManifestStaticFilesStorage')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_collectstatic(self):
+        call_command('collectstatic', interactive=False, verbosity=0)
+        with override_settings(DEBUG=False):
+            url = static('app.css')
+        hashed_name = url[len('/static/'):]
+        self.assertNotEqual(hashed_name, 'app.css')
+        with open(os.path.join(self.root, hashed_name), 'rb') as original, \
+                open(os.path.join(self.root, hashed_name + '.gz'), 'rb') as compressed:
+            self.assertEqual(gzip.decompress(compressed.read()), original.read())
+        self.assertEqual(os.path.exists(os.path.join(self.root, hashed_name + '.br')),
+                         compression.brotli is not None)
+        # Below COMPRESSION_MIN_SIZE
+        self.assertFalse([name for name in os.listdir(self.root) if name.startswith('small.') and name.endswith('.gz')])
+
+    def test_missing_manifest(self):
+        with override_settings(DEBUG=False), self.assertRaises(ValueError):
+            static('app.css')
+        with override_settings(DEBUG=True):
+            self.assertEqual(static('app.css'), '/static/app.css')
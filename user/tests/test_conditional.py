@@ -0,0 +1,72 @@
+#
+# Created on Mon Nov 02 2020
+#
+# Copyright (c) 2020 - Simon Prast
+#
+
+
+from django.test import TestCase, TransactionTestCase
+
+from rest_framework.test import APIClient
+
+from user.models import User
+
+
+class RowVersionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='versioned-user')
+
+    def test_save_is_a_single_update(self):
+        with self.assertNumQueries(1):
+            self.user.save()
+        with self.assertNumQueries(1):
+            self.user.save(update_fields=['email'])
+        # Read back when it is needed
+        with self.assertNumQueries(1):
+            self.assertEqual(self.user.row_version, 3)
+
+    def test_concurrent_saves_get_different_versions(self):
+        stale = User.objects.get(pk=self.user.pk)
+        self.user.save()
+        self.assertEqual(self.user.row_version, 2)
+        stale.save()
+        self.assertEqual(stale.row_version, 3)
+        self.assertEqual(User.objects.get(pk=self.user.pk).row_version, 3)
+
+
+class ConditionalGetTests(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='etag-user')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = '/api/dev/users/{}/'.format(self.user.pk)
+
+    def test_not_modified(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('private', response['Cache-Control'])
+        etag = response['ETag']
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+        response = self.client.put(self.url, {'username': 'etag-user', 'email': 'etag@example.com'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['email'], 'etag@example.com')
+
+    def test_representations_have_their_own_etag(self):
+        full = self.client.get(self.url)['ETag']
+        projected = self.client.get(self.url + '?fields=id')['ETag']
+        self.assertNotEqual(full, projected)
+        self.assertEqual(self.client.get(self.url + '?fields=id', HTTP_IF_NONE_MATCH=full).status_code, 200)
+
+    def test_hidden_users_get_no_etag(self):
+        other = User.objects.create(username='other-user')
+        response = self.client.get('/api/dev/users/{}/'.format(other.pk))
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(response.has_header('ETag'))
@@ -0,0 +1,58 @@
+#
+# Created on Mon Nov 02 2020
+#
+# Copyright (c) 2020 - Simon Prast
+#
+
+
+import csv
+import io
+import json
+
+from django.test import TestCase
+
+from rest_framework.test import APIClient
+
+from user.api.dev.serializers import UserSerializer
+from user.models import User
+
+
+class UserExportTests(TestCase):
+    url = '/api/dev/users/export/'
+
+    def setUp(self):
+        self.admin = User.objects.create(username='export-admin', utype=9, is_admin=True)
+        User.objects.bulk_create([
+            User(username='zoë{}'.format(i), email='user{}@example.com'.format(i) if i % 2 else None) for i in range(5)
+        ])
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def content(self, response):
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def test_ndjson_matches_the_serializer(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="users.ndjson"')
+        rows = [json.loads(line) for line in self.content(response).splitlines()]
+        self.assertEqual(rows, json.loads(json.dumps(UserSerializer(User.objects.order_by('id'), many=True).data)))
+
+    def test_csv(self):
+        for url, kwargs in ((self.url, {'HTTP_ACCEPT': 'text/csv'}), (self.url + '?format=csv', {}),
+                            ('/api/dev/users/export.csv?fields=username,email', {})):
+            with self.subTest(url=url):
+                rows = list(csv.reader(io.StringIO(self.content(self.client.get(url, **kwargs)))))
+                self.assertEqual(len(rows), 7)
+                self.assertIn('username', rows[0])
+        self.assertEqual(rows[:3], [['username', 'email'], ['export-admin', ''], ['zoë0', '']])
+
+    def test_projection(self):
+        response = self.client.get(self.url + '?fields=id,username')
+        rows = [json.loads(line) for line in self.content(response).splitlines()]
+        self.assertEqual({tuple(row) for row in rows}, {('id', 'username')})
+        self.assertEqual(self.client.get(self.url + '?fields=password').status_code, 400)
+
+    def test_staff_only(self):
+        self.client.force_authenticate(User.objects.get(username='zoë0'))
+        self.assertEqual(self.client.get(self.url).status_code, 403)
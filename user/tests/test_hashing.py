@@ -0,0 +1,103 @@
+#
+# Created on Mon Nov 02 2020
+#
+# Copyright (c) 2020 - Simon Prast
+#
+
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from django.contrib.auth import hashers
+from django.test import SimpleTestCase, override_settings
+
+from user.hashing import HashingBusy, HashingExecutor
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class HashingExecutorTests(SimpleTestCase):
+    def executor(self, **kwargs):
+        executor = HashingExecutor(**dict({'backend': 'thread', 'max_workers': 1, 'max_pending': 1}, **kwargs))
+        self.addCleanup(executor.shutdown)
+        return executor
+
+    def test_hashes(self):
+        for backend in ('inline', 'thread'):
+            executor = self.executor(backend=backend)
+            encoded = executor.make_password('secret')
+            self.assertTrue(hashers.check_password('secret', encoded))
+            self.assertEqual(executor.check_password('secret', encoded), (True, False))
+            self.assertEqual(executor.check_password('wrong', encoded), (False, False))
+            self.assertEqual(len(executor.make_passwords(['a', None, 'b'])), 3)
+            self.assertEqual(asyncio.run(executor.acheck_password('secret', encoded)), (True, False))
+            self.assertEqual(executor.stats()['pending'], 0)
+
+    def test_full_executor_rejects_after_the_timeout(self):
+        executor = self.executor(timeout=0.05)
+        executor._acquire()
+        with self.assertRaises(HashingBusy):
+            executor.make_password('secret')
+        with self.assertRaises(HashingBusy):
+            asyncio.run(executor.amake_password('secret'))
+        self.assertEqual(executor.stats()['rejected'], 2)
+
+    def test_async_callers_wait_on_their_own_threads(self):
+        executor = self.executor(timeout=5)
+        executor._acquire()
+        waiting_on = []
+        acquire = executor._acquire
+
+        def record(*args):
+            waiting_on.append(threading.current_thread().name)
+            return acquire(*args)
+
+        async def main():
+            # The default executor stays free for sync_to_async() and the like
+            asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=1))
+            with mock.patch.object(executor, '_acquire', side_effect=record):
+                hashing = asyncio.ensure_future(executor.amake_password('secret'))
+                await asyncio.sleep(0.05)
+                self.assertFalse(hashing.done())
+                await asyncio.get_running_loop().run_in_executor(None, executor._release, 0.0)
+                return await hashing
+
+        self.assertTrue(hashers.check_password('secret', asyncio.run(main())))
+        self.assertTrue(waiting_on[0].startswith('password-hashing-wait'))
+
+    def test_timeout_counts_from_the_call(self):
+        executor = self.executor(max_pending=2, timeout=0.2)
+        executor._acquire()
+        executor._acquire()
+
+        async def main():
+            started = time.monotonic()
+            # More callers than waiting threads, the last ones wait in the queue first
+            results = await asyncio.gather(*[executor.amake_password('secret') for _ in range(6)],
+                                           return_exceptions=True)
+            return time.monotonic() - started, results
+
+        elapsed, results = asyncio.run(main())
+        self.assertTrue(all(isinstance(result, HashingBusy) for result in results))
+        self.assertLess(elapsed, 0.5)
+
+    def test_cancelled_caller_returns_its_slot(self):
+        executor = self.executor(timeout=5)
+        executor._acquire()
+
+        async def main():
+            hashing = asyncio.ensure_future(executor.amake_password('secret'))
+            await asyncio.sleep(0.05)
+            hashing.cancel()
+            await asyncio.sleep(0)
+            executor._release(0.0)
+
+        asyncio.run(main())
+        # The waiting thread got the slot after the cancellation and handed it back
+        deadline = time.monotonic() + 2
+        while executor.stats()['pending'] and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(executor.stats()['pending'], 0)
+        self.assertTrue(executor._slots.acquire(blocking=False))
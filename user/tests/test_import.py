@@ -0,0 +1,115 @@
+#
+# Created on Mon Nov 02 2020
+#
+# Copyright (c) 2020 - Simon Prast
+#
+
+
+import json
+from unittest import mock
+
+from django.test import TestCase
+
+from rest_framework.test import APIClient
+
+from user.bulk import InvalidRow, read_rows
+from user.models import AuthToken, User, UserManager
+
+
+class ReadRowsTests(TestCase):
+    def test_ndjson_lines_are_read_one_by_one(self):
+        rows = list(read_rows([b'{"username": "a"}\n', b'\n', b'{oops\n', b'\xff\xfe\n', b'[1, 2]\n']))
+        self.assertEqual(rows[0], {'username': 'a'})
+        self.assertIsInstance(rows[1], InvalidRow)
+        self.assertTrue(str(rows[1]).startswith('Line 3:'))
+        self.assertIsInstance(rows[2], InvalidRow)
+        self.assertEqual(rows[3], [1, 2])
+
+    def test_csv(self):
+        rows = list(read_rows([b'username,utype\r\n', b'a,5\r\n', b'\xff,1\r\n', b'c,\r\n'], 'csv'))
+        self.assertEqual(rows[0], {'username': 'a', 'utype': '5'})
+        self.assertIsInstance(rows[1], InvalidRow)
+        self.assertEqual(rows[2], {'username': 'c', 'utype': ''})
+
+    def test_json_array(self):
+        self.assertEqual(list(read_rows(['[{"username": "a"},', ' "b"]'], 'json')), [{'username': 'a'}, 'b'])
+        with self.assertRaises(ValueError):
+            list(read_rows(['{"username": "a"}'], 'json'))
+
+
+class UserImportTests(TestCase):
+    url = '/api/dev/users/import/'
+
+    def setUp(self):
+        self.admin = User.objects.create(username='import-admin', utype=9, is_admin=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def post(self, body, content_type='application/x-ndjson', query=''):
+        return self.client.post(self.url + query, data=body, content_type=content_type)
+
+    def ndjson(self, *rows):
+        return ''.join(row if isinstance(row, str) else json.dumps(row) + '\n' for row in rows)
+
+    def errors(self, response):
+        return {result['row']: result['errors'] for result in response.json()['results'] if result['status'] == 'error'}
+
+    def test_creates_users(self):
+        response = self.post(self.ndjson({'username': 'alice', 'email': 'alice@example.com'},
+                                         {'username': 'bob', 'utype': 0}), query='?tokens=1')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.json()['created'], response.json()['failed']), (2, 0))
+        alice = User.objects.get(username='alice')
+        self.assertEqual((alice.email, alice.utype), ('alice@example.com', 1))
+        # utype 0 is kept, not replaced by the default
+        self.assertEqual(User.objects.get(username='bob').utype, 0)
+        self.assertEqual(response.json()['results'][0]['token'], AuthToken.objects.get(user=alice).key)
+
+    def test_unreadable_rows_are_reported(self):
+        response = self.post(self.ndjson({'username': 'alice'}, '[1, 2]\n', '"x"\n', '{oops\n', {'username': 'bob'}))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['created'], 2)
+        errors = self.errors(response)
+        self.assertEqual(set(errors), {1, 2, 3})
+        self.assertEqual(errors[1], {'non_field_errors': ['Expected an object of user fields.']})
+        self.assertTrue(errors[3]['non_field_errors'][0].startswith('Line 4:'))
+
+    def test_invalid_utype(self):
+        response = self.post(self.ndjson(*({'username': 'user{}'.format(i), 'utype': utype}
+                                           for i, utype in enumerate(('abc', True, 1.5, None, '7')))))
+        self.assertEqual(set(self.errors(response)), {0, 1, 2, 3})
+        self.assertEqual(User.objects.get(username='user4').utype, 7)
+
+    def test_csv(self):
+        response = self.post('username,email,utype\r\ncarol,,\r\ndave,dave@example.com,5\r\n', 'text/csv')
+        self.assertEqual(response.json()['created'], 2)
+        self.assertEqual(list(User.objects.filter(username__in=['carol', 'dave']).order_by('username')
+                              .values_list('utype', 'email')), [(1, None), (5, 'dave@example.com')])
+
+    def test_duplicates(self):
+        response = self.post(self.ndjson({'username': 'import-admin'}, {'username': 'erin'}, {'username': 'erin'}))
+        self.assertEqual(set(self.errors(response)), {0, 2})
+
+    def test_concurrently_taken_username(self):
+        real_taken = UserManager._taken
+        checks = []
+
+        def taken(manager, usernames, emails):
+            checks.append(usernames)
+            # The username is taken between the check of the batch and its insert
+            return (set(), set()) if len(checks) == 1 else real_taken(manager, usernames, emails)
+
+        with mock.patch.object(UserManager, '_taken', autospec=True, side_effect=taken):
+            response = self.post(self.ndjson({'username': 'frank'}, {'username': 'import-admin'}))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.errors(response), {1: {'username': ['user with this username already exists.']}})
+        self.assertTrue(User.objects.filter(username='frank').exists())
+
+    def test_unparsable_body(self):
+        self.assertEqual(self.post('{"username": "a"}', 'application/json').status_code, 400)
+        self.assertEqual(self.post('', 'application/xml').status_code, 415)
+
+    def test_staff_only(self):
+        self.client.force_authenticate(User.objects.create(username='regular'))
+        self.assertEqual(self.post(self.ndjson({'username': 'alice'})).status_code, 403)
+        self.assertFalse(User.objects.filter(username='alice').exists())
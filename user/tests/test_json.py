@@ -0,0 +1,72 @@
+#
+# Created on Mon Nov 02 2020
+#
+# Copyright (c) 2020 - Simon Prast
+#
+
+
+import datetime
+import io
+import uuid
+from decimal import Decimal
+from unittest import mock
+
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase, override_settings
+from django.utils import timezone
+
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+
+from user.api import jsoncodec
+from user.api.parsers import FastJSONParser
+from user.api.renderers import FastJSONRenderer
+
+
+class JSONCodecTests(SimpleTestCase):
+    data = {
+        'text': 'zoë \u2028 \u2029',
+        'created': datetime.datetime(2020, 11, 2, 12, 30, 15, 123456, tzinfo=timezone.utc),
+        'day': datetime.date(2020, 11, 2),
+        'price': Decimal('1.50'),
+        'id': uuid.UUID(int=1),
+        'nested': [1, 2.5, None, True, {3: 'int key'}],
+    }
+
+    def test_same_output_as_drf(self):
+        expected = JSONRenderer().render(self.data)
+        for backend, (dumps, loads) in jsoncodec.CODECS.items():
+            with self.subTest(backend=backend):
+                self.assertEqual(dumps(self.data), expected)
+                self.assertEqual(loads(expected), loads(expected.decode()))
+
+    def test_non_compliant_floats_are_rejected(self):
+        for backend, (dumps, loads) in jsoncodec.CODECS.items():
+            with self.subTest(backend=backend), self.assertRaises(ValueError):
+                loads(b'{"value": NaN}')
+
+    def test_backend_setting(self):
+        with override_settings(JSON_BACKEND='json'):
+            self.assertEqual(jsoncodec.get_backend(), 'json')
+        with override_settings(JSON_BACKEND='simplejson'), self.assertRaises(ImproperlyConfigured):
+            jsoncodec.get_backend()
+        with override_settings(JSON_BACKEND='orjson'), mock.patch.object(jsoncodec, 'orjson', None), \
+                self.assertRaises(ImproperlyConfigured):
+            jsoncodec.get_backend()
+
+
+class FastJSONTests(SimpleTestCase):
+    def parse(self, body, encoding='utf-8'):
+        return FastJSONParser().parse(io.BytesIO(body), 'application/json', {'encoding': encoding})
+
+    def test_parser(self):
+        self.assertEqual(self.parse('{"username": "zoë"}'.encode()), {'username': 'zoë'})
+        self.assertEqual(self.parse('{"username": "zoë"}'.encode('latin-1'), 'latin-1'), {'username': 'zoë'})
+        with self.assertRaises(ParseError):
+            self.parse(b'{"username": ')
+
+    def test_renderer(self):
+        self.assertEqual(FastJSONRenderer().render({'a': [1, 2]}), b'{"a":[1,2]}')
+        self.assertEqual(FastJSONRenderer().render({'a': [1, 2]}, 'application/json; indent=2'),
+                         JSONRenderer().render({'a': [1, 2]}, 'application/json; indent=2'))
+        self.assertEqual(FastJSONRenderer().render(None), b'')
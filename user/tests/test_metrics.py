@@ -0,0 +1,49 @@
+#
+# Created on Mon Nov 02 2020
+#
+# Copyright (c) 2020 - Simon Prast
+#
+
+
+from django.test import TestCase, override_settings
+
+from rest_framework.test import APIClient
+
+from francy import metrics
+from user.models import User
+
+
+@override_settings(METRICS_TOKEN='scraper-token')
+class MetricsTests(TestCase):
+    url = '/api/metrics'
+
+    def setUp(self):
+        metrics.registry.clear()
+        self.addCleanup(metrics.registry.clear)
+
+    def test_requires_the_token(self):
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        self.assertEqual(self.client.get(self.url, HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        # The client address is no proof
+        self.assertEqual(self.client.get(self.url, REMOTE_ADDR='127.0.0.1').status_code, 403)
+        with override_settings(METRICS_TOKEN=''):
+            self.assertEqual(self.client.get(self.url, HTTP_AUTHORIZATION='Bearer ').status_code, 403)
+
+    def test_requests_are_recorded_per_route(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create(username='metrics-user', utype=9, is_admin=True))
+        client.get('/api/dev/users/')
+        client.generic('BREW', '/api/dev/users/')
+
+        response = self.client.get(self.url, HTTP_AUTHORIZATION='Bearer scraper-token')
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn('francy_requests_sampled_total{route="api/dev/users/",method="GET"} 1', body)
+        self.assertIn('francy_request_db_queries_total{route="api/dev/users/",method="GET"} 1', body)
+        self.assertIn('francy_requests_sampled_total{route="api/dev/users/",method="other"} 1', body)
+        self.assertIn('francy_request_duration_seconds_count{route="api/dev/users/",method="GET",status="200"} 1', body)
+
+    @override_settings(METRICS_SAMPLE_RATE=0)
+    def test_sampling_disabled(self):
+        self.client.get('/api/dev/users/')
+        self.assertEqual(metrics.registry.totals, {})
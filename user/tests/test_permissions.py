@@ -0,0 +1,107 @@
+#
+# Created on Mon Nov 02 2020
+#
+# Copyright (c) 2020 - Simon Prast
+#
+
+
+from django.contrib.auth.models import AnonymousUser
+from django.test import TestCase
+
+from rest_framework import permissions
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from rest_framework.views import APIView
+
+from user.api.dev import api_views
+from user.api.dev.permissions import IsStaff
+from user.api.permissions import UtypePermission
+from user.models import User
+from user.permissions import ACTIONS, ADMIN_ONLY, USER_CHANGE_UTYPE, USER_LIST, USER_VIEW, has_action
+
+
+def sample_users():
+    """Anonymous, regular, unknown and admin user types, each with and without is_admin."""
+    users = [AnonymousUser()]
+    for pk, (utype, is_admin) in enumerate(((u, a) for u in (0, 1, 5, 9) for a in (False, True)), start=1):
+        users.append(User(pk=pk, username='user{}'.format(pk), utype=utype, is_admin=is_admin))
+    return users
+
+
+class PermissionMatrixTests(TestCase):
+    """The matrix has to decide exactly like the permission classes and is_staff checks it replaced."""
+
+    factory = APIRequestFactory()
+
+    def check(self, view_class, method, user, pk=None):
+        request = Request(getattr(self.factory, method.lower())('/'))
+        request.user = user
+        view = view_class()
+        view.kwargs = {} if pk is None else {'pk': pk}
+        return UtypePermission().has_permission(request, view), request, view
+
+    def test_actions_match_is_staff(self):
+        for user in sample_users():
+            for action in ACTIONS:
+                expected = user.is_staff if action in ADMIN_ONLY else user.is_authenticated
+                self.assertEqual(has_action(user, action), expected, (user, getattr(user, 'utype', None), action))
+
+    def test_admin_utype_without_is_admin_is_a_regular_user(self):
+        user = User(pk=1, username='nine', utype=9, is_admin=False)
+        self.assertFalse(has_action(user, USER_LIST))
+        self.assertFalse(has_action(user, USER_CHANGE_UTYPE))
+
+    def test_staff_only_views(self):
+        for user in sample_users():
+            for view_class, method in ((api_views.UserExport, 'GET'), (api_views.UserImport, 'POST')):
+                allowed, request, view = self.check(view_class, method, user)
+                baseline = (permissions.IsAuthenticated().has_permission(request, view)
+                            and IsStaff().has_permission(request, view))
+                self.assertEqual(allowed, baseline, (view_class.__name__, user))
+
+    def test_user_list(self):
+        for user in sample_users():
+            allowed, request, view = self.check(api_views.UserList, 'GET', user)
+            self.assertEqual(allowed, permissions.IsAuthenticated().has_permission(request, view))
+            # Staff users get the whole list, everyone else only himself
+            if allowed:
+                self.assertEqual(has_action(user, USER_LIST), user.is_staff)
+
+    def test_user_detail(self):
+        for user in sample_users():
+            for method in ('GET', 'PUT'):
+                for pk in (1, 2, 9):
+                    allowed, request, view = self.check(api_views.UserDetail, method, user, pk)
+                    baseline = (permissions.IsAuthenticated().has_permission(request, view)
+                                and (user.is_staff or user.pk == pk))
+                    self.assertEqual(allowed, baseline, (method, user, pk))
+
+    def test_undeclared_methods_are_denied(self):
+        admin = User(pk=1, username='admin', utype=9, is_admin=True)
+        self.assertFalse(self.check(api_views.UserExport, 'DELETE', admin)[0])
+        self.assertTrue(self.check(api_views.UserExport, 'HEAD', admin)[0])
+
+
+class UtypePermissionTests(TestCase):
+    factory = APIRequestFactory()
+
+    def check(self, view):
+        request = Request(self.factory.get('/'))
+        request.user = User(pk=1, username='admin', utype=9, is_admin=True)
+        view.kwargs = {}
+        return UtypePermission().has_permission(request, view)
+
+    def test_views_without_actions_are_denied(self):
+        self.assertFalse(self.check(APIView()))
+
+    def test_instance_actions_are_not_compiled_per_class(self):
+        class View(APIView):
+            permission_actions = {'GET': (USER_VIEW,)}
+
+        self.assertTrue(self.check(View()))
+        # e.g. View.as_view(permission_actions={})
+        view = View()
+        view.permission_actions = {}
+        self.assertFalse(self.check(view))
+        self.assertTrue(self.check(View()))
+        self.assertIs(UtypePermission._compiled[View][0], View.permission_actions)
@@ -0,0 +1,64 @@
+#
+# Created on Mon Nov 02 2020
+#
+# Copyright (c) 2020 - Simon Prast
+#
+
+
+from unittest import mock
+
+from django.conf import settings
+from django.test import TestCase, override_settings
+
+from rest_framework.test import APIClient
+
+from user.api.throttling import LocalBucketStore, PasswordThrottle
+from user.hashing import hashing_executor
+from user.models import AuthToken, User
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class UserCreateOrLoginTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        for patch in (mock.patch.object(hashing_executor, 'backend', 'inline'),
+                      mock.patch('user.api.throttling.password_throttle',
+                                 PasswordThrottle(LocalBucketStore(), settings.THROTTLE_BUCKETS))):
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def post(self, url, username, password):
+        return self.client.post(url, {'username': username, 'password': password}, format='json')
+
+    def test_register_hashes_once(self):
+        with mock.patch.object(hashing_executor, 'make_password', wraps=hashing_executor.make_password) as make, \
+                mock.patch.object(hashing_executor, 'check_password', wraps=hashing_executor.check_password) as check:
+            response = self.post('/api/dev/users/create/', 'new-user', 'new-password')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['created'], 'True')
+        self.assertEqual(response.json()['token'], AuthToken.objects.get(user__username='new-user').key)
+        self.assertEqual((make.call_count, check.call_count), (1, 0))
+
+    def test_login(self):
+        user = User.objects.create_user('existing-user', 'password')
+        token = AuthToken.objects.create(user=user)
+        with mock.patch.object(hashing_executor, 'make_password', wraps=hashing_executor.make_password) as make, \
+                mock.patch.object(hashing_executor, 'check_password', wraps=hashing_executor.check_password) as check:
+            response = self.post('/api/dev/users/login/', 'existing-user', 'password')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'username': 'existing-user', 'token': token.key, 'created': 'False'})
+        self.assertEqual((make.call_count, check.call_count), (0, 1))
+
+        # A taken username is not registered again
+        response = self.post('/api/dev/users/create/', 'existing-user', 'wrong')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(User.objects.filter(username='existing-user').count(), 1)
+
+    def test_authenticated_users_are_refused(self):
+        self.client.force_authenticate(User.objects.create(username='logged-in'))
+        self.assertEqual(self.post('/api/dev/users/create/', 'new-user', 'new-password').status_code, 403)
+
+    @override_settings(ALLOW_REGISTER=False)
+    def test_registration_disabled(self):
+        self.assertEqual(self.post('/api/dev/users/create/', 'new-user', 'new-password').status_code, 400)
+        self.assertFalse(User.objects.filter(username='new-user').exists())
@@ -0,0 +1,94 @@
+#
+# Created on Mon Nov 02 2020
+#
+# Copyright (c) 2020 - Simon Prast
+#
+
+
+from unittest import mock
+
+from django.db import connections, transaction
+from django.test import TestCase, TransactionTestCase
+
+from rest_framework.test import APIClient
+
+from user.api.cache import user_response_cache
+from user.models import User
+
+
+def load(pk):
+    return User.objects.get(pk=pk)
+
+
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='cached-user', email='cached@example.com')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = '/api/dev/users/{}/'.format(self.user.pk)
+
+    def test_cached_response_costs_no_query(self):
+        first = self.client.get(self.url)
+        self.assertEqual(first.json()['username'], 'cached-user')
+        with self.assertNumQueries(0):
+            second = self.client.get(self.url)
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(second['ETag'], first['ETag'])
+
+    def test_projections_are_cached_apart(self):
+        self.assertEqual(set(self.client.get('/api/dev/users/?fields=id,username').json()), {'id', 'username'})
+        self.assertIn('email', self.client.get('/api/dev/users/').json())
+
+    def test_keys_are_scoped_by_database(self):
+        serialize = mock.Mock(return_value={'username': 'cached-user'})
+        user_response_cache.get_or_serialize(self.user.pk, load, serialize)
+        # The same primary key and row_version in another database
+        with mock.patch.dict(connections['default'].settings_dict, NAME='other.sqlite3'):
+            user_response_cache.get_or_serialize(self.user.pk, load, serialize)
+        user_response_cache.get_or_serialize(self.user.pk, load, serialize)
+        self.assertEqual(serialize.call_count, 2)
+
+    def test_new_generation_drops_all_entries(self):
+        serialize = mock.Mock(return_value={'username': 'cached-user'})
+        user_response_cache.get_or_serialize(self.user.pk, load, serialize)
+        # post_migrate, e.g. of `manage.py flush`
+        user_response_cache.new_generation('default')
+        user_response_cache.get_or_serialize(self.user.pk, load, serialize)
+        user_response_cache.get_or_serialize(self.user.pk, load, serialize)
+        self.assertEqual(serialize.call_count, 2)
+
+
+class ResponseCacheCommitTests(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='committed-user')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = '/api/dev/users/{}/'.format(self.user.pk)
+
+    def test_pointer_moves_on_commit(self):
+        etag = self.client.get(self.url)['ETag']
+        with transaction.atomic():
+            self.user.email = 'committed@example.com'
+            self.user.save()
+            # Other requests keep seeing the committed row until then
+            self.assertEqual(user_response_cache.version(self.user.pk), 1)
+        self.assertEqual(user_response_cache.version(self.user.pk), 2)
+        response = self.client.get(self.url)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['email'], 'committed@example.com')
+
+    def test_rolled_back_save_keeps_the_pointer(self):
+        self.client.get(self.url)
+        with self.assertRaises(ZeroDivisionError), transaction.atomic():
+            self.user.email = 'rolled-back@example.com'
+            self.user.save()
+            1 / 0
+        self.assertEqual(user_response_cache.version(self.user.pk), 1)
+        self.assertIsNone(self.client.get(self.url).json()['email'])
+
+    def test_deleted_user_is_not_served(self):
+        other = User.objects.create(username='deleted-user', is_admin=True, utype=9)
+        self.client.force_authenticate(other)
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.user.delete()
+        self.assertEqual(self.client.get(self.url).status_code, 404)
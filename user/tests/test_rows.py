@@ -0,0 +1,40 @@
+#
+# Created on Mon Nov 02 2020
+#
+# Copyright (c) 2020 - Simon Prast
+#
+
+
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+
+from rest_framework.renderers import JSONRenderer
+
+from francy.rows import RowBuilder
+from user.api.dev.serializers import UserSerializer
+from user.api.renderers import FastJSONRenderer
+from user.models import User
+
+
+class RowBuilderTests(TestCase):
+    def setUp(self):
+        now = timezone.now()
+        for i in range(1, 6):
+            User.objects.create(username='zoë{}'.format(i), email='user{}@example.com'.format(i) if i % 2 else None,
+                                utype=i % 3, last_login=now - timedelta(days=i) if i % 2 else None)
+
+    def assertSameJSON(self, fields=None):
+        queryset = User.objects.order_by('id')
+        serializer = UserSerializer(queryset, many=True, fields=fields)
+        builder = RowBuilder(UserSerializer(fields=fields).fields)
+        rows = builder.build_many(queryset.values_list(*builder.columns))
+        for renderer in (JSONRenderer(), FastJSONRenderer()):
+            self.assertEqual(renderer.render(rows), renderer.render(serializer.data))
+
+    def test_identical_to_serializer(self):
+        self.assertSameJSON()
+
+    def test_projection(self):
+        self.assertSameJSON(fields=['id', 'last_login'])
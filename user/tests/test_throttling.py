@@ -0,0 +1,70 @@
+#
+# Created on Mon Nov 02 2020
+#
+# Copyright (c) 2020 - Simon Prast
+#
+
+
+from unittest import mock
+
+from django.test import TestCase
+
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from user.api.throttling import CacheBucketStore, LocalBucketStore, PasswordRateThrottle, PasswordThrottle
+
+
+class ThrottleTests(TestCase):
+    def test_local_bucket_refill(self):
+        store = LocalBucketStore()
+        with mock.patch('user.api.throttling.time.monotonic') as monotonic:
+            monotonic.return_value = 100.0
+            # A burst of 2, refilled at one token per second
+            self.assertEqual(store.take('key', 2, 1.0), 0)
+            self.assertEqual(store.take('key', 2, 1.0), 0)
+            self.assertAlmostEqual(store.take('key', 2, 1.0), 1.0)
+            monotonic.return_value = 100.5
+            self.assertAlmostEqual(store.take('key', 2, 1.0), 0.5)
+            monotonic.return_value = 101.0
+            self.assertEqual(store.take('key', 2, 1.0), 0)
+            # Never refilled beyond the burst
+            monotonic.return_value = 1000.0
+            self.assertEqual(store.take('key', 2, 1.0), 0)
+            self.assertEqual(store.take('key', 2, 1.0), 0)
+            self.assertGreater(store.take('key', 2, 1.0), 0)
+
+    def test_local_store_is_bounded(self):
+        store = LocalBucketStore(max_keys=10)
+        for key in range(25):
+            store.take(key, 1, 1.0)
+        self.assertLessEqual(len(store), 10)
+
+    def test_cache_bucket_refill(self):
+        store = CacheBucketStore(cache_alias='default', name='throttle-test')
+        with mock.patch('user.api.throttling.time.time') as now:
+            now.return_value = 1000.0
+            self.assertEqual(store.take('refill', 1, 2.0), 0)
+            self.assertAlmostEqual(store.take('refill', 1, 2.0), 0.5)
+            now.return_value = 1000.5
+            self.assertEqual(store.take('refill', 1, 2.0), 0)
+
+    def test_scopes(self):
+        throttle = PasswordThrottle(LocalBucketStore(), {'ip': (2, 60), 'username': (1, 60)})
+        self.assertIsNone(throttle.check('10.0.0.1', 'alice'))
+        # Another address guessing the same username
+        self.assertIsNotNone(throttle.check('10.0.0.2', 'alice'))
+        self.assertIsNone(throttle.check('10.0.0.1', 'bob'))
+        self.assertIsNotNone(throttle.check('10.0.0.1', 'carol'))
+        stats = throttle.stats()
+        self.assertEqual((stats['allowed'], stats['rejected_username'], stats['rejected_ip']), (2, 1, 1))
+
+    def test_forwarded_for_is_ignored(self):
+        throttle = PasswordThrottle(LocalBucketStore(), {'ip': (1, 60)})
+        factory = APIRequestFactory()
+        with mock.patch('user.api.throttling.password_throttle', throttle):
+            for forwarded_for, allowed in (('1.1.1.1', True), ('2.2.2.2', False)):
+                request = Request(factory.post('/', HTTP_X_FORWARDED_FOR=forwarded_for, REMOTE_ADDR='10.0.0.1'))
+                rate_throttle = PasswordRateThrottle()
+                self.assertEqual(rate_throttle.allow_request(request, None), allowed)
+            self.assertAlmostEqual(rate_throttle.wait(), 1.0, places=2)
@@ -0,0 +1,78 @@
+#
+# Created on Mon Nov 02 2020
+#
+# Copyright (c) 2020 - Simon Prast
+#
+
+
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase
+from django.utils import timezone
+
+from rest_framework import exceptions
+
+from user.api.authentication import (
+    TOKEN_TOUCH_INTERVAL, CachedTokenAuthentication, get_or_create_token, token_cache, touch_token
+)
+from user.models import AuthToken, User
+
+
+class AuthTokenTests(TestCase):
+    def setUp(self):
+        token_cache.clear()
+        self.user = User.objects.create(username='token-user')
+        self.token = AuthToken.objects.create(user=self.user)
+
+    def test_expired_token_is_rejected(self):
+        AuthToken.objects.filter(pk=self.token.pk).update(expires=timezone.now() - timedelta(seconds=1))
+        with self.assertRaises(exceptions.AuthenticationFailed):
+            CachedTokenAuthentication().authenticate_credentials(self.token.key)
+        self.assertIsNone(token_cache.get(self.token.key))
+
+    def test_cached_token_expires(self):
+        authentication = CachedTokenAuthentication()
+        authentication.authenticate_credentials(self.token.key)
+        AuthToken.objects.filter(pk=self.token.pk).update(expires=timezone.now() - timedelta(seconds=1))
+        with mock.patch('user.api.authentication.timezone.now', return_value=timezone.now() + timedelta(days=30)):
+            with self.assertRaises(exceptions.AuthenticationFailed):
+                authentication.authenticate_credentials(self.token.key)
+
+    def test_touch_is_coalesced(self):
+        now = self.token.last_used
+        with self.assertNumQueries(0):
+            touch_token(self.token, now + TOKEN_TOUCH_INTERVAL / 2)
+
+        later = now + TOKEN_TOUCH_INTERVAL * 2
+        stale_copy = AuthToken.objects.get(pk=self.token.pk)
+        with self.assertNumQueries(1):
+            touch_token(self.token, later)
+        self.assertEqual(self.token.last_used, later)
+        # A second worker touching the same token at once does not write again
+        touch_token(stale_copy, later + timedelta(seconds=1))
+        stored = AuthToken.objects.get(pk=self.token.pk)
+        self.assertEqual(stored.last_used, later)
+        self.assertGreater(stored.expires, self.token.created + TOKEN_TOUCH_INTERVAL)
+
+    def test_rotation_replaces_the_key(self):
+        old_key = self.token.key
+        rotated = AuthToken.objects.rotate(self.user)
+        self.assertEqual(rotated.pk, self.token.pk)
+        self.assertNotEqual(rotated.key, old_key)
+        with self.assertRaises(exceptions.AuthenticationFailed):
+            CachedTokenAuthentication().authenticate_credentials(old_key)
+        self.assertEqual(CachedTokenAuthentication().authenticate_credentials(rotated.key)[0], self.user)
+
+    def test_expired_token_gets_a_new_key_on_login(self):
+        AuthToken.objects.filter(pk=self.token.pk).update(expires=timezone.now() - timedelta(seconds=1))
+        token, created = get_or_create_token(self.user)
+        self.assertFalse(created)
+        self.assertNotEqual(token.key, self.token.key)
+        self.assertFalse(token.is_expired())
+
+    def test_purge_expired(self):
+        other = AuthToken.objects.create(user=User.objects.create(username='expired-user'))
+        AuthToken.objects.filter(pk=other.pk).update(expires=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(sum(AuthToken.objects.purge_expired(batch_size=1)), 1)
+        self.assertEqual(list(AuthToken.objects.values_list('pk', flat=True)), [self.token.pk])
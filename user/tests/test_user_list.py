@@ -0,0 +1,50 @@
+#
+# Created on Mon Nov 02 2020
+#
+# Copyright (c) 2020 - Simon Prast
+#
+
+
+from django.test import TestCase
+
+from rest_framework.test import APIClient
+
+from user.models import User
+
+
+class UserListTests(TestCase):
+    url = '/api/dev/users/'
+
+    def setUp(self):
+        self.admin = User.objects.create(username='list-admin', utype=9, is_admin=True)
+        User.objects.bulk_create([User(username='user{}'.format(i)) for i in range(4)])
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_cursor_pagination(self):
+        usernames = []
+        url = self.url + '?page_size=2'
+        while url:
+            # A single query per page, however deep into the table it is
+            with self.assertNumQueries(1):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.json()['results']), 2)
+            usernames += [row['username'] for row in response.json()['results']]
+            url = response.json()['next']
+        self.assertEqual(usernames, list(User.objects.order_by('id').values_list('username', flat=True)))
+
+    def test_projection(self):
+        response = self.client.get(self.url, {'fields': 'id,username'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual({tuple(row) for row in response.json()['results']}, {('id', 'username')})
+
+        response = self.client.get(self.url, {'fields': 'id,password'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'fields': ['Unknown field(s): password']})
+
+    def test_regular_users_see_themselves(self):
+        user = User.objects.get(username='user0')
+        self.client.force_authenticate(user)
+        response = self.client.get(self.url, {'fields': 'username'})
+        self.assertEqual(response.json(), {'username': 'user0'})